@@ -23,6 +23,14 @@ def create_app(app=None):
     
     # Configuration de l'application
     app.config.from_object('config.Config')
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', app.config['DATABASE_URL'])
+    
+    # Initialisation de la base de données (file d'attente des générations)
+    from api.models import db
+    db.init_app(app)
+    
+    with app.app_context():
+        db.create_all()
     
     # Activation de CORS pour permettre les requêtes cross-origin
     CORS(app)
@@ -31,4 +39,8 @@ def create_app(app=None):
     from api.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Reprise des générations interrompues et relance des tâches en attente
+    from api.controllers.clip_controller import init_app
+    init_app(app)
+    
     return app
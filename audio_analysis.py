@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Détection des moments forts à partir de l'énergie de la piste audio.
+Le son décodé en PCM mono (voir highlight_analysis) est reçu par blocs de taille
+fixe: seule la courbe de score par seconde est conservée, de sorte que la
+mémoire utilisée ne dépend pas de la durée de la vidéo.
+
+Le score d'une seconde combine son volume (énergie RMS en dB) et la force des
+attaques (hausses brusques d'énergie entre trames successives: rires,
+applaudissements, cris...).
+"""
+
+import numpy as np
+
+# Fréquence d'échantillonnage du PCM analysé (Hz)
+SAMPLE_RATE = 16000
+
+# Nombre de trames d'analyse par seconde (trames de 50 ms)
+FRAMES_PER_SECOND = 20
+
+# Durée des blocs de PCM lus depuis FFmpeg en secondes
+CHUNK_SECONDS = 30
+
+# Poids du volume et des attaques dans le score final
+LOUDNESS_WEIGHT = 0.6
+ONSET_WEIGHT = 0.4
+
+# Plancher d'énergie évitant log(0) sur les silences numériques
+ENERGY_FLOOR = 1e-10
+
+class AudioEnergyAnalyzer:
+    """
+    Calcule une courbe de score par seconde à partir d'échantillons PCM reçus par blocs.
+    """
+
+    media = 'audio'
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        """
+        Args:
+            sample_rate: Fréquence d'échantillonnage des échantillons reçus
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate // FRAMES_PER_SECOND
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._previous = None
+        self._loudness = []
+        self._onsets = []
+
+    def feed(self, samples):
+        """
+        Analyse un bloc d'échantillons mono (float32 entre -1 et 1).
+        Les échantillons ne formant pas une seconde complète sont conservés
+        pour le bloc suivant.
+        """
+        if len(self._pending):
+            samples = np.concatenate((self._pending, samples))
+
+        whole = len(samples) - len(samples) % self.sample_rate
+        self._pending = samples[whole:].copy()
+        self._process(samples[:whole])
+
+    def finish(self):
+        """
+        Termine l'analyse (dernière seconde incomplète comprise).
+
+        Returns:
+            Tableau NumPy des scores par seconde entre 0 et 1
+        """
+        self._process(self._pending)
+        self._pending = np.zeros(0, dtype=np.float32)
+
+        if not self._loudness:
+            return np.zeros(0, dtype=np.float32)
+
+        loudness = np.concatenate(self._loudness)
+        onsets = np.concatenate(self._onsets)
+        scores = LOUDNESS_WEIGHT * _normalise(loudness) + ONSET_WEIGHT * _normalise(onsets)
+        return scores.astype(np.float32)
+
+    def _process(self, samples):
+        """
+        Calcule le volume et la force des attaques de chaque seconde d'un bloc.
+        """
+        frames = len(samples) // self.frame_size
+        if frames == 0:
+            return
+
+        framed = samples[:frames * self.frame_size].reshape(frames, self.frame_size).astype(np.float64)
+        energy = np.mean(framed * framed, axis=1)
+        log_energy = 10 * np.log10(energy + ENERGY_FLOOR)
+
+        # Attaques: hausses d'énergie d'une trame à la suivante (continuité entre les blocs)
+        previous = log_energy[0] if self._previous is None else self._previous
+        flux = np.maximum(np.diff(log_energy, prepend=previous), 0)
+        self._previous = log_energy[-1]
+
+        # Agrégation par seconde (la dernière seconde du fichier peut être incomplète)
+        starts = np.arange(0, frames, FRAMES_PER_SECOND)
+        counts = np.diff(np.append(starts, frames))
+        self._loudness.append(10 * np.log10(np.add.reduceat(energy, starts) / counts + ENERGY_FLOOR))
+        self._onsets.append(np.add.reduceat(flux, starts))
+
+def _normalise(values):
+    """
+    Ramène une courbe entre 0 et 1 (5e et 95e centiles), sans sensibilité aux valeurs extrêmes.
+    """
+    low, high = np.percentile(values, [5, 95])
+    if high - low < 1e-6:
+        return np.zeros(len(values))
+    return np.clip((values - low) / (high - low), 0, 1)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Réencodage parallèle des vidéos longues par tranches.
+La vidéo est découpée aux images clés en autant de tranches que de cœurs;
+chaque tranche est encodée par son propre processus FFmpeg puis les tranches
+sont assemblées sans réencodage. La piste audio, peu coûteuse, est traitée en
+une seule fois lors de l'assemblage (pas de discontinuité aux jointures).
+
+Les vidéos courtes, pour lesquelles le découpage ne serait pas rentable, sont
+encodées en une seule passe.
+"""
+
+import os
+import tempfile
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from api.utils.media_probe import probe
+from api.utils.smart_cut import ENCODE_PRESET, ENCODE_CRF, AUDIO_BITRATE
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Durée minimale d'une tranche en secondes (en dessous, le surcoût du découpage domine)
+MIN_CHUNK_DURATION = 30.0
+
+def plan_chunks(duration, keyframes, count):
+    """
+    Découpe une vidéo en tranches délimitées par des images clés.
+
+    Args:
+        duration: Durée de la vidéo en secondes
+        keyframes: Instants triés des images clés
+        count: Nombre de tranches souhaité
+
+    Returns:
+        Liste de tuples (début, fin) en secondes couvrant toute la vidéo
+    """
+    marks = np.asarray(keyframes, dtype=np.float64)
+    cuts = []
+    for index in range(1, count):
+        target = duration * index / count
+        if not len(marks):
+            break
+        # Image clé la plus proche de la coupure idéale
+        mark = float(marks[np.argmin(np.abs(marks - target))])
+        if 0 < mark < duration and (not cuts or mark > cuts[-1]):
+            cuts.append(mark)
+
+    bounds = [0.0] + cuts + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def encode_chunked(input_file, output_file, work_dir, video_filter=None, on_progress=None,
+                   max_workers=None, min_duration=None):
+    """
+    Réencode une vidéo en parallèle par tranches.
+
+    Args:
+        input_file: Chemin de la vidéo à encoder
+        output_file: Chemin du fichier de sortie
+        work_dir: Répertoire des fichiers intermédiaires
+        video_filter: Filtre vidéo FFmpeg appliqué à chaque tranche (mise à
+            l'échelle, incrustation...), ou None
+        on_progress: Fonction appelée avec (numéro de la tranche, nombre de
+            tranches, avancement de la tranche entre 0 et 1)
+        max_workers: Nombre de tranches (nombre de cœurs par défaut)
+        min_duration: Durée en dessous de laquelle la vidéo est encodée en une
+            seule passe (Config.CHUNKED_ENCODE_MIN_DURATION par défaut)
+
+    Raises:
+        ValueError: Si une tranche ne peut pas être encodée ou assemblée
+    """
+    if min_duration is None:
+        min_duration = Config.CHUNKED_ENCODE_MIN_DURATION
+
+    info = probe(input_file)
+    duration = info['duration']
+    workers = max_workers or os.cpu_count() or 1
+    count = max(1, min(workers, int(duration // MIN_CHUNK_DURATION))) if duration >= min_duration else 1
+
+    if count > 1:
+        chunks = plan_chunks(duration, probe(input_file, keyframes=True)['keyframes'], count)
+    else:
+        chunks = [(0.0, duration)]
+
+    # Une seule tranche: encodage direct, audio compris
+    if len(chunks) == 1:
+        logger.info(f"Encodage en une seule passe ({duration:.0f}s): {input_file}")
+        _encode_chunk(input_file, 0.0, None, output_file, video_filter, info,
+                      lambda fraction: on_progress and on_progress(0, 1, fraction), with_audio=True)
+        return
+
+    logger.info(f"Encodage parallèle de {input_file}: {len(chunks)} tranches de {duration / len(chunks):.0f}s")
+
+    threads = max(1, (os.cpu_count() or 1) // len(chunks))
+    paths = [os.path.join(work_dir, f"chunk_{index:03d}.mkv") for index in range(len(chunks))]
+
+    def encode(index):
+        start, end = chunks[index]
+        _encode_chunk(input_file, start, end, paths[index], video_filter, info,
+                      lambda fraction: on_progress and on_progress(index, len(chunks), fraction),
+                      with_audio=False, threads=threads)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            # list() propage la première erreur rencontrée
+            list(pool.map(encode, range(len(chunks))))
+
+        join_chunks(paths, [end - start for start, end in chunks], output_file, work_dir,
+                    input_file if info['audio'] is not None else None, info['audio'] and info['audio'].get('codec'))
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+def _encode_chunk(input_file, start, end, output_path, video_filter, info, report, with_audio, threads=0):
+    """
+    Encode une tranche en suivant son avancement (sortie -progress de FFmpeg).
+    """
+    length = (end if end is not None else info['duration']) - start
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-nostats', '-progress', 'pipe:1',
+           '-ss', f"{start:.6f}", '-i', input_file]
+    if end is not None:
+        cmd += ['-t', f"{length:.6f}"]
+    cmd += ['-map', '0:v:0']
+    if video_filter:
+        cmd += ['-vf', video_filter]
+    cmd += ['-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF), '-threads', str(threads)]
+
+    if with_audio:
+        cmd += ['-map', '0:a:0?', '-c:a', 'aac', '-b:a', AUDIO_BITRATE, '-movflags', '+faststart']
+    else:
+        cmd += ['-f', 'matroska']
+    cmd.append(output_path)
+
+    # Erreurs dans un fichier temporaire: un tube non lu pendant le suivi de
+    # l'avancement bloquerait FFmpeg dès qu'il serait plein
+    with tempfile.TemporaryFile() as stderr:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr) as process:
+            # Avancement: lignes "out_time_us=..." émises régulièrement par FFmpeg
+            for line in process.stdout:
+                key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+                if key == 'out_time_us' and value.isdigit() and length > 0:
+                    report(min(int(value) / 1e6 / length, 1.0))
+            process.wait()
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise ValueError(f"Erreur lors de l'encodage de la tranche {start:.3f}-{end if end is not None else 'fin'}: "
+                             f"{stderr.read().decode('utf-8', 'replace')}")
+    report(1.0)
+
+def join_chunks(paths, durations, output_file, work_dir, audio_file=None, audio_codec=None):
+    """
+    Assemble des tranches vidéo par copie et y ajoute une piste audio traitée
+    en une seule fois (pas de discontinuité aux jointures).
+
+    Args:
+        paths: Fichiers des tranches, dans l'ordre
+        durations: Durées des tranches en secondes (positions exactes des
+            jointures, quel que soit l'arrondi des images de chaque tranche)
+        output_file: Chemin du fichier de sortie
+        work_dir: Répertoire des fichiers intermédiaires
+        audio_file: Fichier dont la première piste audio est ajoutée, ou None
+        audio_codec: Codec de cette piste (AAC conservé tel quel, sinon réencodé)
+
+    Raises:
+        ValueError: Si l'assemblage échoue
+    """
+    list_file = os.path.join(work_dir, "chunks.txt")
+    with open(list_file, 'w') as f:
+        for path, duration in zip(paths, durations):
+            f.write(f"file '{path}'\n")
+            f.write(f"duration {duration:.6f}\n")
+
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_file]
+    if audio_file:
+        cmd += ['-i', audio_file]
+    cmd += ['-map', '0:v:0', '-c:v', 'copy']
+    if audio_file:
+        # Audio AAC conservé tel quel, sinon réencodé
+        audio_codec = ['copy'] if audio_codec == 'aac' else ['aac', '-b:a', AUDIO_BITRATE]
+        cmd += ['-map', '1:a:0', '-c:a'] + audio_codec
+    cmd += ['-movflags', '+faststart', output_file]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de l'assemblage des tranches: {e.stderr.decode('utf-8', 'replace')}")
+    finally:
+        os.remove(list_file)
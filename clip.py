@@ -21,7 +21,7 @@ class Clip:
             channel: Nom de la chaîne YouTube
             duration: Durée de la vidéo originale en secondes
             mode: Mode de génération ('short' ou 'long')
-            status: Statut de génération ('processing', 'downloading', 'completed', 'failed')
+            status: Statut de génération ('queued', 'resolving', 'processing', 'downloading', 'completed', 'failed')
             created_at: Date et heure de création
             transitions: Booléen indiquant si les transitions sont activées
         """
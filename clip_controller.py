@@ -4,198 +4,298 @@
 """
 Contrôleur pour la génération des clips.
 Ce module contient la logique métier pour la génération des clips courts et longs.
+
+Les générations sont enregistrées dans la file d'attente persistante (table
+clip_jobs) puis exécutées par le pool de workers du processus. Une tâche
+interrompue par un redémarrage est relancée automatiquement à l'expiration
+de son bail, à partir de sa dernière étape terminée.
+
+La demande est acceptée sans appel réseau: seule l'URL est validée. Les
+informations de la vidéo (titre, chaîne, durée) sont récupérées par le worker
+pendant l'étape 'resolving'.
 """
 
+import os
 import uuid
+import time
 import threading
-from datetime import datetime
-from api.utils.youtube_extractor import extract_video_info
-from api.utils.clip_generator import generate_clip
-from api.models.clip import Clip
-from storage.local_storage import save_clip, get_clip_path
+import logging
+from flask import current_app
+from config import Config
+from api.utils.youtube_extractor import extract_video_info, VideoUnavailableError, _extract_video_id
+from api.utils.clip_generator import generate_clip, PipelineInterrupted
+from api.utils.render_graph import PLAN_MAX_HEIGHTS, render_options_for_plan
+from api.utils.job_executor import get_executor
+from api.utils.scratch_space import get_scratch_space
+from api.utils import job_queue
+from storage.storage_backend import get_storage_backend
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-# Dictionnaire pour stocker les informations sur les clips en cours de génération
-# Clé: clip_id, Valeur: dictionnaire avec les informations du clip
-clips_in_progress = {}
+# Statut du clip après chaque étape terminée du pipeline de génération
+STAGE_STATUSES = {
+    'downloaded': 'processing',
+    'analysed': 'processing',
+    'rendered': 'saving'
+}
 
-def generate_short_clip(youtube_url, transitions=True):
+# Thread de relance des tâches en attente ou abandonnées
+_reaper = None
+
+def init_app(app):
+    """
+    Démarre la relance périodique des tâches en attente ou dont le bail a expiré.
+    Au démarrage, cela reprend les générations interrompues par un redémarrage.
+
+    Args:
+        app: Application Flask
+    """
+    global _reaper
+
+    if _reaper is None and not app.config.get('TESTING'):
+        _reaper = threading.Thread(target=_reaper_loop, args=(app,), name='clip-job-reaper')
+        _reaper.daemon = True
+        _reaper.start()
+
+def generate_short_clip(youtube_url, transitions=True, plan=None, user_id=None):
     """
     Génère un clip court (30-60s) à partir d'une URL YouTube.
-    
+
     Args:
         youtube_url: URL de la vidéo YouTube
         transitions: Booléen indiquant si les transitions doivent être ajoutées
-        
+        plan: Plan de l'utilisateur (qualité maximale et filigrane du rendu), ou None pour le plan gratuit
+        user_id: Identifiant de l'utilisateur demandeur (propriétaire du clip), ou None
+
     Returns:
         L'identifiant unique du clip généré
     """
-    # Génération d'un identifiant unique pour le clip
-    clip_id = str(uuid.uuid4())
-    
-    # Extraction des informations de la vidéo YouTube
-    video_info = extract_video_info(youtube_url)
-    
-    # Création d'un objet Clip
-    clip = Clip(
-        id=clip_id,
-        youtube_url=youtube_url,
-        title=video_info['title'],
-        channel=video_info['channel'],
-        duration=video_info['duration'],
-        mode='short',
-        status='processing',
-        created_at=datetime.now(),
-        transitions=transitions
-    )
-    
-    # Stockage des informations du clip
-    clips_in_progress[clip_id] = clip.__dict__
-    
-    # Lancement de la génération du clip dans un thread séparé
-    thread = threading.Thread(target=_process_short_clip, args=(clip_id, youtube_url, transitions))
-    thread.daemon = True
-    thread.start()
-    
-    return clip_id
+    return _enqueue_clip(youtube_url, 'short', transitions, plan, user_id)
 
-def generate_long_clip(youtube_url, transitions=True):
+def generate_long_clip(youtube_url, transitions=True, plan=None, user_id=None):
     """
     Génère un clip long (20% de la durée totale) à partir d'une URL YouTube.
-    
+
     Args:
         youtube_url: URL de la vidéo YouTube
         transitions: Booléen indiquant si les transitions doivent être ajoutées
-        
+        plan: Plan de l'utilisateur (qualité maximale et filigrane du rendu), ou None pour le plan gratuit
+        user_id: Identifiant de l'utilisateur demandeur (propriétaire du clip), ou None
+
     Returns:
         L'identifiant unique du clip généré
     """
-    # Génération d'un identifiant unique pour le clip
-    clip_id = str(uuid.uuid4())
-    
-    # Extraction des informations de la vidéo YouTube
-    video_info = extract_video_info(youtube_url)
-    
-    # Création d'un objet Clip
-    clip = Clip(
-        id=clip_id,
-        youtube_url=youtube_url,
-        title=video_info['title'],
-        channel=video_info['channel'],
-        duration=video_info['duration'],
-        mode='long',
-        status='processing',
-        created_at=datetime.now(),
-        transitions=transitions
-    )
-    
-    # Stockage des informations du clip
-    clips_in_progress[clip_id] = clip.__dict__
-    
-    # Lancement de la génération du clip dans un thread séparé
-    thread = threading.Thread(target=_process_long_clip, args=(clip_id, youtube_url, transitions))
-    thread.daemon = True
-    thread.start()
-    
-    return clip_id
+    return _enqueue_clip(youtube_url, 'long', transitions, plan, user_id)
 
-def _process_short_clip(clip_id, youtube_url, transitions):
+def _enqueue_clip(youtube_url, mode, transitions, plan=None, user_id=None):
     """
-    Fonction interne pour traiter la génération d'un clip court.
-    
+    Enregistre une génération dans la file d'attente persistante et la soumet au pool.
+
     Args:
-        clip_id: Identifiant unique du clip
         youtube_url: URL de la vidéo YouTube
+        mode: Mode de génération ('short' ou 'long')
         transitions: Booléen indiquant si les transitions doivent être ajoutées
+        plan: Plan de l'utilisateur (qualité maximale et filigrane du rendu), ou None pour le plan gratuit
+        user_id: Identifiant de l'utilisateur demandeur (propriétaire du clip), ou None
+
+    Returns:
+        L'identifiant unique du clip
+
+    Raises:
+        ValueError: Si l'URL YouTube n'est pas valide
+    """
+    # Validation locale de l'URL (les informations de la vidéo sont récupérées par le worker)
+    if not _extract_video_id(youtube_url):
+        raise ValueError("URL YouTube invalide")
+
+    # Génération d'un identifiant unique pour le clip
+    clip_id = str(uuid.uuid4())
+
+    # Enregistrement de la tâche
+    job_queue.enqueue(clip_id, youtube_url, mode, transitions, plan=plan, user_id=user_id)
+
+    # Mise en file d'attente de la génération (pool limité à MAX_CONCURRENT_GENERATIONS)
+    _dispatch(current_app._get_current_object(), clip_id)
+
+    return clip_id
+
+def _dispatch(app, clip_id):
+    """
+    Soumet une tâche au pool de workers si elle n'y est pas déjà.
+    """
+    executor = get_executor()
+    if not executor.is_pending(clip_id):
+        executor.submit(clip_id, _run_job, app, clip_id)
+
+def _run_job(app, clip_id):
     """
-    try:
-        # Mise à jour du statut
-        clips_in_progress[clip_id]['status'] = 'downloading'
-        
-        # Génération du clip
-        clip_path = generate_clip(youtube_url, 'short', transitions)
-        
-        # Sauvegarde du clip
-        file_path = save_clip(clip_path, clip_id)
-        
-        # Mise à jour des informations du clip
-        clips_in_progress[clip_id]['status'] = 'completed'
-        clips_in_progress[clip_id]['file_path'] = file_path
-        clips_in_progress[clip_id]['completed_at'] = datetime.now()
-        
-    except Exception as e:
-        # En cas d'erreur, mise à jour du statut
-        clips_in_progress[clip_id]['status'] = 'failed'
-        clips_in_progress[clip_id]['error'] = str(e)
-
-def _process_long_clip(clip_id, youtube_url, transitions):
-    """
-    Fonction interne pour traiter la génération d'un clip long.
-    
+    Fonction interne exécutée par un worker pour traiter une génération.
+
     Args:
+        app: Application Flask (pour l'accès à la base de données)
         clip_id: Identifiant unique du clip
-        youtube_url: URL de la vidéo YouTube
-        transitions: Booléen indiquant si les transitions doivent être ajoutées
     """
-    try:
-        # Mise à jour du statut
-        clips_in_progress[clip_id]['status'] = 'downloading'
-        
-        # Génération du clip
-        clip_path = generate_clip(youtube_url, 'long', transitions)
-        
-        # Sauvegarde du clip
-        file_path = save_clip(clip_path, clip_id)
-        
-        # Mise à jour des informations du clip
-        clips_in_progress[clip_id]['status'] = 'completed'
-        clips_in_progress[clip_id]['file_path'] = file_path
-        clips_in_progress[clip_id]['completed_at'] = datetime.now()
-        
-    except Exception as e:
-        # En cas d'erreur, mise à jour du statut
-        clips_in_progress[clip_id]['status'] = 'failed'
-        clips_in_progress[clip_id]['error'] = str(e)
+    with app.app_context():
+        owner = job_queue.worker_id()
+        job = job_queue.claim(clip_id, owner)
+
+        # La tâche est déjà traitée par un autre worker ou terminée
+        if job is None:
+            return
+
+        checkpoint = job_queue.load_checkpoint(job)
+
+        with job_queue.Heartbeat(app, clip_id, owner) as heartbeat:
+            def on_stage(stage, results):
+                # Enregistrement du point de reprise, sauf si le bail a été perdu
+                if heartbeat.lost.is_set() or not job_queue.save_checkpoint(clip_id, owner, stage, results):
+                    raise PipelineInterrupted(f"Bail perdu pour la tâche {clip_id}")
+                job_queue.update(clip_id, owner, status=STAGE_STATUSES[stage])
+                if stage == 'downloaded' and results.get('source'):
+                    job_queue.record_source(clip_id, owner, results['source'])
+
+            try:
+                # Récupération des informations de la vidéo YouTube
+                job_queue.update(clip_id, owner, status='resolving')
+                video_info = extract_video_info(job.youtube_url)
+                if job.title is None:
+                    job_queue.record_video_info(clip_id, owner, video_info)
+
+                # Mise à jour du statut
+                job_queue.update(clip_id, owner, status='processing' if checkpoint.get('video_path') else 'downloading')
+
+                # Génération du clip selon le plan du demandeur (qualité de la source, mise à
+                # l'échelle, filigrane); une demande anonyme est traitée comme le plan gratuit
+                plan = job.plan or 'free'
+                clip_path = generate_clip(job.youtube_url, job.mode, job.transitions, checkpoint, on_stage, video_info,
+                                          render_options=render_options_for_plan(plan),
+                                          max_height=PLAN_MAX_HEIGHTS.get(plan))
+
+                # Sauvegarde du clip puis suppression de l'espace de travail (source, segments, clip)
+                file_path = get_storage_backend().save(clip_path, clip_id, owner=job.user_id)
+                get_scratch_space().discard(os.path.dirname(clip_path))
+
+                # Mise à jour des informations du clip
+                job_queue.complete(clip_id, owner, file_path)
+
+            except PipelineInterrupted as e:
+                logger.warning(str(e))
+
+            except VideoUnavailableError as e:
+                # Vidéo privée ou supprimée: inutile de relancer la tâche
+                job_queue.fail(clip_id, owner, str(e), retry=False)
+
+            except Exception as e:
+                # En cas d'erreur, la tâche est relancée ou marquée en échec
+                if job_queue.fail(clip_id, owner, str(e)):
+                    logger.warning(f"Échec de la tentative {job.attempts} pour {clip_id}, nouvelle tentative prévue")
+
+def _reaper_loop(app):
+    """
+    Relance périodiquement les tâches en attente et celles dont le bail a expiré.
+    Seules les tâches que le pool local peut démarrer sont soumises, la file
+    persistante restant la file d'attente de référence entre les processus.
+    Les espaces de travail abandonnés après un arrêt brutal sont supprimés au passage.
+    """
+    executor = get_executor()
+
+    while True:
+        try:
+            with app.app_context():
+                stats = executor.stats()
+                capacity = stats['max_workers'] - stats['running'] - stats['queued']
+                if capacity > 0:
+                    for clip_id in job_queue.dispatchable_ids(limit=capacity):
+                        _dispatch(app, clip_id)
+        except Exception as e:
+            logger.warning(f"Erreur lors de la relance des tâches: {str(e)}")
+
+        try:
+            get_scratch_space().reap()
+        except Exception as e:
+            logger.warning(f"Erreur lors du nettoyage des espaces de travail: {str(e)}")
+
+        time.sleep(Config.JOB_REAPER_INTERVAL)
 
 def get_clip_status(clip_id):
     """
     Récupère le statut de génération d'un clip.
-    
+
     Args:
         clip_id: Identifiant unique du clip
-        
+
     Returns:
         Dictionnaire contenant le statut du clip ou None si le clip n'existe pas
     """
-    if clip_id not in clips_in_progress:
+    job = job_queue.get_job(clip_id)
+
+    if job is None:
         return None
-    
-    clip_info = clips_in_progress[clip_id]
-    
+
+    # Position dans la file d'attente pour les clips pas encore démarrés
+    queue_position = None
+    if job.status == 'queued':
+        queue_position = job_queue.queue_position(clip_id)
+
     return {
         'id': clip_id,
-        'status': clip_info['status'],
-        'created_at': clip_info['created_at'].isoformat(),
-        'completed_at': clip_info.get('completed_at', None).isoformat() if clip_info.get('completed_at') else None,
-        'error': clip_info.get('error', None)
+        'status': job.status,
+        'queue_position': queue_position,
+        'created_at': job.created_at.isoformat(),
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+        'error': job.error
     }
 
 def get_clip_info(clip_id):
     """
     Récupère les informations complètes d'un clip.
-    
+
     Args:
         clip_id: Identifiant unique du clip
-        
+
     Returns:
         Dictionnaire contenant les informations du clip ou None si le clip n'existe pas
     """
-    if clip_id not in clips_in_progress:
+    job = job_queue.get_job(clip_id)
+
+    if job is None:
         return None
-    
-    clip_info = clips_in_progress[clip_id]
-    
+
+    clip_info = job.to_dict()
+
     # Si le clip est terminé, on ajoute l'URL de téléchargement
     if clip_info['status'] == 'completed':
         clip_info['download_url'] = f"/api/clips/{clip_id}/download"
-    
+
     return clip_info
+
+def get_clip_file(clip_id, as_attachment=False):
+    """
+    Récupère l'emplacement d'un clip terminé.
+
+    Args:
+        clip_id: Identifiant unique du clip
+        as_attachment: Booléen indiquant si le clip est téléchargé en pièce jointe
+
+    Returns:
+        Dictionnaire contenant 'url' (URL signée du moteur de stockage) ou
+        'path' et 'relative_path' (fichier local et chemin relatif au
+        répertoire de stockage), ou None si le clip n'existe pas ou n'est pas terminé
+    """
+    job = job_queue.get_job(clip_id)
+
+    if job is None or job.status != 'completed':
+        return None
+
+    backend = get_storage_backend()
+
+    clip_file = backend.local_path(clip_id)
+    if clip_file is not None:
+        file_path, relative_path = clip_file
+        return {'path': file_path, 'relative_path': relative_path}
+
+    # Clip stocké hors de la machine: téléchargement direct depuis le moteur
+    url = backend.url(clip_id, download_name=f"{clip_id}.mp4", as_attachment=as_attachment)
+    return {'url': url} if url else None
@@ -7,24 +7,70 @@ Ce module adapte le script bot_clip.py original en une API utilisable.
 """
 
 import os
-import random
 import subprocess
 import tempfile
 import logging
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from config import Config
+from api.utils.youtube_extractor import extract_video_info, download_video, open_video_stream, _extract_video_id
+from api.utils.source_cache import get_source_cache
+from api.utils.segment_planner import plan_segments, scores_from_heatmap, snap_to_keyframes
+from api.utils.partial_download import resolve_stream_url, fetch_sections
+from api.utils.media_probe import probe
+from api.utils.highlight_analysis import analyse_video
+from api.utils.score_index import get_score_index
+from api.utils.smart_cut import render_smart_cut
+from api.utils.transitions import render_with_transitions
+from api.utils.render_graph import render_clip
+from api.utils.format_selection import SOURCE_FORMAT, select_source_format
+from api.utils.stream_cut import stream_clip, stop_stream
+from api.utils.scratch_space import get_scratch_space, check_free_space
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_clip(youtube_url, mode='short', transitions=True):
+class PipelineInterrupted(Exception):
+    """
+    Levée par le callback on_stage pour interrompre une génération en
+    conservant le répertoire de travail (reprise par un autre worker).
+    """
+
+def generate_clip(youtube_url, mode='short', transitions=True, checkpoint=None, on_stage=None, video_info=None,
+                  render_options=None, max_height=None):
     """
     Génère un clip à partir d'une vidéo YouTube.
     
+    Le pipeline est découpé en étapes (téléchargement, analyse, rendu). Après
+    chaque étape, les résultats sont ajoutés au point de reprise et transmis à
+    on_stage, ce qui permet de reprendre une génération interrompue sans
+    refaire les étapes déjà terminées.
+    
+    Pour les vidéos longues, les segments sont choisis à partir des métadonnées
+    et seules les plages correspondantes sont téléchargées (téléchargement partiel).
+    Pour les clips courts dont les segments sont connus d'avance, la vidéo est
+    découpée au fil du téléchargement, sans fichier source intermédiaire.
+    
+    Le format de la source est le plus petit dont la hauteur suffit au rendu
+    (max_height); le format retenu et les octets évités sont ajoutés au point
+    de reprise ('source') à la fin du téléchargement.
+    
+    Les fichiers de travail sont écrits dans un espace de travail (voir
+    scratch_space), supprimé en cas d'échec. En cas de succès, il contient le
+    clip et doit être supprimé par l'appelant une fois le clip sauvegardé
+    (get_scratch_space().discard(os.path.dirname(chemin du clip))).
+    
     Args:
         youtube_url: URL de la vidéo YouTube
         mode: Mode de génération ('short' ou 'long')
         transitions: Booléen indiquant si les transitions doivent être ajoutées
+        checkpoint: Dictionnaire des résultats d'une exécution précédente (ou None)
+        on_stage: Fonction appelée avec (étape, point de reprise) après chaque étape
+        video_info: Informations de la vidéo déjà extraites (ou None)
+        render_options: Traitements liés au plan de l'utilisateur (voir
+            render_graph.render_options_for_plan), ou None
+        max_height: Hauteur maximale du rendu (qualité du plan), ou None
         
     Returns:
         Chemin du fichier clip généré
@@ -35,195 +81,417 @@ def generate_clip(youtube_url, mode='short', transitions=True):
     if mode not in ['short', 'long']:
         raise ValueError("Mode invalide. Utilisez 'short' ou 'long'.")
     
-    # Création d'un répertoire temporaire pour les fichiers de travail
-    temp_dir = tempfile.mkdtemp()
-    output_file = os.path.join(temp_dir, f"clip_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+    checkpoint = dict(checkpoint or {})
+    
+    def stage_done(stage, **results):
+        checkpoint.update(results)
+        if on_stage:
+            on_stage(stage, dict(checkpoint))
+    
+    # Réutilisation de l'espace de travail d'une exécution précédente s'il existe encore
+    scratch = get_scratch_space()
+    temp_dir = scratch.attach(checkpoint.get('temp_dir'))
+    if not temp_dir:
+        temp_dir = scratch.create(_extract_video_id(youtube_url))
+        checkpoint = {'temp_dir': temp_dir}
     
     try:
-        # Téléchargement de la vidéo
-        logger.info(f"Téléchargement de la vidéo: {youtube_url}")
-        video_path = _download_video(youtube_url, temp_dir)
+        output_file = checkpoint.get('output_file')
+        if output_file and os.path.exists(output_file):
+            logger.info(f"Clip déjà généré lors d'une exécution précédente: {output_file}")
+            return output_file
         
-        # Obtention de la durée de la vidéo
-        video_duration = _get_video_duration(video_path)
-        logger.info(f"Durée de la vidéo: {video_duration} secondes")
+        output_file = os.path.join(temp_dir, f"clip_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
         
-        # Détection des segments populaires
-        if mode == 'short':
-            segments = _detect_short_segments(video_path)
+        if video_info is None and Config.PARTIAL_FETCH_ENABLED:
+            video_info = extract_video_info(youtube_url)
+        
+        source = select_source_format(video_info, max_height)
+        
+        if _use_partial_fetch(youtube_url, video_info, checkpoint):
+            sources = nullcontext(
+                _generate_from_sections(youtube_url, mode, video_info, temp_dir, checkpoint, stage_done, source))
+        elif _use_streaming(youtube_url, mode, video_info, checkpoint):
+            _generate_streamed(youtube_url, mode, video_info, temp_dir, output_file, transitions, render_options,
+                               checkpoint, stage_done, source)
+            stage_done('rendered', output_file=output_file)
+            return output_file
         else:
-            segments = _detect_long_segments(video_path, video_duration)
+            sources = _generate_from_source(youtube_url, mode, temp_dir, checkpoint, stage_done, source)
         
-        # Génération du clip
-        logger.info(f"Génération du clip en mode {mode} avec {len(segments)} segments")
-        _create_clip(video_path, segments, output_file, transitions)
+        # Génération du clip, la source restant réservée dans le cache jusqu'à la fin du rendu
+        with sources as pieces:
+            logger.info(f"Génération du clip en mode {mode} avec {len(pieces)} segments")
+            _create_clip(pieces, output_file, transitions, render_options)
+            stage_done('rendered', output_file=output_file)
         
         return output_file
     
+    except PipelineInterrupted:
+        raise
+    
     except Exception as e:
         logger.error(f"Erreur lors de la génération du clip: {str(e)}")
-        # Nettoyage des fichiers temporaires en cas d'erreur
-        _cleanup(temp_dir)
+        # Suppression de l'espace de travail en cas d'erreur
+        scratch.discard(temp_dir)
         raise ValueError(f"Erreur lors de la génération du clip: {str(e)}")
+    
+    finally:
+        # Espace conservé (clip généré ou reprise par un autre worker) mais plus verrouillé
+        scratch.detach(temp_dir)
+
+def _use_partial_fetch(youtube_url, video_info, checkpoint):
+    """
+    Indique si la vidéo est assez longue pour ne télécharger que les segments
+    retenus, et si ces segments peuvent être choisis sans la vidéo (courbe de
+    scores déjà calculée ou courbe de popularité YouTube). Sinon la vidéo
+    complète est téléchargée et analysée: les segments ne sont jamais tirés au hasard.
+    """
+    if not Config.PARTIAL_FETCH_ENABLED or not video_info:
+        return False
+    if (video_info.get('duration') or 0) < Config.PARTIAL_FETCH_MIN_DURATION:
+        return False
+    # Source complète déjà téléchargée lors d'une exécution précédente
+    if checkpoint.get('video_path'):
+        return False
+    return bool(checkpoint.get('segments')) or _scores_from_metadata(youtube_url, video_info)[0] is not None
+
+def _use_streaming(youtube_url, mode, video_info, checkpoint):
+    """
+    Indique si le clip peut être découpé au fil du téléchargement: clip court
+    dont les segments sont connus sans analyser la vidéo.
+    """
+    if not Config.STREAMING_CUT_ENABLED or mode != 'short' or not video_info:
+        return False
+    # Source déjà téléchargée lors d'une exécution précédente
+    if checkpoint.get('video_path'):
+        return False
+    return bool(checkpoint.get('segments')) or _scores_from_metadata(youtube_url, video_info)[0] is not None
+
+def _generate_streamed(youtube_url, mode, video_info, temp_dir, output_file, transitions, render_options,
+                       checkpoint, stage_done, source):
+    """
+    Génère le clip en découpant la vidéo au fil du téléchargement (seul le clip est écrit).
+    """
+    segments = checkpoint.get('segments')
+    if not segments:
+        scores, boundaries = _scores_from_metadata(youtube_url, video_info)
+        segments = plan_segments(video_info['duration'], mode, scores, boundaries)
+        stage_done('analysed', segments=[list(segment) for segment in segments])
+    
+    get_scratch_space().reserve(temp_dir, _estimate_bytes(source, segments, video_info['duration']))
+    
+    logger.info(f"Découpe de {len(segments)} segments au fil du téléchargement: {youtube_url}")
+    transition = Config.TRANSITION_DURATION if transitions else 0.0
+    
+    with tempfile.TemporaryFile() as errors:
+        stream = open_video_stream(youtube_url, source['format'], stderr=errors)
+        try:
+            stream_clip(stream, segments, output_file, source.get('fps'), transition,
+                        with_audio=source.get('audio') is not False, **(render_options or {}))
+        except ValueError as e:
+            # L'erreur du téléchargeur explique généralement celle de FFmpeg
+            errors.seek(0)
+            downloader_error = errors.read().decode('utf-8', 'replace').strip()
+            raise ValueError(f"{str(e)} {downloader_error}".strip())
+        finally:
+            # Téléchargeur arrêté même si la découpe n'a pas pu commencer
+            stop_stream(stream)
+    
+    stage_done('downloaded', source=source)
+
+def _scores_from_metadata(youtube_url, video_info):
+    """
+    Récupère une courbe de scores sans télécharger la vidéo: courbe déjà
+    calculée lors d'une génération précédente, sinon courbe de popularité YouTube.
+    
+    Returns:
+        Tuple (scores par seconde ou None, coupures de plan ou None)
+    """
+    indexed = get_score_index().get(_extract_video_id(youtube_url))
+    if indexed is not None:
+        return indexed['scores'], indexed['boundaries']
+    return scores_from_heatmap(video_info.get('heatmap'), video_info['duration']), None
+
+@contextmanager
+def _generate_from_source(youtube_url, mode, temp_dir, checkpoint, stage_done, source=None):
+    """
+    Prépare les segments à partir de la vidéo complète (partagée via le cache des sources).
+    
+    La vidéo reste réservée dans le cache (ni évincée ni supprimée) tant que
+    le contexte est ouvert: le rendu doit y être effectué.
+    
+    Returns:
+        Gestionnaire de contexte fournissant la liste des segments à assembler
+        (tuples de fichier, début et fin)
+    """
+    source = source or select_source_format(None)
+    
+    # Téléchargement de la vidéo, partagé avec les autres générations via le cache des sources
+    with _open_source(youtube_url, source['format'], source.get('filesize')) as video_path:
+        if checkpoint.get('video_path') != video_path:
+            stage_done('downloaded', video_path=video_path, source=source)
+        
+        # Détection des segments populaires
+        segments = checkpoint.get('segments')
+        if not segments:
+            # Obtention de la durée de la vidéo
+            video_duration = _get_video_duration(video_path)
+            logger.info(f"Durée de la vidéo: {video_duration} secondes")
+            
+            video_id = _extract_video_id(youtube_url)
+            if mode == 'short':
+                segments = _detect_short_segments(video_path, video_id)
+            else:
+                segments = _detect_long_segments(video_path, video_duration, video_id)
+            
+            # Alignement sur les images clés: la copie sans réencodage reste exacte
+            # (inutile en découpe à l'image près, qui réencode les extrémités)
+            if not Config.FRAME_ACCURATE_CUTS:
+                segments = snap_to_keyframes(segments, _get_keyframes(video_path), video_duration)
+            stage_done('analysed', segments=[list(segment) for segment in segments])
+        
+        yield [(video_path, start, end) for start, end in segments]
+
+def _generate_from_sections(youtube_url, mode, video_info, temp_dir, checkpoint, stage_done, source=None):
+    """
+    Choisit les segments à partir des métadonnées puis télécharge uniquement
+    les plages correspondantes.
+    
+    Returns:
+        Liste des segments à assembler (tuples de fichier, début et fin)
+    """
+    # Choix des segments sans téléchargement (index des scores ou courbe de popularité YouTube)
+    segments = checkpoint.get('segments')
+    if not segments:
+        scores, boundaries = _scores_from_metadata(youtube_url, video_info)
+        segments = plan_segments(video_info['duration'], mode, scores, boundaries)
+        stage_done('analysed', segments=[list(segment) for segment in segments])
+    
+    # Téléchargement des plages retenues uniquement
+    section_paths = checkpoint.get('section_paths')
+    if not section_paths or not all(os.path.exists(path) for path in section_paths):
+        logger.info(f"Téléchargement partiel de {len(segments)} plages: {youtube_url}")
+        source = source or select_source_format(video_info)
+        get_scratch_space().reserve(temp_dir, _estimate_bytes(source, segments, video_info['duration']))
+        stream_url = resolve_stream_url(youtube_url, source['format'])
+        section_paths = fetch_sections(stream_url, segments, temp_dir)
+        stage_done('downloaded', section_paths=section_paths, source=source)
+    
+    return [(path, 0, None) for path in section_paths]
+
+def _estimate_bytes(source, segments, duration):
+    """
+    Estime la taille des plages retenues à partir de la taille du format source.
+    
+    Returns:
+        Taille estimée en octets, ou None si la taille du format n'est pas connue
+    """
+    if not source.get('filesize') or not duration:
+        return None
+    covered = sum(end - start for start, end in segments)
+    return int(source['filesize'] * min(1.0, covered / duration))
+
+def _open_source(youtube_url, fmt=SOURCE_FORMAT, expected_bytes=None):
+    """
+    Réserve la vidéo source dans le cache partagé, en la téléchargeant si nécessaire.
+    
+    Args:
+        youtube_url: URL de la vidéo YouTube
+        fmt: Format demandé au téléchargeur
+        expected_bytes: Taille estimée de la vidéo en octets (vérification de
+            l'espace libre avant le téléchargement), ou None
+        
+    Returns:
+        Gestionnaire de contexte fournissant le chemin de la vidéo
+    """
+    video_id = _extract_video_id(youtube_url)
+    if not video_id:
+        raise ValueError("URL YouTube invalide")
+    
+    def fetch(output_dir):
+        check_free_space(output_dir, expected_bytes)
+        logger.info(f"Téléchargement de la vidéo: {youtube_url}")
+        return _download_video(youtube_url, output_dir, fmt)
+    
+    return get_source_cache().open(video_id, fmt, fetch)
 
-def _download_video(youtube_url, output_dir):
+def _download_video(youtube_url, output_dir, fmt=SOURCE_FORMAT):
     """
     Télécharge une vidéo YouTube.
     
     Args:
         youtube_url: URL de la vidéo YouTube
         output_dir: Répertoire de sortie
+        fmt: Format demandé au téléchargeur
         
     Returns:
         Chemin du fichier vidéo téléchargé
     """
     output_template = os.path.join(output_dir, "video.%(ext)s")
     
-    cmd = [
-        'youtube-dl',
-        '--format', 'best[ext=mp4]',
-        '--output', output_template,
-        youtube_url
-    ]
+    download_video(youtube_url, output_template, fmt)
     
-    try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        
-        # Recherche du fichier téléchargé
-        for file in os.listdir(output_dir):
-            if file.startswith("video."):
-                return os.path.join(output_dir, file)
-        
-        raise ValueError("Fichier vidéo non trouvé après téléchargement")
+    # Recherche du fichier téléchargé
+    for file in os.listdir(output_dir):
+        if file.startswith("video."):
+            return os.path.join(output_dir, file)
     
-    except subprocess.CalledProcessError as e:
-        raise ValueError(f"Erreur lors du téléchargement de la vidéo: {e.stderr.decode('utf-8')}")
+    raise ValueError("Fichier vidéo non trouvé après téléchargement")
 
 def _get_video_duration(video_path):
     """
     Obtient la durée d'une vidéo en secondes.
     
+    L'analyse est mise en cache par le service d'analyse des médias: les
+    appels répétés pour un même fichier ne relancent pas ffprobe.
+    
     Args:
         video_path: Chemin du fichier vidéo
         
     Returns:
         Durée de la vidéo en secondes
     """
-    cmd = [
-        'ffprobe',
-        '-v', 'error',
-        '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1',
-        video_path
-    ]
+    return probe(video_path)['duration']
+
+def _get_keyframes(video_path):
+    """
+    Obtient les instants des images clés d'une vidéo.
     
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        return float(result.stdout.strip())
+    L'index est relevé une seule fois par fichier (lecture des paquets, sans
+    décodage) puis conservé par le service d'analyse des médias.
     
-    except subprocess.CalledProcessError as e:
-        raise ValueError(f"Erreur lors de l'obtention de la durée de la vidéo: {e.stderr}")
-    except ValueError:
-        raise ValueError("Impossible de convertir la durée en nombre")
+    Returns:
+        Liste des instants des images clés en secondes (vide si le relevé échoue)
+    """
+    try:
+        return probe(video_path, keyframes=True)['keyframes']
+    except ValueError as e:
+        logger.warning(f"Relevé des images clés impossible, segments non alignés: {str(e)}")
+        return []
 
-def _detect_short_segments(video_path):
+def _detect_short_segments(video_path, video_id=None):
     """
     Détecte les segments populaires pour un clip court.
     
     Args:
         video_path: Chemin du fichier vidéo
+        video_id: Identifiant de la vidéo YouTube (clé de l'index des scores)
         
     Returns:
         Liste des segments (tuples de début et fin en secondes)
     """
-    # Pour un clip court, on choisit une durée aléatoire entre 30 et 60 secondes
-    clip_duration = random.randint(30, 60)
-    
-    # Simulation de la détection des segments populaires
-    # Dans une implémentation réelle, on utiliserait l'algorithme de détection
-    # des moments populaires du script original
-    
-    # Pour l'instant, on prend simplement un segment aléatoire dans la vidéo
     video_duration = _get_video_duration(video_path)
-    
-    # On s'assure que le segment ne dépasse pas la durée de la vidéo
-    if clip_duration >= video_duration:
-        start_time = 0
-        end_time = video_duration
-    else:
-        max_start_time = video_duration - clip_duration
-        start_time = random.uniform(0, max_start_time)
-        end_time = start_time + clip_duration
-    
-    return [(start_time, end_time)]
+    scores, boundaries = _analyse_highlights(video_path, video_id)
+    return plan_segments(video_duration, 'short', scores, boundaries)
 
-def _detect_long_segments(video_path, video_duration):
+def _detect_long_segments(video_path, video_duration, video_id=None):
     """
     Détecte les segments populaires pour un clip long.
     
     Args:
         video_path: Chemin du fichier vidéo
         video_duration: Durée de la vidéo en secondes
+        video_id: Identifiant de la vidéo YouTube (clé de l'index des scores)
         
     Returns:
         Liste des segments (tuples de début et fin en secondes)
     """
-    # Pour un clip long, on vise 20% de la durée totale
-    target_duration = video_duration * 0.2
-    
-    # Durées possibles pour les segments (en secondes)
-    segment_durations = [30, 60, 120, 180, 300]
-    
-    # Simulation de la détection des segments populaires
-    # Dans une implémentation réelle, on utiliserait l'algorithme de détection
-    # des moments populaires du script original
+    scores, boundaries = _analyse_highlights(video_path, video_id)
+    return plan_segments(video_duration, 'long', scores, boundaries)
+
+def _analyse_highlights(video_path, video_id=None):
+    """
+    Calcule la courbe des moments forts d'une vidéo et ses coupures de plan.
     
-    segments = []
-    current_duration = 0
+    Tous les analyseurs enregistrés (énergie audio, mouvement...) partagent un
+    seul décodage de la vidéo; leurs courbes sont fusionnées en un score par
+    seconde. Le résultat est enregistré dans l'index des scores et réutilisé
+    sans décodage par les générations suivantes de la même vidéo.
     
-    while current_duration < target_duration:
-        # Choix aléatoire d'une durée de segment
-        duration = random.choice(segment_durations)
-        
-        # Si on dépasse la cible avec ce segment, on ajuste
-        if current_duration + duration > target_duration:
-            duration = target_duration - current_duration
-        
-        # Si la durée restante est trop courte, on arrête
-        if duration < 10:
-            break
-        
-        # Choix aléatoire d'un moment de début
-        max_start_time = video_duration - duration
-        start_time = random.uniform(0, max_start_time)
-        end_time = start_time + duration
-        
-        # Ajout du segment
-        segments.append((start_time, end_time))
-        current_duration += duration
+    Returns:
+        Tuple (scores par seconde ou None, liste des coupures de plan). En cas
+        d'échec de l'analyse, les segments sont choisis au hasard.
+    """
+    index = get_score_index() if video_id else None
+    if index is not None:
+        indexed = index.get(video_id)
+        if indexed is not None:
+            return indexed['scores'], indexed['boundaries']
     
-    return segments
+    try:
+        analysis = analyse_video(video_path)
+    except ValueError as e:
+        logger.warning(f"Analyse des moments forts impossible, choix aléatoire des segments: {str(e)}")
+        return None, []
+    
+    if index is not None:
+        try:
+            index.put(video_id, analysis['scores'], analysis['boundaries'], _get_video_duration(video_path))
+        except OSError as e:
+            logger.warning(f"Impossible d'enregistrer les scores dans l'index: {str(e)}")
+    
+    return analysis['scores'], analysis['boundaries']
 
-def _create_clip(video_path, segments, output_file, transitions=True):
+def _needs_render(pieces, render_options):
+    """
+    Indique si les options de rendu du plan modifient l'image: incrustation, ou
+    source plus haute que la qualité du plan (sinon le clip peut être assemblé
+    sans ce réencodage).
+    """
+    if render_options.get('watermark'):
+        return True
+
+    max_height = render_options.get('max_height')
+    if not max_height:
+        return False
+    for video_path in {piece[0] for piece in pieces}:
+        height = (probe(video_path)['video'] or {}).get('height')
+        if not height or height > max_height:
+            return True
+    return False
+
+def _create_clip(pieces, output_file, transitions=True, render_options=None):
     """
     Crée un clip à partir des segments spécifiés.
     
     Args:
-        video_path: Chemin du fichier vidéo source
-        segments: Liste des segments (tuples de début et fin en secondes)
+        pieces: Liste des segments (tuples de fichier source, début et fin en
+            secondes; une fin à None désigne la fin du fichier)
         output_file: Chemin du fichier de sortie
         transitions: Booléen indiquant si les transitions doivent être ajoutées
+        render_options: Mise à l'échelle et filigrane à appliquer, ou None
     """
-    # Création d'un fichier temporaire pour la liste des segments
     temp_dir = os.path.dirname(output_file)
+    
+    # Traitements liés au plan: découpe, transitions, mise à l'échelle et
+    # filigrane compilés en un seul rendu (un décodage et un encodage par image),
+    # encodé par tranches parallèles pour les clips longs
+    if render_options and _needs_render(pieces, render_options):
+        transition = Config.TRANSITION_DURATION if transitions else 0.0
+        render_clip(pieces, output_file, transition, work_dir=temp_dir, **render_options)
+        return
+    
+    # Transitions: chaque segment est encodé en parallèle avec son fondu, puis assemblé par copie
+    if transitions and len(pieces) > 1:
+        render_with_transitions(pieces, output_file, temp_dir, Config.TRANSITION_DURATION)
+        return
+    
+    # Découpe à l'image près: seules les extrémités des segments sont réencodées
+    if Config.FRAME_ACCURATE_CUTS:
+        render_smart_cut(pieces, output_file, temp_dir)
+        return
+    
+    # Création d'un fichier temporaire pour la liste des segments
     segments_file = os.path.join(temp_dir, "segments.txt")
     
     with open(segments_file, 'w') as f:
-        for i, (start, end) in enumerate(segments):
-            # Format: fichier_entrée|début|fin|fichier_sortie
+        for video_path, start, end in pieces:
             f.write(f"file '{video_path}'\n")
-            f.write(f"inpoint {start}\n")
-            f.write(f"outpoint {end}\n")
+            if start:
+                f.write(f"inpoint {start}\n")
+            if end is not None:
+                f.write(f"outpoint {end}\n")
     
     # Commande FFmpeg pour créer le clip
     cmd = [
@@ -232,18 +500,10 @@ def _create_clip(video_path, segments, output_file, transitions=True):
         '-f', 'concat',
         '-safe', '0',
         '-i', segments_file,
-        '-c', 'copy'
+        '-c', 'copy',
+        output_file
     ]
     
-    # Ajout des transitions si demandé
-    if transitions and len(segments) > 1:
-        # Dans une implémentation réelle, on ajouterait des transitions
-        # Pour l'instant, on utilise simplement une copie directe
-        pass
-    
-    # Ajout du fichier de sortie
-    cmd.append(output_file)
-    
     try:
         subprocess.run(cmd, check=True, capture_output=True)
     
@@ -254,21 +514,3 @@ def _create_clip(video_path, segments, output_file, transitions=True):
         # Nettoyage du fichier de segments
         if os.path.exists(segments_file):
             os.remove(segments_file)
-
-def _cleanup(directory):
-    """
-    Nettoie les fichiers temporaires.
-    
-    Args:
-        directory: Répertoire à nettoyer
-    """
-    try:
-        for file in os.listdir(directory):
-            file_path = os.path.join(directory, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        
-        os.rmdir(directory)
-    
-    except Exception as e:
-        logger.warning(f"Erreur lors du nettoyage des fichiers temporaires: {str(e)}")
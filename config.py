@@ -6,6 +6,7 @@ Configuration pour l'API du générateur de clips "Best Of".
 """
 
 import os
+import tempfile
 
 class Config:
     """
@@ -17,12 +18,70 @@ class Config:
     # Configuration du stockage des clips
     CLIPS_STORAGE_DIR = os.environ.get('CLIPS_STORAGE_DIR', '/home/ubuntu/clips_storage')
     
+    # Téléchargement des clips: emplacement interne Nginx (X-Accel-Redirect) ou envoi par l'application si vide
+    DOWNLOAD_ACCEL_REDIRECT = os.environ.get('DOWNLOAD_ACCEL_REDIRECT', '')
+    DOWNLOAD_MAX_AGE = 3600  # Durée de mise en cache des clips par le navigateur en secondes (revalidation par ETag)
+
+    # Moteur de stockage des clips: 'local' (CLIPS_STORAGE_DIR) ou 's3' (bucket compatible S3, MinIO...)
+    # Les identifiants S3 sont lus par boto3 (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY...)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local').lower()
+    S3_BUCKET = os.environ.get('S3_BUCKET', '')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', '')  # Vide pour AWS
+    S3_REGION = os.environ.get('S3_REGION', '')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'clips/')
+    S3_MULTIPART_CHUNK_SIZE = int(os.environ.get('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 ** 2))  # Taille des parties (5 Mo minimum)
+    S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 8))  # Parties envoyées en parallèle
+    S3_URL_EXPIRATION = 3600  # Durée de validité des URL de téléchargement signées en secondes
+    
+    # Configuration de la base de données (SQLite en local, PostgreSQL en production)
+    DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///clips.db').replace('postgres://', 'postgresql://', 1)
+    
+    # Cache des vidéos sources partagé entre les générations
+    SOURCE_CACHE_DIR = os.environ.get('SOURCE_CACHE_DIR', '/home/ubuntu/source_cache')
+    SOURCE_CACHE_MAX_BYTES = int(os.environ.get('SOURCE_CACHE_MAX_BYTES', 20 * 1024 ** 3))  # 20 Go par défaut
+    
+    # Espaces de travail temporaires des générations (tmpfs ou disque rapide conseillé)
+    SCRATCH_DIR = os.environ.get('SCRATCH_DIR', os.path.join(tempfile.gettempdir(), 'clips_scratch'))
+    SCRATCH_MAX_BYTES = int(os.environ.get('SCRATCH_MAX_BYTES', 20 * 1024 ** 3))  # 20 Go par défaut pour l'ensemble des générations
+    SCRATCH_JOB_MAX_BYTES = int(os.environ.get('SCRATCH_JOB_MAX_BYTES', 4 * 1024 ** 3))  # 4 Go par défaut par génération
+    SCRATCH_FREE_MARGIN = int(os.environ.get('SCRATCH_FREE_MARGIN', 512 * 1024 ** 2))  # Espace disque toujours laissé libre
+    SCRATCH_ORPHAN_AGE = 3600  # Inactivité en secondes après laquelle un espace non verrouillé est supprimé
+    
+    # Index des courbes de moments forts déjà calculées (une par vidéo)
+    SCORE_INDEX_DIR = os.environ.get('SCORE_INDEX_DIR', '/home/ubuntu/cache/scores')
+    SCORE_INDEX_MAX_BYTES = int(os.environ.get('SCORE_INDEX_MAX_BYTES', 512 * 1024 ** 2))  # 512 Mo par défaut
+    
+    # Téléchargement partiel: pour les vidéos longues, seules les plages retenues sont téléchargées
+    PARTIAL_FETCH_ENABLED = os.environ.get('PARTIAL_FETCH_ENABLED', 'true').lower() == 'true'
+    PARTIAL_FETCH_MIN_DURATION = int(os.environ.get('PARTIAL_FETCH_MIN_DURATION', 900))  # Durée minimale de la source en secondes
+    
+    # Clips courts découpés au fil du téléchargement (sans fichier source) lorsque les segments sont connus d'avance
+    STREAMING_CUT_ENABLED = os.environ.get('STREAMING_CUT_ENABLED', 'true').lower() == 'true'
+    
+    # Découpe à l'image près: seules les extrémités des segments sont réencodées (smart cut).
+    # Sinon les segments sont alignés sur les images clés et copiés sans réencodage.
+    FRAME_ACCURATE_CUTS = os.environ.get('FRAME_ACCURATE_CUTS', 'false').lower() == 'true'
+    
     # Configuration de l'API YouTube
     YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY', '')
     
+    # Cache des informations des vidéos YouTube
+    METADATA_CACHE_PATH = os.environ.get('METADATA_CACHE_PATH', '/home/ubuntu/cache/video_metadata.db')
+    METADATA_CACHE_TTL = 6 * 3600  # Durée de validité des informations en secondes
+    METADATA_NEGATIVE_TTL = 600  # Durée de validité des vidéos inaccessibles en secondes
+    
+    # Index du stockage des clips (taille, propriétaire et totaux sans parcours du disque)
+    STORAGE_INDEX_PATH = os.environ.get('STORAGE_INDEX_PATH', '/home/ubuntu/cache/storage_index.db')
+    
+    # Moteur youtube-dl: 'auto' (bibliothèque si installée), 'library' ou 'subprocess' (commande)
+    EXTRACTOR_BACKEND = os.environ.get('EXTRACTOR_BACKEND', 'auto').lower()
+    
     # Paramètres de génération des clips
     MAX_CLIP_DURATION = 300  # Durée maximale d'un clip en secondes
     DEFAULT_TRANSITIONS = True  # Transitions activées par défaut
+    TRANSITION_DURATION = float(os.environ.get('TRANSITION_DURATION', 0.5))  # Durée des fondus en secondes
+    WATERMARK_IMAGE = os.environ.get('WATERMARK_IMAGE', '/home/ubuntu/static/watermark.png')  # Filigrane des clips du plan gratuit
+    CHUNKED_ENCODE_MIN_DURATION = 120  # Durée à partir de laquelle un réencodage est découpé en tranches parallèles
     
     # Configuration du serveur
     DEBUG = True
@@ -30,7 +89,13 @@ class Config:
     
     # Limites de l'API
     RATE_LIMIT = 100  # Nombre maximum de requêtes par heure
-    MAX_CONCURRENT_GENERATIONS = 5  # Nombre maximum de générations simultanées
+    MAX_CONCURRENT_GENERATIONS = int(os.environ.get('MAX_CONCURRENT_GENERATIONS', 5))  # Nombre maximum de générations simultanées
+    
+    # File d'attente persistante des générations
+    JOB_LEASE_DURATION = 120  # Durée de validité d'un bail de traitement en secondes
+    JOB_HEARTBEAT_INTERVAL = 30  # Intervalle de renouvellement du bail en secondes
+    JOB_REAPER_INTERVAL = 15  # Intervalle de relance des tâches abandonnées en secondes
+    JOB_MAX_ATTEMPTS = 3  # Nombre maximum de tentatives par tâche
 
 class TestingConfig(Config):
     """
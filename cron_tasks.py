@@ -26,11 +26,13 @@ logger = logging.getLogger(__name__)
 
 # Importer les fonctions nécessaires
 from api.subscription import reset_monthly_counters, check_expired_subscriptions, delete_expired_clips
+from storage.local_storage import reconcile_storage, migrate_storage
+from storage.storage_backend import get_storage_backend
 
 def main():
     """Fonction principale pour exécuter les tâches planifiées."""
     if len(sys.argv) < 2:
-        print("Usage: python cron_tasks.py [reset_counters|check_subscriptions|delete_clips]")
+        print("Usage: python cron_tasks.py [reset_counters|check_subscriptions|delete_clips|reconcile_storage|migrate_storage]")
         sys.exit(1)
     
     task = sys.argv[1]
@@ -51,6 +53,20 @@ def main():
             result = delete_expired_clips()
             logger.info(result)
         
+        elif task == 'reconcile_storage':
+            if get_storage_backend().name != 'local':
+                # L'index est reconstruit à partir du disque: il perdrait les clips du bucket
+                logger.info("Reconstruction de l'index ignorée: clips stockés hors du disque local.")
+            else:
+                logger.info("Reconstruction de l'index du stockage...")
+                result = reconcile_storage()
+                logger.info(result)
+        
+        elif task == 'migrate_storage':
+            logger.info("Migration des clips vers l'organisation répartie...")
+            result = migrate_storage()
+            logger.info(result)
+        
         else:
             logger.error(f"Tâche inconnue: {task}")
             print(f"Tâche inconnue: {task}")
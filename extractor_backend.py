@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Moteurs d'accès à YouTube (extraction des informations, URL des flux, téléchargement).
+
+Deux moteurs exposent le même contrat:
+- LibraryBackend utilise la bibliothèque yt-dlp (ou youtube-dl) chargée une
+  seule fois dans le processus. Chaque thread conserve son instance YoutubeDL,
+  avec ses extracteurs initialisés et sa session HTTP, d'un appel à l'autre.
+- SubprocessBackend lance la commande youtube-dl à chaque appel. Il sert de
+  repli lorsque la bibliothèque n'est pas installée ou échoue de façon inattendue.
+"""
+
+import json
+import threading
+import subprocess
+import logging
+
+from config import Config
+
+try:
+    import yt_dlp as youtube_dl_lib
+except ImportError:
+    try:
+        import youtube_dl as youtube_dl_lib
+    except ImportError:
+        youtube_dl_lib = None
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Options communes des instances YoutubeDL
+BASE_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noprogress': True,
+    'noplaylist': True
+}
+
+class ExtractorError(ValueError):
+    """
+    Erreur signalée par youtube-dl (vidéo inaccessible, format indisponible...).
+    Le message contient la sortie d'erreur du téléchargeur.
+    """
+
+class SubprocessBackend:
+    """
+    Moteur lançant la commande youtube-dl à chaque appel.
+    """
+
+    name = 'subprocess'
+
+    def extract_info(self, url):
+        """
+        Récupère les informations brutes d'une vidéo (équivalent de --dump-json).
+        """
+        result = self._run(['--dump-json', url])
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            raise ValueError("Impossible de décoder les informations de la vidéo")
+
+    def get_stream_urls(self, url, fmt):
+        """
+        Récupère les URL directes des flux correspondant au format demandé.
+        """
+        return self._run(['--format', fmt, '--get-url', url]).split()
+
+    def download(self, url, output_template, fmt):
+        """
+        Télécharge une vidéo selon le modèle de nom de fichier donné.
+        """
+        self._run(['--format', fmt, '--output', output_template, url])
+
+    def open_stream(self, url, fmt, stderr=None):
+        """
+        Lance le téléchargement d'une vidéo vers la sortie standard de la commande.
+
+        Returns:
+            Processus youtube-dl dont la sortie standard (pipe) fournit le fichier vidéo
+        """
+        return subprocess.Popen(['youtube-dl', '--quiet', '--no-part', '--format', fmt, '--output', '-', url],
+                                stdout=subprocess.PIPE, stderr=stderr)
+
+    def _run(self, args):
+        try:
+            result = subprocess.run(['youtube-dl'] + args, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise ExtractorError(e.stderr or str(e))
+        return result.stdout
+
+class LibraryBackend:
+    """
+    Moteur utilisant la bibliothèque yt-dlp/youtube-dl dans le processus.
+    """
+
+    name = 'library'
+
+    def __init__(self, module):
+        """
+        Args:
+            module: Module yt_dlp ou youtube_dl importé
+        """
+        self.module = module
+        self._local = threading.local()
+
+    def extract_info(self, url):
+        """
+        Récupère les informations brutes d'une vidéo avec l'instance du thread.
+        """
+        ydl = self._instance()
+        info = self._call(ydl.extract_info, url, download=False)
+        return ydl.sanitize_info(info) if hasattr(ydl, 'sanitize_info') else info
+
+    def get_stream_urls(self, url, fmt):
+        """
+        Récupère les URL directes des flux correspondant au format demandé.
+        """
+        ydl = self._instance()
+        info = self._call(ydl.extract_info, url, download=False)
+        formats = info.get('formats') or [info]
+
+        selected = list(ydl.build_format_selector(fmt)({
+            'formats': formats,
+            'has_merged_format': any('none' not in (f.get('acodec'), f.get('vcodec')) for f in formats),
+            'incomplete_formats': (all(f.get('vcodec') == 'none' for f in formats)
+                                   or all(f.get('acodec') == 'none' for f in formats))
+        }))
+        if not selected:
+            raise ExtractorError(f"Aucun format disponible pour: {fmt}")
+
+        choice = selected[0]
+        return [f['url'] for f in choice.get('requested_formats', [choice])]
+
+    def download(self, url, output_template, fmt):
+        """
+        Télécharge une vidéo dans le processus.
+
+        Le modèle de nom de fichier étant figé à la construction d'une instance
+        YoutubeDL, le téléchargement utilise une instance dédiée (sans relancer
+        d'interpréteur ni réimporter les extracteurs).
+        """
+        options = dict(BASE_OPTIONS, format=fmt, outtmpl=output_template)
+        with self.module.YoutubeDL(options) as ydl:
+            self._call(ydl.download, [url])
+
+    def _instance(self):
+        """
+        Récupère l'instance YoutubeDL du thread courant (créée au premier appel).
+        """
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self.module.YoutubeDL(dict(BASE_OPTIONS))
+            self._local.ydl = ydl
+        return ydl
+
+    def _call(self, fn, *args, **kwargs):
+        """
+        Appelle la bibliothèque en convertissant ses erreurs de téléchargement.
+        """
+        try:
+            return fn(*args, **kwargs)
+        except self.module.utils.DownloadError as e:
+            raise ExtractorError(str(e))
+
+class FallbackBackend:
+    """
+    Moteur utilisant la bibliothèque et se repliant sur la commande youtube-dl
+    en cas d'erreur inattendue de la bibliothèque.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def extract_info(self, url):
+        return self._call('extract_info', url)
+
+    def get_stream_urls(self, url, fmt):
+        return self._call('get_stream_urls', url, fmt)
+
+    def download(self, url, output_template, fmt):
+        return self._call('download', url, output_template, fmt)
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.primary, method)(*args)
+        except ExtractorError:
+            # Erreur signalée par YouTube: la commande donnerait le même résultat
+            raise
+        except Exception as e:
+            logger.warning(f"Échec du moteur {self.primary.name} ({method}), repli sur {self.fallback.name}: {str(e)}")
+            return getattr(self.fallback, method)(*args)
+
+# Moteur partagé par le processus, créé à la première utilisation
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Récupère le moteur configuré par EXTRACTOR_BACKEND ('auto', 'library' ou 'subprocess').
+
+    Returns:
+        Instance du moteur
+    """
+    global _backend
+
+    with _backend_lock:
+        if _backend is None:
+            choice = Config.EXTRACTOR_BACKEND
+            if choice != 'subprocess' and youtube_dl_lib is not None:
+                _backend = FallbackBackend(LibraryBackend(youtube_dl_lib), SubprocessBackend())
+            else:
+                if choice == 'library':
+                    logger.warning("Bibliothèque yt-dlp/youtube-dl introuvable, utilisation de la commande youtube-dl")
+                _backend = SubprocessBackend()
+            logger.info(f"Moteur d'extraction YouTube: {_backend.name}")
+        return _backend
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Choix du format de la vidéo source selon la qualité du rendu.
+Plutôt que de toujours télécharger la meilleure qualité disponible, le plus
+petit flux mp4 (audio et vidéo) dont la hauteur suffit au rendu est retenu:
+un utilisateur limité au 720p ne télécharge ni ne décode jamais de 4K.
+
+Les formats proposés par YouTube sont relevés lors de l'extraction des
+informations de la vidéo (sans les URL, qui expirent) et mis en cache avec elles.
+"""
+
+import logging
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Format demandé au téléchargeur lorsque la qualité du rendu n'est pas limitée
+SOURCE_FORMAT = 'best[ext=mp4]'
+
+def compact_formats(formats):
+    """
+    Relève les formats utilisables comme source (flux mp4 unique audio et vidéo,
+    ou vidéo seule si la vidéo n'a pas de piste audio).
+
+    Args:
+        formats: Liste des formats retournée par youtube-dl
+
+    Returns:
+        Liste de dictionnaires contenant l'identifiant ('format_id'), la
+        hauteur ('height'), la fréquence d'images ('fps'), le débit en kbit/s
+        ('tbr'), la taille en octets ('filesize', éventuellement estimée ou None)
+        et la présence d'une piste audio ('audio')
+    """
+    compacted = []
+    for fmt in formats or []:
+        if fmt.get('ext') != 'mp4' or not fmt.get('height') or fmt.get('vcodec') == 'none':
+            continue
+        compacted.append({
+            'format_id': str(fmt['format_id']),
+            'height': fmt['height'],
+            'fps': fmt.get('fps'),
+            'tbr': fmt.get('tbr'),
+            'filesize': fmt.get('filesize') or fmt.get('filesize_approx'),
+            'audio': fmt.get('acodec') != 'none'
+        })
+
+    # Flux vidéo seuls conservés uniquement pour une vidéo sans aucune piste audio
+    with_audio = [fmt for fmt in compacted if fmt['audio']]
+    return with_audio or compacted
+
+def select_source_format(video_info, max_height=None):
+    """
+    Choisit le format de la vidéo source pour une hauteur de rendu donnée.
+
+    Args:
+        video_info: Informations de la vidéo (voir extract_video_info), ou None
+        max_height: Hauteur maximale du rendu, ou None pour la meilleure qualité
+
+    Returns:
+        Dictionnaire contenant le format à demander au téléchargeur ('format'),
+        l'identifiant, la hauteur et la fréquence d'images du format retenu
+        ('format_id', 'height', 'fps'; None si les formats ne sont pas connus),
+        sa taille estimée en octets ('filesize', ou None), la présence d'une piste
+        audio ('audio', ou None si elle n'est pas connue) et le nombre d'octets
+        évités par rapport à la meilleure qualité ('bytes_saved', ou None)
+    """
+    selection = {'format': SOURCE_FORMAT, 'format_id': None, 'height': None, 'fps': None, 'filesize': None,
+                 'audio': None, 'bytes_saved': None}
+    formats = (video_info or {}).get('formats') or []
+    duration = (video_info or {}).get('duration')
+
+    # Formats relevés avant la présence de la piste audio: audio supposé présent
+    if formats:
+        selection['audio'] = any(fmt.get('audio', True) for fmt in formats)
+
+    if not max_height:
+        # Meilleure qualité: format retenu par le téléchargeur, caractéristiques du meilleur format
+        if formats:
+            best = max(formats, key=lambda fmt: (fmt['height'], fmt.get('tbr') or 0))
+            selection.update({'fps': best.get('fps'), 'filesize': _size(best, duration)})
+            # Vidéo sans piste audio: aucun flux audio et vidéo ne correspond au format par défaut
+            if selection['audio'] is False:
+                selection.update({'format': f"{best['format_id']}/{SOURCE_FORMAT}", 'format_id': best['format_id'],
+                                  'height': best['height']})
+        return selection
+
+    # Sans liste des formats, le téléchargeur filtre lui-même sur la hauteur
+    selection['format'] = f"best[ext=mp4][height<={max_height}]/{SOURCE_FORMAT}"
+    if not formats:
+        return selection
+
+    best = max(formats, key=lambda fmt: (fmt['height'], fmt.get('tbr') or 0))
+
+    # Plus petit format suffisant pour le rendu, sinon le plus grand disponible
+    sufficient = [fmt for fmt in formats if fmt['height'] >= max_height]
+    chosen = min(sufficient, key=lambda fmt: (fmt['height'], fmt.get('tbr') or 0)) if sufficient else best
+
+    selection.update({
+        # Format retenu en priorité, filtrage par hauteur s'il n'est plus proposé
+        'format': f"{chosen['format_id']}/{selection['format']}",
+        'format_id': chosen['format_id'],
+        'height': chosen['height'],
+        'fps': chosen.get('fps'),
+        'filesize': _size(chosen, duration)
+    })
+
+    chosen_size, best_size = _size(chosen, duration), _size(best, duration)
+    if chosen_size is not None and best_size is not None:
+        selection['bytes_saved'] = max(0, best_size - chosen_size)
+
+    logger.info(f"Format source {chosen['format_id']} ({chosen['height']}p) pour un rendu en {max_height}p, "
+                f"meilleur format {best['format_id']} ({best['height']}p)")
+    return selection
+
+def _size(fmt, duration):
+    """
+    Taille d'un format en octets (estimée à partir du débit si elle n'est pas connue).
+    """
+    if fmt.get('filesize'):
+        return int(fmt['filesize'])
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Analyse des moments forts d'une vidéo en un seul décodage.
+Un unique processus FFmpeg produit une version réduite de la vidéo (pipe
+standard) et la piste audio en PCM mono (second pipe). Chaque flux est lu par
+blocs et distribué à tous les analyseurs enregistrés qui le consomment: ajouter
+un analyseur n'ajoute jamais de décodage.
+
+Un analyseur est un objet exposant:
+- media: flux consommé ('audio' ou 'video')
+- feed(bloc): analyse d'un bloc (échantillons float32 mono ou images uint8
+  de forme (images, hauteur, largeur))
+- finish(): courbe de score par seconde entre 0 et 1
+- boundaries (facultatif): coupures de plan en secondes
+
+Les courbes sont ensuite fusionnées en un score unique par seconde, pondéré
+par le poids de chaque analyseur.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import subprocess
+import tempfile
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from api.utils.media_probe import probe
+from api.utils.audio_analysis import AudioEnergyAnalyzer, SAMPLE_RATE, CHUNK_SECONDS
+from api.utils.scene_analysis import SceneChangeAnalyzer, PROXY_FPS, PROXY_WIDTH, PROXY_HEIGHT, BATCH_FRAMES
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Version des algorithmes d'analyse, à incrémenter lorsqu'un analyseur change
+# (les courbes déjà enregistrées dans l'index des scores sont alors recalculées)
+ANALYSIS_VERSION = 1
+
+# Analyseurs enregistrés: nom -> (fabrique, poids)
+_analyzers = OrderedDict()
+
+def register_analyzer(name, factory, weight=1.0):
+    """
+    Enregistre un analyseur de moments forts.
+
+    Args:
+        name: Nom unique de l'analyseur
+        factory: Fonction sans argument créant un analyseur neuf pour chaque vidéo
+        weight: Poids de la courbe de l'analyseur dans le score fusionné
+    """
+    _analyzers[name] = (factory, weight)
+
+def unregister_analyzer(name):
+    """
+    Retire un analyseur enregistré.
+    """
+    _analyzers.pop(name, None)
+
+def registered_analyzers():
+    """
+    Liste les noms des analyseurs enregistrés.
+    """
+    return list(_analyzers)
+
+def analysis_version():
+    """
+    Construit l'identifiant de version des courbes produites par les analyseurs
+    enregistrés (version des algorithmes, noms et poids des analyseurs).
+    """
+    signature = json.dumps([[name, weight] for name, (_, weight) in _analyzers.items()])
+    return f"{ANALYSIS_VERSION}-{hashlib.sha1(signature.encode('utf-8')).hexdigest()[:8]}"
+
+def analyse_video(video_path, names=None):
+    """
+    Analyse une vidéo avec les analyseurs enregistrés, en un seul décodage.
+
+    Args:
+        video_path: Chemin du fichier vidéo
+        names: Noms des analyseurs à utiliser (tous les analyseurs enregistrés si None)
+
+    Returns:
+        Dictionnaire contenant le score fusionné par seconde ('scores', tableau
+        NumPy), la courbe de chaque analyseur ('curves') et les coupures de plan
+        ('boundaries')
+
+    Raises:
+        ValueError: Si la vidéo ne peut pas être décodée ou ne contient aucun
+            flux exploitable par les analyseurs
+    """
+    info = probe(video_path)
+    analyzers = OrderedDict()
+    for name in names or list(_analyzers):
+        factory, weight = _analyzers[name]
+        analyzer = factory()
+        # Un flux absent du fichier (vidéo sans son...) écarte les analyseurs qui en dépendent
+        if info.get(analyzer.media) is not None:
+            analyzers[name] = (analyzer, weight)
+
+    if not analyzers:
+        raise ValueError("Aucun flux de la vidéo ne peut être analysé")
+
+    _decode(video_path, [analyzer for analyzer, _ in analyzers.values()])
+
+    curves = OrderedDict((name, analyzer.finish()) for name, (analyzer, _) in analyzers.items())
+    boundaries = sorted(time for analyzer, _ in analyzers.values() for time in getattr(analyzer, 'boundaries', []))
+    scores = _merge(curves, {name: weight for name, (_, weight) in analyzers.items()})
+
+    logger.info(f"Analyse des moments forts terminée: {len(scores)} secondes, "
+                f"{len(boundaries)} coupures, analyseurs {', '.join(curves)} ({video_path})")
+    return {'scores': scores, 'curves': curves, 'boundaries': boundaries}
+
+def _decode(video_path, analyzers):
+    """
+    Décode la vidéo une seule fois et distribue les flux réduits aux analyseurs.
+    """
+    frame_bytes = PROXY_WIDTH * PROXY_HEIGHT
+    outputs = {
+        'video': (
+            ['-map', '0:v:0', '-an',
+             '-vf', f'fps={PROXY_FPS},scale={PROXY_WIDTH}:{PROXY_HEIGHT}:flags=fast_bilinear',
+             '-pix_fmt', 'gray', '-f', 'rawvideo'],
+            frame_bytes * BATCH_FRAMES,
+            lambda data: np.frombuffer(data[:len(data) - len(data) % frame_bytes], dtype=np.uint8)
+                           .reshape(-1, PROXY_HEIGHT, PROXY_WIDTH)
+        ),
+        'audio': (
+            ['-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le'],
+            CHUNK_SECONDS * SAMPLE_RATE * 4,
+            lambda data: np.frombuffer(data[:len(data) - len(data) % 4], dtype='<f4')
+        )
+    }
+    media = [kind for kind in outputs if any(analyzer.media == kind for analyzer in analyzers)]
+
+    # Premier flux sur la sortie standard, second sur un pipe supplémentaire (descripteur 3)
+    cmd = ['ffmpeg', '-v', 'error', '-i', video_path]
+    pipes = []
+    pass_fds = ()
+    for index, kind in enumerate(media):
+        if index == 0:
+            cmd += outputs[kind][0] + ['pipe:1']
+        else:
+            read_fd, write_fd = os.pipe()
+            pipes.append((kind, read_fd, write_fd))
+            cmd += outputs[kind][0] + [f'pipe:{write_fd}']
+            pass_fds = (write_fd,)
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, pass_fds=pass_fds)
+        errors = []
+        threads = []
+        try:
+            for kind, read_fd, write_fd in pipes:
+                os.close(write_fd)
+                stream = os.fdopen(read_fd, 'rb')
+                thread = threading.Thread(target=_pump, args=(stream, outputs[kind], analyzers, kind, errors))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            _pump(process.stdout, outputs[media[0]], analyzers, media[0], errors)
+            for thread in threads:
+                thread.join()
+        finally:
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode != 0:
+            stderr.seek(0)
+            raise ValueError(f"Erreur lors du décodage pour l'analyse: {stderr.read().decode('utf-8', 'replace')}")
+
+    if errors:
+        raise errors[0]
+
+def _pump(stream, output, analyzers, kind, errors):
+    """
+    Lit un flux par blocs et le transmet aux analyseurs qui le consomment.
+    En cas d'erreur d'un analyseur, le flux continue d'être lu jusqu'au bout
+    pour ne pas bloquer FFmpeg sur un pipe plein.
+    """
+    _, block_size, decode = output
+    consumers = [analyzer for analyzer in analyzers if analyzer.media == kind]
+
+    with stream:
+        while True:
+            data = stream.read(block_size)
+            if not data:
+                break
+            if not consumers:
+                continue
+            try:
+                block = decode(data)
+                for analyzer in consumers:
+                    analyzer.feed(block)
+            except Exception as e:
+                errors.append(e)
+                consumers = []
+
+def _merge(curves, weights):
+    """
+    Fusionne les courbes des analyseurs en un score par seconde (moyenne pondérée).
+    Les courbes sont complétées par des zéros jusqu'à la plus longue (les flux
+    audio et vidéo d'un fichier n'ont pas toujours exactement la même durée).
+    """
+    length = max(len(curve) for curve in curves.values())
+    total = np.zeros(length)
+    for name, curve in curves.items():
+        total[:len(curve)] += weights[name] * curve
+
+    weight_sum = sum(weights.values())
+    return (total / weight_sum if weight_sum else total).astype(np.float32)
+
+# Analyseurs fournis par défaut
+register_analyzer('audio_energy', lambda: AudioEnergyAnalyzer(SAMPLE_RATE), weight=0.6)
+register_analyzer('motion', lambda: SceneChangeAnalyzer(PROXY_FPS), weight=0.4)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Exécuteur des tâches de génération de clips.
+Ce module fournit un pool de workers de taille fixe alimenté par une file
+d'attente FIFO, afin de limiter le nombre de générations simultanées.
+"""
+
+import threading
+import logging
+from collections import deque
+
+from config import Config
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class GenerationExecutor:
+    """
+    Pool de workers de taille fixe avec une file d'attente FIFO.
+
+    Les tâches soumises au-delà du nombre de workers attendent dans la file,
+    ce qui permet de connaître leur position avant leur démarrage.
+    """
+
+    def __init__(self, max_workers, name='clip-worker'):
+        """
+        Initialise l'exécuteur.
+
+        Args:
+            max_workers: Nombre maximum de tâches exécutées simultanément
+            name: Préfixe du nom des threads de travail
+        """
+        if max_workers < 1:
+            raise ValueError("Le nombre de workers doit être supérieur ou égal à 1")
+
+        self.max_workers = max_workers
+        self.name = name
+        self._backlog = deque()
+        self._running = set()
+        self._workers = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """
+        Ajoute une tâche à la fin de la file d'attente.
+
+        Args:
+            job_id: Identifiant de la tâche (utilisé pour la position dans la file)
+            fn: Fonction à exécuter
+            *args, **kwargs: Arguments passés à la fonction
+
+        Returns:
+            Position de la tâche dans la file d'attente (1 = prochaine à démarrer)
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("L'exécuteur est arrêté")
+
+            self._backlog.append((job_id, fn, args, kwargs))
+            position = len(self._backlog)
+
+            # Les workers sont démarrés à la demande, sans dépasser la limite
+            if len(self._workers) < self.max_workers:
+                self._start_worker()
+
+            self._condition.notify()
+            return position
+
+    def queue_position(self, job_id):
+        """
+        Récupère la position d'une tâche dans la file d'attente.
+
+        Args:
+            job_id: Identifiant de la tâche
+
+        Returns:
+            Position de la tâche (à partir de 1) ou None si elle n'est pas en attente
+        """
+        with self._condition:
+            for position, (queued_id, _, _, _) in enumerate(self._backlog, start=1):
+                if queued_id == job_id:
+                    return position
+        return None
+
+    def is_running(self, job_id):
+        """
+        Indique si une tâche est en cours d'exécution.
+        """
+        with self._condition:
+            return job_id in self._running
+
+    def is_pending(self, job_id):
+        """
+        Indique si une tâche est en attente ou en cours d'exécution.
+        """
+        with self._condition:
+            if job_id in self._running:
+                return True
+            return any(queued_id == job_id for queued_id, _, _, _ in self._backlog)
+
+    def stats(self):
+        """
+        Récupère l'état de l'exécuteur.
+
+        Returns:
+            Dictionnaire contenant le nombre de workers, de tâches actives et en attente
+        """
+        with self._condition:
+            return {
+                'max_workers': self.max_workers,
+                'workers': len(self._workers),
+                'running': len(self._running),
+                'queued': len(self._backlog)
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Arrête l'exécuteur. Les tâches déjà en file sont exécutées avant l'arrêt.
+
+        Args:
+            wait: Booléen indiquant s'il faut attendre la fin des workers
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+            workers = list(self._workers)
+
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _start_worker(self):
+        """
+        Démarre un nouveau thread de travail (appelé avec le verrou acquis).
+        """
+        worker = threading.Thread(
+            target=self._worker_loop,
+            name=f"{self.name}-{len(self._workers) + 1}"
+        )
+        worker.daemon = True
+        self._workers.append(worker)
+        worker.start()
+
+    def _worker_loop(self):
+        """
+        Boucle principale d'un worker: dépile et exécute les tâches dans l'ordre.
+        """
+        while True:
+            with self._condition:
+                while not self._backlog and not self._shutdown:
+                    self._condition.wait()
+
+                if not self._backlog:
+                    return
+
+                job_id, fn, args, kwargs = self._backlog.popleft()
+                self._running.add(job_id)
+
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Erreur non gérée dans la tâche {job_id}: {str(e)}")
+            finally:
+                with self._condition:
+                    self._running.discard(job_id)
+
+# Exécuteur partagé par le processus, créé à la première utilisation
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """
+    Récupère l'exécuteur partagé, dimensionné par MAX_CONCURRENT_GENERATIONS.
+
+    Returns:
+        Instance de GenerationExecutor
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = GenerationExecutor(Config.MAX_CONCURRENT_GENERATIONS)
+        return _executor
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+File d'attente persistante des générations de clips.
+Les tâches sont stockées dans la table clip_jobs et attribuées aux workers par
+des baux (leases) renouvelés périodiquement. Un bail expiré signifie que le
+worker a disparu (redémarrage, déploiement) et la tâche peut être relancée
+à partir de sa dernière étape terminée.
+
+Les opérations d'attribution reposent sur des UPDATE conditionnels, ce qui
+fonctionne de la même manière sous SQLite et PostgreSQL.
+"""
+
+import os
+import json
+import socket
+import threading
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, and_
+from config import Config
+from api.models import db, Clip, ClipJob
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Statuts des tâches qui ne seront plus traitées
+FINISHED_STATUSES = ('completed', 'failed')
+
+def worker_id():
+    """
+    Construit l'identifiant du worker courant (machine, processus et thread).
+
+    Returns:
+        Identifiant unique du worker
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def enqueue(clip_id, youtube_url, mode, transitions, **fields):
+    """
+    Ajoute une tâche de génération à la file d'attente.
+
+    Args:
+        clip_id: Identifiant unique du clip
+        youtube_url: URL de la vidéo YouTube
+        mode: Mode de génération ('short' ou 'long')
+        transitions: Booléen indiquant si les transitions doivent être ajoutées
+        **fields: Informations complémentaires (titre, chaîne, durée, plan)
+
+    Returns:
+        La tâche créée
+    """
+    job = ClipJob(
+        id=clip_id,
+        youtube_url=youtube_url,
+        mode=mode,
+        transitions=transitions,
+        status='queued',
+        created_at=datetime.utcnow(),
+        **fields
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def get_job(clip_id):
+    """
+    Récupère une tâche à partir de l'identifiant du clip.
+    """
+    return db.session.get(ClipJob, clip_id)
+
+def _claimable():
+    """
+    Condition SQL des tâches non terminées et sans bail valide.
+    """
+    return and_(
+        ClipJob.status.notin_(FINISHED_STATUSES),
+        or_(ClipJob.lease_owner.is_(None), ClipJob.lease_expires_at < datetime.utcnow())
+    )
+
+def claim(clip_id, owner):
+    """
+    Attribue une tâche à un worker de manière atomique.
+
+    Args:
+        clip_id: Identifiant du clip
+        owner: Identifiant du worker
+
+    Returns:
+        La tâche si elle a été attribuée, None si un autre worker la détient déjà
+    """
+    now = datetime.utcnow()
+    claimed = ClipJob.query.filter(ClipJob.id == clip_id, _claimable()).update({
+        'lease_owner': owner,
+        'lease_expires_at': now + timedelta(seconds=Config.JOB_LEASE_DURATION),
+        'heartbeat_at': now,
+        'attempts': ClipJob.attempts + 1,
+        'started_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+
+    if claimed != 1:
+        return None
+
+    job = get_job(clip_id)
+    db.session.refresh(job)
+    return job
+
+def heartbeat(clip_id, owner):
+    """
+    Prolonge le bail d'une tâche détenue par le worker.
+
+    Returns:
+        True si le bail a été prolongé, False s'il a été perdu
+    """
+    now = datetime.utcnow()
+    renewed = ClipJob.query.filter(ClipJob.id == clip_id, ClipJob.lease_owner == owner).update({
+        'lease_expires_at': now + timedelta(seconds=Config.JOB_LEASE_DURATION),
+        'heartbeat_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return renewed == 1
+
+def update(clip_id, owner, **fields):
+    """
+    Met à jour une tâche détenue par le worker (statut, informations vidéo...).
+
+    Returns:
+        True si la mise à jour a été appliquée, False si le bail a été perdu
+    """
+    updated = ClipJob.query.filter(ClipJob.id == clip_id, ClipJob.lease_owner == owner).update(
+        fields, synchronize_session=False
+    )
+    db.session.commit()
+    return updated == 1
+
+def save_checkpoint(clip_id, owner, stage, checkpoint):
+    """
+    Enregistre le résultat d'une étape terminée du pipeline.
+
+    Args:
+        clip_id: Identifiant du clip
+        owner: Identifiant du worker
+        stage: Nom de l'étape terminée
+        checkpoint: Dictionnaire sérialisable des résultats des étapes
+    """
+    return update(clip_id, owner, stage=stage, checkpoint=json.dumps(checkpoint))
+
+def load_checkpoint(job):
+    """
+    Récupère les résultats des étapes déjà terminées d'une tâche.
+    """
+    if not job.checkpoint:
+        return {}
+
+    try:
+        return json.loads(job.checkpoint)
+    except ValueError:
+        logger.warning(f"Point de reprise illisible pour la tâche {job.id}")
+        return {}
+
+def complete(clip_id, owner, file_path):
+    """
+    Marque une tâche comme terminée et libère son bail.
+    """
+    now = datetime.utcnow()
+    done = update(clip_id, owner,
+                  status='completed',
+                  file_path=file_path,
+                  completed_at=now,
+                  lease_owner=None,
+                  lease_expires_at=None)
+    if done:
+        _sync_clip(clip_id, status='completed', file_path=file_path, completed_at=now)
+    return done
+
+def record_video_info(clip_id, owner, video_info):
+    """
+    Enregistre les informations de la vidéo récupérées par le worker.
+
+    Args:
+        clip_id: Identifiant du clip
+        owner: Identifiant du worker
+        video_info: Dictionnaire retourné par extract_video_info
+    """
+    fields = {
+        'title': video_info['title'],
+        'channel': video_info['channel'],
+        'duration': video_info['duration']
+    }
+    if update(clip_id, owner, **fields):
+        _sync_clip(clip_id, **fields)
+
+def record_source(clip_id, owner, source):
+    """
+    Enregistre le format de la vidéo source retenu et les octets évités.
+
+    Args:
+        clip_id: Identifiant du clip
+        owner: Identifiant du worker
+        source: Dictionnaire retourné par select_source_format
+    """
+    return update(clip_id, owner,
+                  source_format=source.get('format_id') or source['format'],
+                  bytes_saved=source.get('bytes_saved'))
+
+def fail(clip_id, owner, error, retry=True):
+    """
+    Enregistre l'échec d'une tentative. La tâche est remise en file tant que
+    le nombre maximum de tentatives n'est pas atteint.
+
+    Args:
+        clip_id: Identifiant du clip
+        owner: Identifiant du worker
+        error: Message d'erreur
+        retry: Booléen indiquant si une nouvelle tentative est possible
+
+    Returns:
+        True si la tâche sera relancée, False si elle est définitivement en
+        échec ou si le bail a été perdu (tâche reprise par un autre worker)
+    """
+    job = get_job(clip_id)
+    retry = retry and job is not None and job.attempts < Config.JOB_MAX_ATTEMPTS
+
+    updated = update(clip_id, owner,
+                     status='queued' if retry else 'failed',
+                     error=error,
+                     lease_owner=None,
+                     lease_expires_at=None)
+
+    if not updated:
+        return False
+    if not retry:
+        _sync_clip(clip_id, status='error', error=error)
+    return retry
+
+def dispatchable_ids(limit=100):
+    """
+    Liste les tâches en attente ou dont le bail a expiré, par ordre d'arrivée.
+
+    Args:
+        limit: Nombre maximum de tâches retournées
+
+    Returns:
+        Liste des identifiants de clips à (re)lancer
+    """
+    rows = db.session.query(ClipJob.id).filter(_claimable()).order_by(ClipJob.created_at).limit(limit).all()
+    return [row.id for row in rows]
+
+def queue_position(clip_id):
+    """
+    Calcule la position d'une tâche en attente dans la file globale.
+
+    Returns:
+        Position à partir de 1 ou None si la tâche n'est pas en attente
+    """
+    job = get_job(clip_id)
+    if job is None or job.status != 'queued' or job.lease_owner is not None:
+        return None
+
+    ahead = ClipJob.query.filter(
+        ClipJob.status == 'queued',
+        ClipJob.lease_owner.is_(None),
+        ClipJob.created_at < job.created_at
+    ).count()
+    return ahead + 1
+
+def _sync_clip(clip_id, **fields):
+    """
+    Reporte l'état de la tâche sur le clip de l'utilisateur, s'il existe.
+    """
+    clip = db.session.get(Clip, clip_id)
+    if clip is None:
+        return
+
+    for key, value in fields.items():
+        setattr(clip, key, value)
+    db.session.commit()
+
+class Heartbeat:
+    """
+    Renouvelle le bail d'une tâche en arrière-plan pendant son traitement.
+    """
+
+    def __init__(self, app, clip_id, owner, interval=None):
+        """
+        Args:
+            app: Application Flask (nécessaire pour accéder à la base de données)
+            clip_id: Identifiant du clip
+            owner: Identifiant du worker
+            interval: Intervalle de renouvellement en secondes
+        """
+        self.app = app
+        self.clip_id = clip_id
+        self.owner = owner
+        self.interval = interval or Config.JOB_HEARTBEAT_INTERVAL
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{clip_id}")
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    if not heartbeat(self.clip_id, self.owner):
+                        logger.warning(f"Bail perdu pour la tâche {self.clip_id}")
+                        self.lost.set()
+                        return
+            except Exception as e:
+                logger.warning(f"Erreur lors du renouvellement du bail de {self.clip_id}: {str(e)}")
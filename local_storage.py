@@ -3,14 +3,36 @@
 
 """
 Module de gestion du stockage local des clips générés.
+
+Les clips sont publiés sans copie lorsque c'est possible: renommage sur le
+même système de fichiers, sinon clone (reflink) ou lien physique. La copie
+n'est utilisée qu'entre deux systèmes de fichiers, vers un nom temporaire
+renommé une fois le fichier complet et synchronisé: un lecteur ne voit jamais
+de fichier partiel.
+
+Chaque clip sauvegardé ou supprimé est reporté dans l'index du stockage
+(voir storage_index), qui fournit la liste des clips et les totaux.
+
+Les clips sont répartis dans deux niveaux de sous-répertoires nommés d'après
+l'empreinte de leur identifiant (ab/cd/<clip_id>/clip.mp4): aucun répertoire
+ne grossit indéfiniment et le chemin d'un clip se calcule sans lecture du
+disque. Les clips de l'ancienne organisation (<clip_id>/clip_<date>.mp4,
+directement sous STORAGE_DIR) restent servis jusqu'à leur migration
+(migrate_storage).
 """
 
 import os
+import uuid
+import fcntl
+import errno
 import shutil
+import hashlib
+import sqlite3
 import logging
-from datetime import datetime
 from pathlib import Path
 
+from storage.storage_index import get_storage_index
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,6 +40,19 @@ logger = logging.getLogger(__name__)
 # Répertoire de stockage des clips
 STORAGE_DIR = os.environ.get('CLIPS_STORAGE_DIR', '/home/ubuntu/clips_storage')
 
+# Répartition des clips: nombre de niveaux et largeur (caractères hexadécimaux) de chaque niveau
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+# Nom du fichier d'un clip dans son répertoire (suivi de l'extension)
+CLIP_BASENAME = 'clip'
+
+# Requête ioctl de clonage d'un fichier (FICLONE, Linux: btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Taille des blocs de la copie entre systèmes de fichiers
+COPY_CHUNK_SIZE = 1024 * 1024
+
 def init_storage():
     """
     Initialise le répertoire de stockage.
@@ -25,13 +60,38 @@ def init_storage():
     os.makedirs(STORAGE_DIR, exist_ok=True)
     logger.info(f"Répertoire de stockage initialisé: {STORAGE_DIR}")
 
-def save_clip(source_path, clip_id):
+def clip_dir(clip_id):
+    """
+    Calcule le répertoire d'un clip dans l'organisation répartie.
+    
+    Args:
+        clip_id: Identifiant unique du clip
+        
+    Returns:
+        Chemin du répertoire du clip
+    """
+    digest = hashlib.sha1(clip_id.encode('utf-8')).hexdigest()
+    shards = [digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH] for level in range(SHARD_LEVELS)]
+    return os.path.join(STORAGE_DIR, *shards, clip_id)
+
+def clip_filename(extension='.mp4'):
+    """
+    Nom du fichier d'un clip (identique pour tous les clips d'une même extension).
+    """
+    return f"{CLIP_BASENAME}{extension}"
+
+def save_clip(source_path, clip_id, keep_source=False, owner=None):
     """
     Sauvegarde un clip dans le stockage local.
     
+    Le fichier source est déplacé (voir commit_file): il n'existe plus à son
+    emplacement d'origine, sauf si keep_source est vrai.
+    
     Args:
         source_path: Chemin du fichier source
         clip_id: Identifiant unique du clip
+        keep_source: Booléen indiquant si le fichier source doit être conservé
+        owner: Identifiant du propriétaire du clip (enregistré dans l'index), ou None
         
     Returns:
         Chemin du fichier sauvegardé
@@ -39,56 +99,152 @@ def save_clip(source_path, clip_id):
     # Création du répertoire de stockage s'il n'existe pas
     init_storage()
     
-    # Création d'un sous-répertoire pour le clip
-    clip_dir = os.path.join(STORAGE_DIR, clip_id)
-    os.makedirs(clip_dir, exist_ok=True)
-    
-    # Détermination du nom de fichier
-    file_extension = Path(source_path).suffix
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"clip_{timestamp}{file_extension}"
+    # Création du répertoire du clip dans son sous-répertoire de répartition
+    directory = clip_dir(clip_id)
+    os.makedirs(directory, exist_ok=True)
     
-    # Chemin complet du fichier de destination
-    dest_path = os.path.join(clip_dir, filename)
+    # Nom de fichier déterministe, enregistré dans l'index
+    filename = clip_filename(Path(source_path).suffix)
+    dest_path = os.path.join(directory, filename)
     
-    # Copie du fichier
+    # Publication du fichier, sans copie si possible
     try:
-        shutil.copy2(source_path, dest_path)
-        logger.info(f"Clip sauvegardé: {dest_path}")
-        return dest_path
+        method = commit_file(source_path, dest_path, keep_source)
+        logger.info(f"Clip sauvegardé ({method}): {dest_path}")
     except Exception as e:
         logger.error(f"Erreur lors de la sauvegarde du clip: {str(e)}")
         raise ValueError(f"Erreur lors de la sauvegarde du clip: {str(e)}")
+    
+    _index_call('add', clip_id, filename, os.path.getsize(dest_path), owner)
+    return dest_path
+
+def commit_file(source_path, dest_path, keep_source=False):
+    """
+    Publie un fichier complet à son emplacement définitif de manière atomique.
+    
+    Méthodes essayées dans l'ordre: renommage (sauf si la source est
+    conservée), clone (reflink), lien physique, puis copie. Le clone, le lien
+    et la copie sont créés sous un nom temporaire puis renommés.
+    
+    Args:
+        source_path: Chemin du fichier à publier
+        dest_path: Chemin de destination
+        keep_source: Booléen indiquant si le fichier source doit être conservé
+        
+    Returns:
+        Méthode utilisée ('rename', 'reflink', 'hardlink' ou 'copy')
+    """
+    if not keep_source:
+        try:
+            os.rename(source_path, dest_path)
+            _sync_directory(os.path.dirname(dest_path) or '.')
+            return 'rename'
+        except OSError as e:
+            # Systèmes de fichiers différents: le fichier doit être recopié
+            if e.errno != errno.EXDEV:
+                raise
+    
+    dest_dir = os.path.dirname(dest_path) or '.'
+    temp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.{uuid.uuid4().hex}.tmp")
+    
+    try:
+        for method, publish in (('reflink', _reflink), ('hardlink', os.link), ('copy', _copy_synced)):
+            try:
+                publish(source_path, temp_path)
+            except OSError:
+                if method == 'copy':
+                    raise
+                continue
+            
+            os.replace(temp_path, dest_path)
+            _sync_directory(dest_dir)
+            if not keep_source:
+                os.remove(source_path)
+            return method
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _reflink(source_path, dest_path):
+    """
+    Clone un fichier sans copier les données (partage des blocs, copie à l'écriture).
+    """
+    with open(source_path, 'rb') as source:
+        with open(dest_path, 'xb') as dest:
+            try:
+                fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+            except OSError:
+                dest.close()
+                os.remove(dest_path)
+                raise
+
+def _copy_synced(source_path, dest_path):
+    """
+    Copie un fichier par blocs puis force son écriture sur le disque.
+    """
+    with open(source_path, 'rb') as source:
+        with open(dest_path, 'xb') as dest:
+            shutil.copyfileobj(source, dest, COPY_CHUNK_SIZE)
+            dest.flush()
+            os.fsync(dest.fileno())
+    shutil.copystat(source_path, dest_path)
+
+def _sync_directory(directory):
+    """
+    Force l'écriture de l'entrée d'un répertoire (renommage durable).
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
 def get_clip_path(clip_id, filename=None):
     """
     Récupère le chemin d'un clip stocké.
     
+    Le chemin est calculé à partir de l'identifiant; l'index et l'ancienne
+    organisation ne sont consultés que si le fichier n'y est pas.
+    
     Args:
         clip_id: Identifiant unique du clip
-        filename: Nom du fichier (si None, retourne le premier fichier trouvé)
+        filename: Nom du fichier (si None, nom standard des clips)
         
     Returns:
         Chemin du fichier ou None si non trouvé
     """
-    clip_dir = os.path.join(STORAGE_DIR, clip_id)
+    file_path = os.path.join(clip_dir(clip_id), filename or clip_filename())
+    if os.path.exists(file_path):
+        return file_path
     
-    if not os.path.exists(clip_dir):
-        logger.warning(f"Répertoire du clip non trouvé: {clip_dir}")
-        return None
+    # Autre extension enregistrée dans l'index
+    if filename is None:
+        entry = _index_call('get', clip_id)
+        if entry is not None and entry['filename'] != clip_filename():
+            file_path = os.path.join(clip_dir(clip_id), entry['filename'])
+            if os.path.exists(file_path):
+                return file_path
     
+    # Clip pas encore migré vers l'organisation répartie
+    legacy_dir = _legacy_dir(clip_id)
     if filename:
-        # Si un nom de fichier est spécifié, on cherche ce fichier
-        file_path = os.path.join(clip_dir, filename)
-        return file_path if os.path.exists(file_path) else None
+        legacy_file = os.path.join(legacy_dir, filename)
+        legacy_file = legacy_file if os.path.exists(legacy_file) else None
     else:
-        # Sinon, on retourne le premier fichier trouvé
-        files = [f for f in os.listdir(clip_dir) if os.path.isfile(os.path.join(clip_dir, f))]
-        return os.path.join(clip_dir, files[0]) if files else None
+        legacy_file = _latest_file(legacy_dir)
+    
+    if legacy_file is None:
+        logger.warning(f"Clip non trouvé: {clip_id}")
+    return legacy_file
 
 def delete_clip(clip_id):
     """
-    Supprime un clip du stockage.
+    Supprime un clip du stockage et de l'index.
     
     Args:
         clip_id: Identifiant unique du clip
@@ -96,60 +252,157 @@ def delete_clip(clip_id):
     Returns:
         True si la suppression a réussi, False sinon
     """
-    clip_dir = os.path.join(STORAGE_DIR, clip_id)
+    directories = [path for path in (clip_dir(clip_id), _legacy_dir(clip_id)) if path and os.path.exists(path)]
     
-    if not os.path.exists(clip_dir):
-        logger.warning(f"Répertoire du clip non trouvé: {clip_dir}")
+    if not directories:
+        logger.warning(f"Répertoire du clip non trouvé: {clip_id}")
+        _index_call('remove', clip_id)
         return False
     
     try:
-        shutil.rmtree(clip_dir)
+        for directory in directories:
+            shutil.rmtree(directory)
+        _index_call('remove', clip_id)
         logger.info(f"Clip supprimé: {clip_id}")
         return True
     except Exception as e:
         logger.error(f"Erreur lors de la suppression du clip: {str(e)}")
         return False
 
-def list_clips():
+def list_clips(owner=None, limit=None, offset=0):
     """
-    Liste tous les clips stockés.
+    Liste les clips stockés (d'après l'index, sans parcourir le disque).
+    
+    Args:
+        owner: Identifiant du propriétaire, ou None pour tous les clips
+        limit: Nombre maximum de clips, ou None
+        offset: Nombre de clips ignorés
     
     Returns:
-        Liste des identifiants de clips
+        Liste des identifiants de clips, du plus récent au plus ancien
     """
-    if not os.path.exists(STORAGE_DIR):
-        return []
-    
-    return [d for d in os.listdir(STORAGE_DIR) if os.path.isdir(os.path.join(STORAGE_DIR, d))]
+    return get_storage_index().list_ids(owner, limit, offset)
 
 def get_storage_info():
     """
-    Récupère des informations sur le stockage.
+    Récupère des informations sur le stockage (totaux tenus à jour par l'index,
+    clips envoyés vers S3 compris).
     
     Returns:
         Dictionnaire contenant des informations sur le stockage
     """
-    if not os.path.exists(STORAGE_DIR):
-        return {
-            'path': STORAGE_DIR,
-            'exists': False,
-            'clips_count': 0,
-            'total_size': 0
-        }
-    
-    clips = list_clips()
-    total_size = 0
-    
-    for clip_id in clips:
-        clip_dir = os.path.join(STORAGE_DIR, clip_id)
-        for file in os.listdir(clip_dir):
-            file_path = os.path.join(clip_dir, file)
-            if os.path.isfile(file_path):
-                total_size += os.path.getsize(file_path)
-    
+    totals = get_storage_index().totals()
     return {
         'path': STORAGE_DIR,
-        'exists': True,
-        'clips_count': len(clips),
-        'total_size': total_size
+        'exists': os.path.exists(STORAGE_DIR),
+        'clips_count': totals['clips_count'],
+        'total_size': totals['total_size']
     }
+
+def reconcile_storage():
+    """
+    Reconstruit l'index du stockage à partir des fichiers présents sur le disque
+    (moteur local uniquement: les clips envoyés vers S3 en seraient retirés).
+    
+    Returns:
+        Dictionnaire contenant le nombre de clips ajoutés, supprimés et mis à jour
+    """
+    def scan():
+        for clip_id, directory in _clip_dirs():
+            file_path = _latest_file(directory)
+            if file_path:
+                stat = os.stat(file_path)
+                yield clip_id, os.path.basename(file_path), stat.st_size, stat.st_mtime
+    
+    return get_storage_index().rebuild(scan())
+
+def migrate_storage(limit=None):
+    """
+    Déplace les clips de l'ancienne organisation vers l'organisation répartie,
+    pendant que le service reste en ligne.
+    
+    Le fichier est d'abord publié à son nouvel emplacement (lien physique si
+    possible) puis l'ancien répertoire est supprimé: à tout instant, l'un des
+    deux chemins résout le clip.
+    
+    Args:
+        limit: Nombre maximum de clips migrés, ou None pour tous
+        
+    Returns:
+        Dictionnaire contenant le nombre de clips migrés ('migrated') et
+        restant à migrer ('remaining')
+    """
+    legacy = [(clip_id, directory) for clip_id, directory in _clip_dirs() if directory == _legacy_dir(clip_id)]
+    migrated = 0
+    
+    for clip_id, directory in legacy[:limit]:
+        source_path = _latest_file(directory)
+        if source_path is None:
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+        
+        new_dir = clip_dir(clip_id)
+        os.makedirs(new_dir, exist_ok=True)
+        filename = clip_filename(Path(source_path).suffix)
+        commit_file(source_path, os.path.join(new_dir, filename), keep_source=True)
+        _index_call('add', clip_id, filename, os.path.getsize(source_path))
+        
+        shutil.rmtree(directory, ignore_errors=True)
+        migrated += 1
+    
+    logger.info(f"Migration du stockage: {migrated} clips déplacés, {len(legacy) - migrated} restants")
+    return {'migrated': migrated, 'remaining': len(legacy) - migrated}
+
+def _clip_dirs():
+    """
+    Parcourt les répertoires des clips des deux organisations.
+    
+    Yields:
+        Tuples (identifiant du clip, répertoire)
+    """
+    if not os.path.exists(STORAGE_DIR):
+        return
+    
+    def walk(directory, level):
+        for entry in os.scandir(directory):
+            if not entry.is_dir() or entry.name.startswith('.'):
+                continue
+            if level < SHARD_LEVELS and _is_shard(entry.name):
+                yield from walk(entry.path, level + 1)
+            else:
+                yield entry.name, entry.path
+    
+    yield from walk(STORAGE_DIR, 0)
+
+def _is_shard(name):
+    """
+    Indique si un nom de répertoire est un niveau de répartition (et non un clip).
+    """
+    return len(name) == SHARD_WIDTH and all(char in '0123456789abcdef' for char in name)
+
+def _legacy_dir(clip_id):
+    """
+    Répertoire d'un clip dans l'ancienne organisation (directement sous STORAGE_DIR).
+    """
+    return os.path.join(STORAGE_DIR, clip_id)
+
+def _latest_file(directory):
+    """
+    Fichier le plus récent du répertoire d'un clip (fichiers temporaires exclus), ou None.
+    """
+    try:
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith('.')]
+    except FileNotFoundError:
+        return None
+    return max(files, key=lambda entry: entry.stat().st_mtime).path if files else None
+
+def _index_call(method, *args):
+    """
+    Met à jour ou consulte l'index du stockage. Une erreur de l'index ne fait
+    pas échouer l'opération sur le fichier (corrigée par reconcile_storage).
+    """
+    try:
+        return getattr(get_storage_index(), method)(*args)
+    except sqlite3.Error as e:
+        logger.error(f"Erreur de l'index du stockage ({method} {args[0]}): {str(e)}")
+        return None
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Analyse des fichiers médias (durée, flux, codecs, images clés).
+Les résultats sont mis en cache par chemin, date de modification et taille,
+de sorte que chaque fichier n'est analysé qu'une seule fois par processus,
+quelle que soit l'étape du pipeline qui en a besoin.
+
+PyAV est utilisé lorsqu'il est installé (analyse dans le processus), sinon
+l'analyse passe par ffprobe.
+
+Le relevé des images clés, qui lit tous les paquets vidéo, est en plus
+enregistré dans un petit fichier caché à côté du média: il n'est effectué
+qu'une fois par fichier, même après un redémarrage.
+"""
+
+import os
+import json
+import subprocess
+import threading
+import logging
+from collections import OrderedDict
+from fractions import Fraction
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de fichiers conservés dans le cache
+CACHE_SIZE = 256
+
+# Suffixe du fichier d'index des images clés enregistré à côté du média
+KEYFRAME_INDEX_SUFFIX = '.keyframes.json'
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def probe(path, keyframes=False):
+    """
+    Analyse un fichier média.
+
+    Args:
+        path: Chemin du fichier
+        keyframes: Booléen indiquant s'il faut aussi relever les images clés
+            (lecture de tous les paquets vidéo, plus coûteuse)
+
+    Returns:
+        Dictionnaire contenant la durée, le débit, la taille, les flux
+        ('streams', 'video', 'audio') et, si demandé, les instants des images
+        clés ('keyframes') et leur nombre ('keyframe_count')
+
+    Raises:
+        ValueError: Si le fichier ne peut pas être analysé
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ValueError(f"Fichier média inaccessible: {str(e)}")
+
+    key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+
+    if info is None:
+        info = _probe_with_av(path) if av is not None else _probe_with_ffprobe(path)
+        info['size'] = stat.st_size
+
+    if keyframes and 'keyframes' not in info:
+        info = dict(info)
+        times = _load_keyframe_index(path, stat)
+        if times is None:
+            times = _keyframes_with_av(path) if av is not None else _keyframes_with_ffprobe(path)
+            _save_keyframe_index(path, stat, times)
+        info['keyframes'] = times
+        info['keyframe_count'] = len(times)
+
+    with _cache_lock:
+        _cache[key] = info
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return info
+
+def get_duration(path):
+    """
+    Obtient la durée d'un fichier média en secondes.
+    """
+    return probe(path)['duration']
+
+def clear_cache():
+    """
+    Vide le cache des analyses.
+    """
+    with _cache_lock:
+        _cache.clear()
+
+def _probe_with_ffprobe(path):
+    """
+    Analyse un fichier avec ffprobe (un seul processus pour le conteneur et les flux).
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format',
+        '-show_streams',
+        path
+    ]
+
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        data = json.loads(result.stdout)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de l'analyse du fichier média: {e.stderr}")
+    except json.JSONDecodeError:
+        raise ValueError("Impossible de décoder le résultat de l'analyse du fichier média")
+
+    fmt = data.get('format', {})
+    streams = []
+    for stream in data.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'type': stream.get('codec_type'),
+            'codec': stream.get('codec_name'),
+            'profile': stream.get('profile'),
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'fps': _parse_rate(stream.get('avg_frame_rate')),
+            'time_base': stream.get('time_base'),
+            'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+            'channels': stream.get('channels'),
+            'bit_rate': int(stream['bit_rate']) if stream.get('bit_rate') else None
+        })
+
+    try:
+        duration = float(fmt['duration'])
+    except (KeyError, ValueError):
+        raise ValueError("Impossible de déterminer la durée du fichier média")
+
+    return _build_info(duration, int(fmt['bit_rate']) if fmt.get('bit_rate') else None, fmt.get('format_name'), streams)
+
+def _probe_with_av(path):
+    """
+    Analyse un fichier dans le processus avec PyAV (lecture de l'en-tête uniquement).
+    """
+    try:
+        with av.open(path) as container:
+            streams = []
+            for stream in container.streams:
+                context = stream.codec_context
+                streams.append({
+                    'index': stream.index,
+                    'type': stream.type,
+                    'codec': context.name,
+                    'profile': getattr(context, 'profile', None),
+                    'width': getattr(context, 'width', None),
+                    'height': getattr(context, 'height', None),
+                    'pix_fmt': getattr(context, 'pix_fmt', None),
+                    'fps': float(stream.average_rate) if getattr(stream, 'average_rate', None) else None,
+                    'time_base': str(stream.time_base) if stream.time_base else None,
+                    'sample_rate': getattr(context, 'sample_rate', None) if stream.type == 'audio' else None,
+                    'channels': getattr(context, 'channels', None) if stream.type == 'audio' else None,
+                    'bit_rate': stream.bit_rate or None
+                })
+
+            if container.duration is None:
+                raise ValueError("Impossible de déterminer la durée du fichier média")
+
+            return _build_info(container.duration / av.time_base, container.bit_rate or None,
+                               container.format.name, streams)
+    except av.FFmpegError as e:
+        raise ValueError(f"Erreur lors de l'analyse du fichier média: {str(e)}")
+
+def _keyframes_with_ffprobe(path):
+    """
+    Relève les instants des images clés du premier flux vidéo (lecture des paquets, sans décodage).
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=print_section=0',
+        path
+    ]
+
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de la lecture des images clés: {e.stderr}")
+
+    times = []
+    for line in result.stdout.splitlines():
+        fields = line.split(',')
+        if len(fields) >= 2 and 'K' in fields[1] and fields[0] not in ('', 'N/A'):
+            times.append(float(fields[0]))
+    return sorted(times)
+
+def _keyframes_with_av(path):
+    """
+    Relève les instants des images clés du premier flux vidéo avec PyAV.
+    """
+    times = []
+    try:
+        with av.open(path) as container:
+            if not container.streams.video:
+                return times
+
+            stream = container.streams.video[0]
+            for packet in container.demux(stream):
+                if packet.is_keyframe and packet.pts is not None:
+                    times.append(float(packet.pts * stream.time_base))
+    except av.FFmpegError as e:
+        raise ValueError(f"Erreur lors de la lecture des images clés: {str(e)}")
+    return sorted(times)
+
+def _keyframe_index_path(path):
+    """
+    Construit le chemin du fichier d'index des images clés d'un média.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}{KEYFRAME_INDEX_SUFFIX}")
+
+def _load_keyframe_index(path, stat):
+    """
+    Relit l'index des images clés d'un média s'il correspond au fichier actuel.
+
+    Returns:
+        Liste des instants des images clés ou None
+    """
+    try:
+        with open(_keyframe_index_path(path), 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('size') != stat.st_size or index.get('mtime_ns') != stat.st_mtime_ns:
+        return None
+    return index.get('keyframes')
+
+def _save_keyframe_index(path, stat, times):
+    """
+    Enregistre l'index des images clés à côté du média (ignoré si le répertoire
+    n'est pas accessible en écriture).
+    """
+    index_path = _keyframe_index_path(path)
+    temp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'keyframes': times}, f)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        logger.info(f"Index des images clés non enregistré pour {path}: {str(e)}")
+
+def _build_info(duration, bit_rate, format_name, streams):
+    """
+    Construit le dictionnaire de résultat commun aux deux méthodes d'analyse.
+    """
+    video = next((stream for stream in streams if stream['type'] == 'video'), None)
+    audio = next((stream for stream in streams if stream['type'] == 'audio'), None)
+
+    return {
+        'duration': duration,
+        'bit_rate': bit_rate,
+        'format': format_name,
+        'streams': streams,
+        'video': video,
+        'audio': audio,
+        'fps': video['fps'] if video else None
+    }
+
+def _parse_rate(rate):
+    """
+    Convertit une fréquence ffprobe ('30000/1001') en nombre décimal.
+    """
+    try:
+        value = Fraction(rate)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return float(value) if value else None
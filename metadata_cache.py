@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache des informations des vidéos YouTube.
+Le cache a deux niveaux: un LRU en mémoire propre au processus et une base
+SQLite partagée entre les processus, indexés par identifiant de vidéo.
+Les vidéos inaccessibles (privées, supprimées) sont aussi mises en cache,
+pour une durée plus courte, et les demandes simultanées pour une même vidéo
+partagent une seule extraction.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+from config import Config
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """
+    Extraction en cours pour une vidéo, partagée par les demandes simultanées.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MetadataCache:
+    """
+    Cache à deux niveaux (mémoire et SQLite) des informations des vidéos.
+    """
+
+    def __init__(self, db_path, ttl, negative_ttl, max_entries=1024, cached_errors=(ValueError,)):
+        """
+        Initialise le cache.
+
+        Args:
+            db_path: Chemin de la base SQLite (None pour un cache en mémoire uniquement)
+            ttl: Durée de validité des informations en secondes
+            negative_ttl: Durée de validité des erreurs mises en cache en secondes
+            max_entries: Nombre maximum d'entrées conservées en mémoire
+            cached_errors: Types d'erreurs mises en cache (vidéo inaccessible); une
+                erreur lue depuis le cache est reconstruite avec le premier type
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.cached_errors = cached_errors
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS video_metadata ('
+                    'video_id TEXT PRIMARY KEY, data TEXT, error TEXT, expires_at REAL NOT NULL)'
+                )
+
+    def get(self, video_id, fetch):
+        """
+        Récupère les informations d'une vidéo, en les extrayant si nécessaire.
+
+        Args:
+            video_id: Identifiant de la vidéo YouTube
+            fetch: Fonction sans argument retournant les informations de la vidéo
+
+        Returns:
+            Dictionnaire contenant les informations de la vidéo
+
+        Raises:
+            L'erreur mise en cache (reconstruite avec le premier type de
+            cached_errors) ou l'erreur levée par fetch
+        """
+        with self._lock:
+            entry = self._memory_get(video_id)
+            if entry is None:
+                flight = self._flights.get(video_id)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._flights[video_id] = flight
+
+        if entry is not None:
+            self._count(hit=True)
+            return self._unpack(entry)
+
+        # Une extraction est déjà en cours pour cette vidéo: on attend son résultat
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return dict(flight.result)
+
+        try:
+            entry = self._db_get(video_id)
+            self._count(hit=entry is not None)
+            if entry is None:
+                entry = self._fetch(video_id, fetch)
+
+            with self._lock:
+                self._memory_put(video_id, entry)
+
+            flight.result = self._unpack(entry)
+            return dict(flight.result)
+
+        except Exception as e:
+            flight.error = e
+            raise
+
+        finally:
+            with self._lock:
+                self._flights.pop(video_id, None)
+            flight.done.set()
+
+    def invalidate(self, video_id):
+        """
+        Supprime une vidéo des deux niveaux du cache.
+        """
+        with self._lock:
+            self._memory.pop(video_id, None)
+
+        if self.db_path:
+            with self._connection() as conn:
+                conn.execute('DELETE FROM video_metadata WHERE video_id = ?', (video_id,))
+
+    def purge_expired(self):
+        """
+        Supprime les entrées expirées de la base SQLite.
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        if not self.db_path:
+            return 0
+
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM video_metadata WHERE expires_at < ?', (time.time(),)).rowcount
+
+    def stats(self):
+        """
+        Récupère les statistiques du cache.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'in_flight': len(self._flights)
+            }
+
+    def _count(self, hit):
+        """
+        Met à jour les compteurs de succès et d'échecs du cache.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _fetch(self, video_id, fetch):
+        """
+        Extrait les informations d'une vidéo et enregistre le résultat (ou l'erreur).
+
+        Returns:
+            Entrée du cache: tuple (expiration, informations, message d'erreur)
+        """
+        try:
+            entry = (time.time() + self.ttl, fetch(), None)
+        except self.cached_errors as e:
+            logger.info(f"Vidéo inaccessible mise en cache: {video_id}")
+            entry = (time.time() + self.negative_ttl, None, str(e))
+
+        self._db_put(video_id, entry)
+        return entry
+
+    def _unpack(self, entry):
+        """
+        Retourne les informations d'une entrée ou lève l'erreur mise en cache.
+        """
+        _, data, error = entry
+        if error is not None:
+            raise self.cached_errors[0](error)
+        return dict(data)
+
+    def _memory_get(self, video_id):
+        """
+        Lit une entrée valide du cache mémoire (appelé avec le verrou acquis).
+        """
+        entry = self._memory.get(video_id)
+        if entry is None:
+            return None
+
+        if entry[0] < time.time():
+            del self._memory[video_id]
+            return None
+
+        self._memory.move_to_end(video_id)
+        return entry
+
+    def _memory_put(self, video_id, entry):
+        """
+        Ajoute une entrée au cache mémoire (appelé avec le verrou acquis).
+        """
+        self._memory[video_id] = entry
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, video_id):
+        """
+        Lit une entrée valide de la base SQLite.
+        """
+        if not self.db_path:
+            return None
+
+        try:
+            row = self._connection().execute(
+                'SELECT expires_at, data, error FROM video_metadata WHERE video_id = ? AND expires_at >= ?',
+                (video_id, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Erreur de lecture du cache des informations: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+
+        expires_at, data, error = row
+        return (expires_at, json.loads(data) if data else None, error)
+
+    def _db_put(self, video_id, entry):
+        """
+        Enregistre une entrée dans la base SQLite.
+        """
+        if not self.db_path:
+            return
+
+        expires_at, data, error = entry
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO video_metadata (video_id, data, error, expires_at) VALUES (?, ?, ?, ?)',
+                    (video_id, json.dumps(data) if data is not None else None, error, expires_at)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Erreur d'écriture du cache des informations: {str(e)}")
+
+    def _connection(self):
+        """
+        Récupère la connexion SQLite du thread courant.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+# Cache partagé par le processus, créé à la première utilisation
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_metadata_cache():
+    """
+    Récupère le cache des informations configuré par METADATA_CACHE_PATH et les durées de validité.
+
+    Returns:
+        Instance de MetadataCache
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            from api.utils.youtube_extractor import VideoUnavailableError
+            _cache = MetadataCache(
+                Config.METADATA_CACHE_PATH,
+                Config.METADATA_CACHE_TTL,
+                Config.METADATA_NEGATIVE_TTL,
+                cached_errors=(VideoUnavailableError,)
+            )
+        return _cache
@@ -84,3 +84,55 @@ class Clip(db.Model):
             'created_at': self.created_at.strftime('%a, %d %b %Y %H:%M:%S GMT') if self.created_at else None,
             'completed_at': self.completed_at.strftime('%a, %d %b %Y %H:%M:%S GMT') if self.completed_at else None
         }
+
+class ClipJob(db.Model):
+    __tablename__ = 'clip_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # Identique à l'identifiant du clip
+    youtube_url = db.Column(db.String(200), nullable=False)
+    title = db.Column(db.String(200))
+    channel = db.Column(db.String(100))
+    duration = db.Column(db.Integer)  # Durée de la vidéo source en secondes
+    mode = db.Column(db.String(10), default='short')  # 'short' ou 'long'
+    transitions = db.Column(db.Boolean, default=True)
+    plan = db.Column(db.String(20))  # Plan du demandeur (qualité maximale du rendu)
+    user_id = db.Column(db.String(36), index=True)  # Utilisateur demandeur (propriétaire du clip), ou None
+    source_format = db.Column(db.String(100))  # Format de la vidéo source téléchargée
+    bytes_saved = db.Column(db.BigInteger)  # Octets évités par rapport à la meilleure qualité
+    status = db.Column(db.String(20), default='queued', index=True)  # 'queued', 'resolving', 'downloading', 'processing', 'saving', 'completed', 'failed'
+    stage = db.Column(db.String(20))  # Dernière étape terminée du pipeline
+    checkpoint = db.Column(db.Text)  # Résultats des étapes terminées (JSON)
+    attempts = db.Column(db.Integer, default=0)
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    heartbeat_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    file_path = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'youtube_url': self.youtube_url,
+            'title': self.title,
+            'channel': self.channel,
+            'duration': self.duration,
+            'mode': self.mode,
+            'transitions': self.transitions,
+            'plan': self.plan,
+            'user_id': self.user_id,
+            'source_format': self.source_format,
+            'bytes_saved': self.bytes_saved,
+            'status': self.status,
+            'stage': self.stage,
+            'attempts': self.attempts,
+            'error': self.error,
+            'file_path': self.file_path,
+            'created_at': self.created_at.strftime('%a, %d %b %Y %H:%M:%S GMT') if self.created_at else None,
+            'completed_at': self.completed_at.strftime('%a, %d %b %Y %H:%M:%S GMT') if self.completed_at else None
+        }
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Téléchargement partiel des vidéos sources.
+Au lieu de télécharger la vidéo complète, seules les plages de temps des
+segments retenus sont récupérées: FFmpeg se positionne dans le flux distant
+à l'aide de requêtes HTTP Range et ne lit que les octets nécessaires.
+"""
+
+import os
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from api.utils.youtube_extractor import get_stream_urls
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de plages téléchargées simultanément
+MAX_PARALLEL_SECTIONS = 4
+
+def resolve_stream_url(youtube_url, fmt):
+    """
+    Récupère l'URL directe du flux d'une vidéo YouTube.
+
+    Args:
+        youtube_url: URL de la vidéo YouTube
+        fmt: Format demandé au téléchargeur (doit désigner un flux unique audio+vidéo)
+
+    Returns:
+        URL directe du flux
+
+    Raises:
+        ValueError: Si l'URL ne peut pas être obtenue
+    """
+    urls = get_stream_urls(youtube_url, fmt)
+    if len(urls) != 1:
+        raise ValueError("Le format demandé ne correspond pas à un flux unique")
+    return urls[0]
+
+def fetch_sections(stream_url, segments, output_dir):
+    """
+    Télécharge uniquement les plages de temps demandées d'un flux distant.
+
+    Args:
+        stream_url: URL HTTP(S) du flux (ou chemin local)
+        segments: Liste des segments (tuples de début et fin en secondes)
+        output_dir: Répertoire de sortie
+
+    Returns:
+        Liste des chemins des fichiers extraits, dans l'ordre des segments
+    """
+    paths = [os.path.join(output_dir, f"section_{i:03d}.mp4") for i in range(len(segments))]
+    jobs = list(zip(segments, paths))
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_SECTIONS, max(len(jobs), 1))) as pool:
+        # list() propage la première erreur rencontrée
+        list(pool.map(lambda job: _fetch_section(stream_url, job[0], job[1]), jobs))
+
+    return paths
+
+def _fetch_section(stream_url, segment, output_path):
+    """
+    Télécharge une plage de temps d'un flux sans réencodage.
+
+    Args:
+        stream_url: URL du flux
+        segment: Tuple (début, fin) en secondes
+        output_path: Chemin du fichier de sortie
+    """
+    start, end = segment
+
+    # -ss avant -i: FFmpeg se positionne dans le flux (requête Range) au lieu de le lire depuis le début
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-v', 'error',
+        '-ss', f"{start:.3f}",
+        '-i', stream_url,
+        '-t', f"{end - start:.3f}",
+        '-map', '0:v:0?',
+        '-map', '0:a:0?',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        output_path
+    ]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        logger.info(f"Plage {start:.1f}-{end:.1f}s téléchargée: {output_path}")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors du téléchargement de la plage {start:.1f}-{end:.1f}s: {e.stderr.decode('utf-8')}")
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compilation du rendu d'un clip en une seule commande FFmpeg.
+Découpe des segments, transitions, mise à l'échelle selon la qualité du plan
+et filigrane sont réunis dans un unique graphe de filtres: chaque image
+est décodée et encodée une seule fois, quel que soit le nombre de traitements.
+
+Les segments sont découpés à l'ouverture des entrées (-ss/-t), de sorte que
+seules les plages retenues de la source sont décodées.
+
+Les clips longs sont rendus par tranches parallèles: chaque tranche compile
+son propre graphe à partir des plages de la source qui la composent (les
+coupures évitent les fondus), la piste audio est rendue en une seule fois et
+les tranches sont assemblées sans réencodage. Chaque image reste décodée et
+encodée une seule fois.
+"""
+
+import os
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from api.utils.media_probe import probe
+from api.utils.smart_cut import ENCODE_PRESET, ENCODE_CRF, AUDIO_BITRATE
+from api.utils.transitions import CROSSFADE_TRANSITION
+from api.utils.chunked_encode import MIN_CHUNK_DURATION, join_chunks
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Hauteur maximale de l'image selon le plan d'abonnement (voir subscription_plans)
+PLAN_MAX_HEIGHTS = {
+    'free': 720,
+    'premium': 1080,
+    'pro': 2160
+}
+
+# Opacité et marge (en pixels) du filigrane
+WATERMARK_OPACITY = 0.6
+OVERLAY_MARGIN = 10
+
+def render_options_for_plan(plan):
+    """
+    Construit les options de rendu correspondant à un plan d'abonnement.
+
+    Args:
+        plan: Plan de l'utilisateur ('free', 'premium' ou 'pro')
+
+    Returns:
+        Dictionnaire des options de rendu ('max_height', 'watermark')
+    """
+    watermark = Config.WATERMARK_IMAGE if plan == 'free' else None
+    return {
+        'max_height': PLAN_MAX_HEIGHTS.get(plan, PLAN_MAX_HEIGHTS['free']),
+        'watermark': watermark if watermark and os.path.exists(watermark) else None
+    }
+
+def clamp_transition(lengths, transition):
+    """
+    Limite la durée des fondus d'un clip: un segment doit pouvoir accueillir
+    le fondu entrant et le fondu sortant (aucun fondu pour un segment unique).
+
+    Args:
+        lengths: Durées des segments en secondes
+        transition: Durée des fondus demandée en secondes
+
+    Returns:
+        Durée des fondus en secondes
+    """
+    return max(0.0, min(transition, min(lengths) / 2)) if len(lengths) > 1 else 0.0
+
+def compile_filtergraph(lengths, reference, with_audio=True, transition=0.0, max_height=None,
+                        watermark_input=None, inputs=None, fades=None, with_video=True):
+    """
+    Compile le graphe de filtres d'un clip.
+
+    Args:
+        lengths: Durées des segments en secondes (le segment i est l'entrée i)
+        reference: Informations de la source de référence (voir media_probe.probe)
+            dont la résolution et la fréquence d'images sont imposées à tous les
+            segments (une résolution absente n'est pas imposée)
+        with_audio: Booléen indiquant si les segments ont une piste audio
+        transition: Durée des fondus en secondes (0 pour une simple mise bout à bout)
+        max_height: Hauteur maximale de l'image, ou None
+        watermark_input: Numéro de l'entrée du filigrane, ou None
+        inputs: Étiquettes (vidéo, audio) des flux de chaque segment, à la place
+            des entrées de la commande (segments découpés dans le graphe)
+        fades: Tuple (fondu d'ouverture, fondu de fermeture) pour le rendu d'une
+            tranche du clip (voir plan_render_chunks), la durée des fondus étant
+            déjà limitée pour le clip entier; None pour un clip complet
+        with_video: Booléen indiquant si la vidéo est rendue (False pour la
+            seule piste audio)
+
+    Returns:
+        Tuple (graphe de filtres, étiquette de la sortie vidéo ou None,
+        étiquette de la sortie audio ou None)
+    """
+    video = (reference or {}).get('video') or {}
+    audio = (reference or {}).get('audio') or {}
+    count = len(lengths)
+    if fades is None:
+        transition = clamp_transition(lengths, transition)
+        fades = (transition > 0, transition > 0)
+
+    filters = []
+    for index in range(count):
+        source_video, source_audio = inputs[index] if inputs else (f"{index}:v", f"{index}:a")
+        if with_video:
+            normalise = [f"fps={video.get('fps') or 25:.6f}"]
+            if video.get('width') and video.get('height'):
+                normalise.append(f"scale={video['width']}:{video['height']}")
+            filters.append(f"[{source_video}]{','.join(normalise)},setsar=1,format=yuv420p[v{index}]")
+        if with_audio:
+            filters.append(f"[{source_audio}]aresample={audio.get('sample_rate') or 44100}[a{index}]")
+
+    # Assemblage des segments: fondus enchaînés ou mise bout à bout
+    if transition > 0:
+        video_label, audio_label, offset = 'v0', 'a0', 0.0
+        for index in range(1, count):
+            offset += lengths[index - 1] - transition
+            if with_video:
+                filters.append(f"[{video_label}][v{index}]xfade=transition={CROSSFADE_TRANSITION}:"
+                               f"duration={transition:.6f}:offset={offset:.6f}[vx{index}]")
+                video_label = f"vx{index}"
+            if with_audio:
+                filters.append(f"[{audio_label}][a{index}]acrossfade=d={transition:.6f}[ax{index}]")
+                audio_label = f"ax{index}"
+        total = offset + lengths[-1]
+
+        # Fondus d'ouverture et de fermeture du clip (première et dernière tranches)
+        effects = [effect for effect, enabled in zip(
+            (f"t=in:st=0:d={transition:.6f}", f"t=out:st={total - transition:.6f}:d={transition:.6f}"), fades) if enabled]
+        if with_video:
+            filters.append(f"[{video_label}]{','.join('fade=' + effect for effect in effects) or 'null'}[vj]")
+        if with_audio:
+            filters.append(f"[{audio_label}]{','.join('afade=' + effect for effect in effects) or 'anull'}[aj]")
+    else:
+        streams = ''.join((f"[v{index}]" if with_video else '') + (f"[a{index}]" if with_audio else '')
+                          for index in range(count))
+        outputs = ('[vj]' if with_video else '') + ('[aj]' if with_audio else '')
+        filters.append(f"{streams}concat=n={count}:v={1 if with_video else 0}:a={1 if with_audio else 0}{outputs}")
+
+    if not with_video:
+        return ';'.join(filters), None, 'aj' if with_audio else None
+
+    # Mise à l'échelle à la qualité maximale du plan (jamais d'agrandissement)
+    label = 'vj'
+    if max_height and not video.get('height'):
+        # Hauteur de la source inconnue: réduction seulement si elle dépasse la limite
+        filters.append(f"[{label}]scale=-2:min(ih\\,{max_height})[vs]")
+        label = 'vs'
+    elif max_height and video['height'] > max_height:
+        filters.append(f"[{label}]scale=-2:{max_height}[vs]")
+        label = 'vs'
+
+    # Filigrane en bas à droite
+    if watermark_input is not None:
+        filters.append(f"[{watermark_input}:v]format=rgba,colorchannelmixer=aa={WATERMARK_OPACITY}[wm]")
+        filters.append(f"[{label}][wm]overlay=W-w-{OVERLAY_MARGIN}:H-h-{OVERLAY_MARGIN}[vw]")
+        label = 'vw'
+
+    return ';'.join(filters), label, 'aj' if with_audio else None
+
+def plan_render_chunks(lengths, transition, count):
+    """
+    Découpe un clip en tranches rendues indépendamment. Chaque coupure est
+    placée à l'intérieur d'un segment, hors de ses fondus: une tranche ne
+    commence ni ne finit au milieu d'un fondu enchaîné.
+
+    Args:
+        lengths: Durées des segments en secondes
+        transition: Durée des fondus en secondes (déjà limitée, voir clamp_transition)
+        count: Nombre de tranches souhaité
+
+    Returns:
+        Liste des tranches, chacune liste de tuples (numéro du segment, début,
+        fin) en secondes depuis le début du segment
+    """
+    # Position de chaque segment dans le clip (les fondus enchaînés se chevauchent)
+    offsets = [sum(lengths[:index]) - index * transition for index in range(len(lengths))]
+    total = offsets[-1] + lengths[-1]
+
+    cuts = []
+    for index in range(1, count):
+        target = total * index / count
+        piece = max(number for number, offset in enumerate(offsets) if offset <= target)
+        low, high = offsets[piece] + transition, offsets[piece] + lengths[piece] - transition
+        if low >= high:
+            continue
+        cut = min(max(target, low), high)
+        if 0 < cut < total and (not cuts or cut > cuts[-1]):
+            cuts.append(cut)
+
+    bounds = [0.0] + cuts + [total]
+    return [[(number, max(0.0, start - offset), min(length, end - offset))
+             for number, (offset, length) in enumerate(zip(offsets, lengths)) if offset < end and offset + length > start]
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+def render_clip(pieces, output_file, transition=0.0, max_height=None, watermark=None, work_dir=None):
+    """
+    Rend un clip en une seule commande FFmpeg.
+
+    Les clips longs (Config.CHUNKED_ENCODE_MIN_DURATION) sont rendus par
+    tranches parallèles lorsque work_dir est fourni.
+
+    Args:
+        pieces: Liste des segments (tuples de fichier source, début et fin en
+            secondes; une fin à None désigne la fin du fichier)
+        output_file: Chemin du fichier de sortie
+        transition: Durée des fondus en secondes (0 pour une simple mise bout à bout)
+        max_height: Hauteur maximale de l'image, ou None
+        watermark: Chemin de l'image du filigrane, ou None
+        work_dir: Répertoire des tranches, ou None pour toujours rendre en une
+            seule commande
+
+    Raises:
+        ValueError: Si le rendu échoue
+    """
+    infos = {}
+    for video_path, _, _ in pieces:
+        if video_path not in infos:
+            infos[video_path] = probe(video_path)
+
+    pieces = [(video_path, start, end if end is not None else infos[video_path]['duration'])
+              for video_path, start, end in pieces]
+    lengths = [end - start for _, start, end in pieces]
+    transition = clamp_transition(lengths, transition)
+    reference = infos[pieces[0][0]]
+    with_audio = all(info['audio'] is not None for info in infos.values())
+
+    total = sum(lengths) - (len(lengths) - 1) * transition
+    if work_dir and total >= Config.CHUNKED_ENCODE_MIN_DURATION:
+        chunks = plan_render_chunks(lengths, transition, min(os.cpu_count() or 1, int(total // MIN_CHUNK_DURATION)))
+        if len(chunks) > 1:
+            _render_chunked(pieces, chunks, reference, with_audio, output_file, work_dir, transition,
+                            max_height, watermark)
+            return
+
+    cmd, watermark_input = _input_args(pieces, watermark)
+    graph, video_label, audio_label = compile_filtergraph(
+        lengths, reference, with_audio, transition, max_height, watermark_input)
+
+    cmd += ['-filter_complex', graph, '-map', f"[{video_label}]"]
+    cmd += ['-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF)]
+    if audio_label:
+        cmd += ['-map', f"[{audio_label}]", '-c:a', 'aac', '-b:a', AUDIO_BITRATE]
+    cmd += ['-movflags', '+faststart', output_file]
+
+    logger.info(f"Rendu en une passe: {len(pieces)} segments, fondus de {transition:.2f}s, "
+                f"hauteur max {max_height}, filigrane {'oui' if watermark else 'non'}")
+
+    _run(cmd, "Erreur lors du rendu du clip")
+
+def _render_chunked(pieces, chunks, reference, with_audio, output_file, work_dir, transition,
+                    max_height, watermark):
+    """
+    Rend les tranches vidéo en parallèle et la piste audio en une seule fois,
+    puis les assemble sans réencodage.
+    """
+    threads = max(1, (os.cpu_count() or 1) // len(chunks))
+    paths = [os.path.join(work_dir, f"render_{index:03d}.mkv") for index in range(len(chunks))]
+    audio_path = os.path.join(work_dir, "render_audio.mka") if with_audio else None
+
+    def render_chunk(index):
+        ranges = chunks[index]
+        cmd, watermark_input = _input_args([(pieces[number][0], pieces[number][1] + start, pieces[number][1] + end)
+                                            for number, start, end in ranges], watermark)
+        graph, video_label, _ = compile_filtergraph(
+            [end - start for _, start, end in ranges], reference, False, transition, max_height,
+            watermark_input, fades=(index == 0, index == len(chunks) - 1))
+        cmd += ['-filter_complex', graph, '-map', f"[{video_label}]",
+                '-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF), '-threads', str(threads),
+                '-f', 'matroska', paths[index]]
+        _run(cmd, f"Erreur lors du rendu de la tranche {index}")
+
+    def render_audio():
+        cmd, _ = _input_args(pieces)
+        graph, _, audio_label = compile_filtergraph(
+            [end - start for _, start, end in pieces], reference, True, transition, with_video=False)
+        cmd += ['-filter_complex', graph, '-map', f"[{audio_label}]", '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
+                '-f', 'matroska', audio_path]
+        _run(cmd, "Erreur lors du rendu de la piste audio")
+
+    logger.info(f"Rendu par tranches: {len(pieces)} segments en {len(chunks)} tranches, fondus de {transition:.2f}s, "
+                f"hauteur max {max_height}, filigrane {'oui' if watermark else 'non'}")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(chunks) + 1) as pool:
+            tasks = [pool.submit(render_chunk, index) for index in range(len(chunks))]
+            if with_audio:
+                tasks.append(pool.submit(render_audio))
+            # result() propage la première erreur rencontrée
+            for task in tasks:
+                task.result()
+
+        durations = [sum(end - start for _, start, end in ranges) - (len(ranges) - 1) * transition for ranges in chunks]
+        join_chunks(paths, durations, output_file, work_dir, audio_path, 'aac')
+    finally:
+        for path in paths + [audio_path]:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+def _input_args(pieces, watermark=None):
+    """
+    Construit le début d'une commande FFmpeg: un segment par entrée (découpé
+    à l'ouverture), suivi de l'image du filigrane.
+
+    Returns:
+        Tuple (commande, numéro de l'entrée du filigrane ou None)
+    """
+    cmd = ['ffmpeg', '-y', '-v', 'error']
+    for video_path, start, end in pieces:
+        cmd += ['-ss', f"{start:.6f}", '-t', f"{end - start:.6f}", '-i', video_path]
+
+    if not watermark:
+        return cmd, None
+    return cmd + ['-i', watermark], len(pieces)
+
+def _run(cmd, message):
+    """
+    Exécute une commande FFmpeg.
+
+    Raises:
+        ValueError: Si la commande échoue (message suivi de l'erreur de FFmpeg)
+    """
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"{message}: {e.stderr.decode('utf-8', 'replace')}")
@@ -5,8 +5,10 @@
 Définition des routes de l'API pour le générateur de clips "Best Of".
 """
 
-from flask import Blueprint, request, jsonify
-from api.controllers.clip_controller import generate_short_clip, generate_long_clip, get_clip_status, get_clip_info
+import os
+from flask import Blueprint, request, jsonify, current_app, send_file, redirect
+from flask_login import current_user
+from api.controllers.clip_controller import generate_short_clip, generate_long_clip, get_clip_status, get_clip_info, get_clip_file
 
 # Création du blueprint pour l'API
 api_bp = Blueprint('api', __name__)
@@ -21,6 +23,15 @@ def health_check():
         'message': 'API is running'
     }), 200
 
+def _requesting_user():
+    """
+    Utilisateur connecté, ou None si l'authentification n'est pas configurée
+    ou si la requête est anonyme.
+    """
+    if getattr(current_app, 'login_manager', None) is None or not current_user.is_authenticated:
+        return None
+    return current_user
+
 @api_bp.route('/clips', methods=['POST'])
 def create_clip():
     """
@@ -56,16 +67,23 @@ def create_clip():
         }), 400
     
     try:
+        user = _requesting_user()
+        plan, user_id = (user.plan, user.id) if user else (None, None)
         if mode == 'short':
-            clip_id = generate_short_clip(url, transitions)
+            clip_id = generate_short_clip(url, transitions, plan, user_id)
         else:
-            clip_id = generate_long_clip(url, transitions)
+            clip_id = generate_long_clip(url, transitions, plan, user_id)
         
         return jsonify({
             'status': 'success',
             'message': 'Clip generation started',
             'clip_id': clip_id
         }), 202
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -119,3 +137,48 @@ def check_clip_status(clip_id):
             'status': 'error',
             'message': str(e)
         }), 500
+
+@api_bp.route('/clips/<clip_id>/download', methods=['GET'])
+def download_clip(clip_id):
+    """
+    Endpoint pour télécharger ou lire un clip terminé.
+    
+    Les requêtes partielles (Range, réponse 206) permettent au lecteur vidéo de
+    se positionner sans retélécharger le fichier, et les requêtes
+    conditionnelles (ETag, Last-Modified) évitent de renvoyer un fichier déjà
+    en cache. Si DOWNLOAD_ACCEL_REDIRECT est configuré, l'envoi du fichier est
+    délégué à Nginx (X-Accel-Redirect): le worker Python ne lit jamais la vidéo.
+    Si les clips sont stockés dans un bucket S3, le client est redirigé vers
+    une URL signée et télécharge le clip directement depuis le bucket.
+    
+    Paramètres de requête:
+    - download: '1' pour un téléchargement en pièce jointe (lecture dans le navigateur sinon)
+    """
+    as_attachment = request.args.get('download') == '1'
+    clip_file = get_clip_file(clip_id, as_attachment)
+    
+    if not clip_file:
+        return jsonify({
+            'status': 'error',
+            'message': 'Clip not found'
+        }), 404
+    
+    if 'url' in clip_file:
+        return redirect(clip_file['url'], code=302)
+    
+    file_path, relative_path = clip_file['path'], clip_file['relative_path']
+    download_name = f"{clip_id}{os.path.splitext(file_path)[1]}"
+    
+    accel_prefix = current_app.config.get('DOWNLOAD_ACCEL_REDIRECT')
+    if accel_prefix:
+        # Nginx sert le fichier depuis un emplacement interne (Range et ETag compris)
+        response = current_app.response_class(mimetype='video/mp4')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{relative_path}"
+        response.headers['Content-Disposition'] = (
+            f'{"attachment" if as_attachment else "inline"}; filename="{download_name}"'
+        )
+        return response
+    
+    # Envoi par wsgi.file_wrapper (sendfile sous gunicorn), plages et requêtes conditionnelles gérées par Werkzeug
+    return send_file(file_path, mimetype='video/mp4', as_attachment=as_attachment, download_name=download_name,
+                     conditional=True, etag=True, max_age=current_app.config.get('DOWNLOAD_MAX_AGE', 3600))
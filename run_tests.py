@@ -16,6 +16,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from tests.test_auth import AuthTestCase
 from tests.test_monetization import MonetizationTestCase
 from tests.test_payment import PaymentTestCase
+from tests.test_clip_generator import SourceCacheTestCase, SegmentPlannerTestCase, PartialDownloadTestCase, AudioAnalysisTestCase, SceneAnalysisTestCase, HighlightAnalysisTestCase, ScoreIndexTestCase, SmartCutTestCase, TransitionsTestCase, ChunkedEncodeTestCase, RenderGraphTestCase, StreamCutTestCase, ScratchSpaceTestCase, MediaProbeTestCase
+from tests.test_youtube_extractor import MetadataCacheTestCase, ExtractorBackendTestCase, FormatSelectionTestCase, VideoIdTestCase
+from tests.test_jobs import GenerationExecutorTestCase, JobQueueTestCase, GenerationResumeTestCase
+from tests.test_storage import LocalStorageTestCase, StorageBackendTestCase, DownloadRouteTestCase
 
 if __name__ == '__main__':
     # Créer une suite de tests
@@ -26,6 +30,30 @@ if __name__ == '__main__':
     suite.addTests(loader.loadTestsFromTestCase(AuthTestCase))
     suite.addTests(loader.loadTestsFromTestCase(MonetizationTestCase))
     suite.addTests(loader.loadTestsFromTestCase(PaymentTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(GenerationExecutorTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(JobQueueTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(GenerationResumeTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(SourceCacheTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(SegmentPlannerTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(PartialDownloadTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(AudioAnalysisTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(SceneAnalysisTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(HighlightAnalysisTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ScoreIndexTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(SmartCutTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(TransitionsTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ChunkedEncodeTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(RenderGraphTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(StreamCutTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ScratchSpaceTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(MediaProbeTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(MetadataCacheTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(ExtractorBackendTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(FormatSelectionTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(VideoIdTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(LocalStorageTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(StorageBackendTestCase))
+    suite.addTests(loader.loadTestsFromTestCase(DownloadRouteTestCase))
     
     # Exécuter les tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Détection des changements de plan et de l'intensité du mouvement.
+L'analyse porte sur une version réduite de la vidéo (niveaux de gris, basse
+résolution, quelques images par seconde, voir highlight_analysis) reçue par
+lots: seules les coupures de plan et la courbe de mouvement par seconde sont
+conservées, de sorte que la mémoire utilisée ne dépend pas de la durée de la vidéo.
+
+- Une coupure de plan est détectée lorsque l'histogramme de luminance change
+  brusquement d'une image à la suivante.
+- L'intensité du mouvement d'une seconde est la différence moyenne entre ses
+  images successives.
+"""
+
+import numpy as np
+
+# Version réduite de la vidéo analysée
+PROXY_FPS = 4
+PROXY_WIDTH = 64
+PROXY_HEIGHT = 36
+
+# Nombre d'images de la version réduite lues depuis FFmpeg par lot
+BATCH_FRAMES = 256
+
+# Nombre de classes de l'histogramme de luminance
+HISTOGRAM_BINS = 32
+
+# Distance d'histogramme (entre 0 et 1) au-delà de laquelle une coupure de plan est détectée
+SCENE_THRESHOLD = 0.35
+
+# Durée minimale d'un plan en secondes (évite les coupures multiples sur un fondu ou un flash)
+MIN_SHOT_DURATION = 1.0
+
+class SceneChangeAnalyzer:
+    """
+    Détecte les coupures de plan et calcule la courbe de mouvement à partir d'images reçues par lots.
+    """
+
+    media = 'video'
+
+    def __init__(self, fps=PROXY_FPS):
+        """
+        Args:
+            fps: Nombre d'images par seconde de la version réduite
+        """
+        self.fps = fps
+        self.boundaries = []
+        self._frames = 0
+        self._previous = None
+        self._previous_histogram = None
+        self._motion = np.zeros(64)
+        self._counts = np.zeros(64)
+
+    def feed(self, frames):
+        """
+        Analyse un lot d'images.
+
+        Args:
+            frames: Tableau NumPy uint8 de forme (images, hauteur, largeur)
+        """
+        count = len(frames)
+        if count == 0:
+            return
+
+        pixels = frames[0].size
+        current = frames.astype(np.int16)
+
+        # Histogrammes de luminance de toutes les images du lot en un seul appel
+        bins = (frames // (256 // HISTOGRAM_BINS)).reshape(count, -1).astype(np.int64)
+        bins += (np.arange(count) * HISTOGRAM_BINS)[:, None]
+        histograms = np.bincount(bins.ravel(), minlength=count * HISTOGRAM_BINS).reshape(count, HISTOGRAM_BINS) / pixels
+
+        # Comparaison de chaque image avec la précédente (la dernière du lot précédent pour la première)
+        if self._previous is None:
+            previous = np.concatenate((current[:1], current[:-1]))
+            previous_histograms = np.concatenate((histograms[:1], histograms[:-1]))
+        else:
+            previous = np.concatenate((self._previous[None], current[:-1]))
+            previous_histograms = np.concatenate((self._previous_histogram[None], histograms[:-1]))
+
+        differences = np.abs(current - previous).reshape(count, -1).mean(axis=1) / 255
+        distances = 0.5 * np.abs(histograms - previous_histograms).sum(axis=1)
+
+        self._previous = current[-1]
+        self._previous_histogram = histograms[-1]
+
+        # Coupures de plan
+        cuts = distances > SCENE_THRESHOLD
+        for index in np.flatnonzero(cuts):
+            time = (self._frames + index) / self.fps
+            if not self.boundaries or time - self.boundaries[-1] >= MIN_SHOT_DURATION:
+                self.boundaries.append(float(time))
+
+        # Mouvement cumulé par seconde (les coupures de plan ne comptent pas comme du mouvement)
+        seconds = (self._frames + np.arange(count)) // self.fps
+        self._grow(seconds[-1] + 1)
+        np.add.at(self._motion, seconds[~cuts], differences[~cuts])
+        np.add.at(self._counts, seconds[~cuts], 1)
+        self._frames += count
+
+    def finish(self):
+        """
+        Termine l'analyse.
+
+        Returns:
+            Tableau NumPy de l'intensité du mouvement par seconde, entre 0 et 1
+            (les coupures de plan sont disponibles dans l'attribut boundaries)
+        """
+        length = -(-self._frames // self.fps)
+        counts = self._counts[:length]
+        motion = np.divide(self._motion[:length], counts, out=np.zeros(length), where=counts > 0)
+        peak = motion.max() if length else 0
+        return (motion / peak if peak > 0 else motion).astype(np.float32)
+
+    def _grow(self, length):
+        """
+        Agrandit les tableaux par seconde (capacité doublée) pour contenir length secondes.
+        """
+        capacity = len(self._motion)
+        if length <= capacity:
+            return
+
+        while capacity < length:
+            capacity *= 2
+        self._motion = np.concatenate((self._motion, np.zeros(capacity - len(self._motion))))
+        self._counts = np.concatenate((self._counts, np.zeros(capacity - len(self._counts))))
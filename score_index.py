@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index persistant des courbes de moments forts, par identifiant de vidéo.
+Une fois une vidéo analysée, son score par seconde est enregistré dans un
+fichier .npy (float16) accompagné d'un petit fichier JSON de métadonnées
+(version des analyseurs, coupures de plan, durée, empreinte de la courbe). Les générations suivantes
+de la même vidéo (autre mode, nouveau tirage, autre utilisateur) projettent
+la courbe en mémoire (mmap) et planifient les segments sans aucun décodage.
+
+L'index est borné en taille (éviction des courbes les moins récemment
+utilisées) et une entrée dont la version ne correspond plus aux analyseurs
+courants est ignorée puis remplacée. L'empreinte de la courbe enregistrée
+dans le fichier JSON relie les deux fichiers: une courbe et des métadonnées
+issues de deux écritures différentes (lecture entre les deux renommages,
+arrêt brutal) sont ignorées.
+"""
+
+import os
+import re
+import json
+import hashlib
+import uuid
+import time
+import threading
+import logging
+
+import numpy as np
+
+from config import Config
+from api.utils.highlight_analysis import analysis_version
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Type des scores enregistrés (valeurs entre 0 et 1, précision largement suffisante)
+SCORE_DTYPE = np.float16
+
+class ScoreIndex:
+    """
+    Index disque des courbes de scores, borné en taille.
+    """
+
+    def __init__(self, root, max_bytes, version):
+        """
+        Initialise l'index.
+
+        Args:
+            root: Répertoire de l'index
+            max_bytes: Taille maximale de l'index en octets
+            version: Version des analyseurs (les entrées d'une autre version sont ignorées)
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def get(self, video_id):
+        """
+        Récupère la courbe de scores d'une vidéo.
+
+        Args:
+            video_id: Identifiant de la vidéo YouTube
+
+        Returns:
+            Dictionnaire contenant les scores par seconde ('scores', tableau
+            NumPy projeté en mémoire en lecture seule), les coupures de plan
+            ('boundaries') et la durée ('duration'), ou None si la vidéo n'est
+            pas indexée pour la version courante
+        """
+        scores_path, meta_path = self._paths(video_id)
+
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != self.version:
+                raise ValueError(f"version {meta.get('version')}")
+            scores = np.load(scores_path, mmap_mode='r')
+            if meta.get('checksum') != _checksum(scores):
+                raise ValueError("courbe et métadonnées incohérentes")
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.info(f"Entrée de l'index des scores ignorée pour {video_id}: {str(e)}")
+            self._count(hit=False)
+            return None
+
+        # Date d'utilisation pour l'éviction LRU
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        self._count(hit=True)
+        return {
+            'scores': scores,
+            'boundaries': meta.get('boundaries', []),
+            'duration': meta.get('duration')
+        }
+
+    def put(self, video_id, scores, boundaries=None, duration=None):
+        """
+        Enregistre la courbe de scores d'une vidéo.
+
+        Args:
+            video_id: Identifiant de la vidéo YouTube
+            scores: Scores par seconde (entre 0 et 1)
+            boundaries: Coupures de plan en secondes
+            duration: Durée de la vidéo en secondes
+        """
+        scores_path, meta_path = self._paths(video_id)
+        suffix = f".tmp-{uuid.uuid4().hex}"
+
+        scores = np.asarray(scores, dtype=SCORE_DTYPE)
+
+        # Écriture dans des fichiers temporaires puis renommage: un lecteur
+        # ne voit jamais de fichier incomplet, et l'empreinte écarte une
+        # courbe associée aux métadonnées d'une autre écriture
+        with open(scores_path + suffix, 'wb') as f:
+            np.save(f, scores)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump({
+                'version': self.version,
+                'video_id': video_id,
+                'length': len(scores),
+                'checksum': _checksum(scores),
+                'duration': duration,
+                'boundaries': [float(boundary) for boundary in boundaries or []],
+                'created_at': time.time()
+            }, f)
+
+        os.replace(scores_path + suffix, scores_path)
+        os.replace(meta_path + suffix, meta_path)
+
+        self.evict()
+
+    def invalidate(self, video_id):
+        """
+        Supprime la courbe d'une vidéo de l'index.
+        """
+        for path in self._paths(video_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Supprime les courbes les moins récemment utilisées jusqu'à repasser sous
+        la taille maximale.
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+
+        for video_key, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+
+            for extension in ('.json', '.npy'):
+                try:
+                    os.remove(os.path.join(self.root, video_key + extension))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        """
+        Récupère les statistiques de l'index.
+
+        Returns:
+            Dictionnaire contenant les compteurs et l'occupation de l'index
+        """
+        entries = self._entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'size': sum(size for _, size, _ in entries),
+                'max_size': self.max_bytes,
+                'version': self.version
+            }
+
+    def _count(self, hit):
+        """
+        Met à jour les compteurs de succès et d'échecs de l'index.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _paths(self, video_id):
+        """
+        Construit les chemins des fichiers de scores et de métadonnées d'une vidéo.
+        """
+        base = os.path.join(self.root, re.sub(r'[^A-Za-z0-9_-]', '_', video_id))
+        return base + '.npy', base + '.json'
+
+    def _entries(self):
+        """
+        Liste les entrées de l'index.
+
+        Returns:
+            Liste de tuples (nom de l'entrée, taille en octets, date de dernière utilisation)
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+
+            video_key = name[:-len('.json')]
+            try:
+                meta_stat = os.stat(os.path.join(self.root, name))
+                scores_size = os.path.getsize(os.path.join(self.root, video_key + '.npy'))
+            except FileNotFoundError:
+                continue
+            entries.append((video_key, meta_stat.st_size + scores_size, meta_stat.st_mtime))
+        return entries
+
+def _checksum(scores):
+    """
+    Calcule l'empreinte d'une courbe de scores.
+    """
+    return hashlib.sha1(np.ascontiguousarray(scores, dtype=SCORE_DTYPE).tobytes()).hexdigest()
+
+# Index partagé par le processus, créé à la première utilisation
+_index = None
+_index_lock = threading.Lock()
+
+def get_score_index():
+    """
+    Récupère l'index configuré par SCORE_INDEX_DIR et SCORE_INDEX_MAX_BYTES,
+    pour la version des analyseurs enregistrés.
+
+    Returns:
+        Instance de ScoreIndex
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = ScoreIndex(Config.SCORE_INDEX_DIR, Config.SCORE_INDEX_MAX_BYTES, analysis_version())
+        return _index
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Espace de travail temporaire des générations de clips.
+Chaque génération dispose d'un répertoire sous une racine configurable
+(tmpfs ou disque NVMe rapide), supprimé avec tout son contenu à la fin de la
+génération. L'espace est borné par un quota par génération et un quota
+global, et l'espace libre du disque est vérifié avant chaque téléchargement.
+
+Un répertoire utilisé par une génération en cours porte un verrou (flock) sur
+son fichier .lock. Le verrou disparaît avec le processus: après un arrêt
+brutal, les répertoires non verrouillés et inactifs depuis un certain temps
+sont supprimés par reap().
+"""
+
+import os
+import time
+import uuid
+import fcntl
+import shutil
+import threading
+import logging
+
+from config import Config
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Nom du fichier de verrou présent dans chaque espace de travail
+LOCK_FILE = '.lock'
+
+# Préfixe des répertoires des espaces de travail
+WORKSPACE_PREFIX = 'job-'
+
+def directory_size(directory):
+    """
+    Calcule la taille totale des fichiers d'un répertoire (sous-répertoires compris).
+
+    Args:
+        directory: Répertoire à mesurer
+
+    Returns:
+        Taille en octets (0 si le répertoire n'existe pas)
+    """
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+def check_free_space(directory, expected_bytes):
+    """
+    Vérifie que le disque d'un répertoire peut accueillir un fichier.
+
+    Args:
+        directory: Répertoire de destination
+        expected_bytes: Taille attendue en octets (estimée à partir des
+            métadonnées), ou None si elle n'est pas connue
+
+    Raises:
+        ValueError: Si l'espace libre, diminué de la réserve
+            Config.SCRATCH_FREE_MARGIN, est insuffisant
+    """
+    if not expected_bytes:
+        return
+
+    free = shutil.disk_usage(directory).free
+    if free - Config.SCRATCH_FREE_MARGIN < expected_bytes:
+        raise ValueError(f"Espace disque insuffisant dans {directory}: {expected_bytes} octets nécessaires, "
+                         f"{max(0, free - Config.SCRATCH_FREE_MARGIN)} disponibles")
+
+class ScratchSpace:
+    """
+    Gestionnaire des espaces de travail temporaires, avec quotas et nettoyage garanti.
+    """
+
+    def __init__(self, root, max_bytes, job_max_bytes, orphan_age):
+        """
+        Initialise le gestionnaire.
+
+        Args:
+            root: Répertoire racine des espaces de travail
+            max_bytes: Taille maximale de l'ensemble des espaces en octets
+            job_max_bytes: Taille maximale d'un espace en octets
+            orphan_age: Durée d'inactivité en secondes après laquelle un espace
+                non verrouillé est considéré comme abandonné
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.job_max_bytes = job_max_bytes
+        self.orphan_age = orphan_age
+        self.reaped = 0
+        self._lock = threading.Lock()
+        self._handles = {}
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, name=None):
+        """
+        Crée et verrouille un nouvel espace de travail.
+
+        Args:
+            name: Suffixe du nom du répertoire (identifiant de la génération), ou None
+
+        Returns:
+            Chemin du répertoire créé
+        """
+        suffix = f"{name}-{uuid.uuid4().hex[:8]}" if name else uuid.uuid4().hex
+        workspace = os.path.join(self.root, f"{WORKSPACE_PREFIX}{suffix}")
+        os.makedirs(workspace)
+        if not self._pin(workspace):
+            raise ValueError(f"Impossible de verrouiller l'espace de travail {workspace}")
+        return workspace
+
+    def attach(self, workspace):
+        """
+        Reprend un espace de travail existant (reprise d'une génération interrompue).
+
+        Args:
+            workspace: Chemin de l'espace de travail, ou None
+
+        Returns:
+            Chemin de l'espace verrouillé, ou None s'il n'existe plus ou
+            n'appartient pas à ce gestionnaire
+        """
+        if not self.owns(workspace):
+            return None
+        return workspace if self._pin(workspace) else None
+
+    def owns(self, workspace):
+        """
+        Indique si un chemin désigne un espace de travail de ce gestionnaire.
+
+        Args:
+            workspace: Chemin à vérifier, ou None
+
+        Returns:
+            True si le chemin est un espace de travail situé sous la racine
+        """
+        if not workspace:
+            return False
+        path = os.path.abspath(workspace)
+        return (os.path.dirname(path) == os.path.abspath(self.root)
+                and os.path.basename(path).startswith(WORKSPACE_PREFIX))
+
+    def detach(self, workspace):
+        """
+        Libère le verrou d'un espace de travail en conservant son contenu.
+
+        Args:
+            workspace: Chemin de l'espace de travail
+        """
+        with self._lock:
+            handle = self._handles.pop(workspace, None)
+        if handle:
+            handle.close()
+
+    def discard(self, workspace):
+        """
+        Supprime un espace de travail et tout son contenu. Un chemin situé
+        hors de la racine n'est jamais supprimé.
+
+        Args:
+            workspace: Chemin de l'espace de travail
+        """
+        self.detach(workspace)
+        if not self.owns(workspace):
+            logger.warning(f"Suppression ignorée, chemin hors des espaces de travail: {workspace}")
+            return
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    def reserve(self, workspace, expected_bytes):
+        """
+        Vérifie qu'un fichier peut être écrit dans un espace de travail.
+
+        Args:
+            workspace: Chemin de l'espace de travail
+            expected_bytes: Taille attendue en octets, ou None si elle n'est pas connue
+
+        Raises:
+            ValueError: Si un quota ou l'espace libre du disque serait dépassé
+        """
+        if not expected_bytes:
+            return
+
+        used = directory_size(workspace)
+        if used + expected_bytes > self.job_max_bytes:
+            raise ValueError(f"Quota de l'espace de travail dépassé: {used + expected_bytes} octets "
+                             f"pour un maximum de {self.job_max_bytes}")
+
+        total = self.usage()
+        if total + expected_bytes > self.max_bytes:
+            raise ValueError(f"Quota global des espaces de travail dépassé: {total + expected_bytes} octets "
+                             f"pour un maximum de {self.max_bytes}")
+
+        check_free_space(workspace, expected_bytes)
+
+    def usage(self):
+        """
+        Calcule l'occupation de l'ensemble des espaces de travail.
+
+        Returns:
+            Taille en octets
+        """
+        return directory_size(self.root)
+
+    def reap(self):
+        """
+        Supprime les espaces de travail abandonnés: non verrouillés et
+        inactifs depuis plus de orphan_age secondes.
+
+        Returns:
+            Nombre d'espaces supprimés
+        """
+        reaped = 0
+        now = time.time()
+
+        for name in os.listdir(self.root):
+            workspace = os.path.join(self.root, name)
+            if not name.startswith(WORKSPACE_PREFIX) or not os.path.isdir(workspace):
+                continue
+
+            try:
+                if now - os.stat(workspace).st_mtime < self.orphan_age:
+                    continue
+            except FileNotFoundError:
+                continue
+
+            if self._remove_if_unused(workspace):
+                reaped += 1
+
+        with self._lock:
+            self.reaped += reaped
+        return reaped
+
+    def stats(self):
+        """
+        Récupère les statistiques des espaces de travail.
+
+        Returns:
+            Dictionnaire contenant l'occupation et les compteurs
+        """
+        workspaces = [name for name in os.listdir(self.root) if name.startswith(WORKSPACE_PREFIX)]
+        with self._lock:
+            return {
+                'workspaces': len(workspaces),
+                'in_use': len(self._handles),
+                'reaped': self.reaped,
+                'size': self.usage(),
+                'max_size': self.max_bytes,
+                'job_max_size': self.job_max_bytes
+            }
+
+    def _pin(self, workspace):
+        """
+        Pose un verrou partagé sur un espace de travail.
+
+        Returns:
+            True si l'espace existe et est désormais verrouillé
+        """
+        with self._lock:
+            if workspace in self._handles:
+                return True
+
+        try:
+            handle = open(os.path.join(workspace, LOCK_FILE), 'a')
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        # Bloquant: attend la fin d'une éventuelle suppression en cours
+        fcntl.flock(handle, fcntl.LOCK_SH)
+        if not os.path.isdir(workspace):
+            handle.close()
+            return False
+
+        os.utime(workspace)
+        with self._lock:
+            self._handles[workspace] = handle
+        return True
+
+    def _remove_if_unused(self, workspace):
+        """
+        Supprime un espace de travail si aucun processus ne l'utilise.
+
+        Returns:
+            True si l'espace a été supprimé
+        """
+        try:
+            handle = open(os.path.join(workspace, LOCK_FILE), 'a')
+        except FileNotFoundError:
+            # Espace sans verrou (création interrompue): supprimé directement
+            shutil.rmtree(workspace, ignore_errors=True)
+            return not os.path.exists(workspace)
+
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+
+        try:
+            shutil.rmtree(workspace, ignore_errors=True)
+            logger.info(f"Espace de travail abandonné supprimé: {os.path.basename(workspace)}")
+            return True
+        finally:
+            handle.close()
+
+# Gestionnaire partagé par le processus, créé à la première utilisation
+_scratch = None
+_scratch_lock = threading.Lock()
+
+def get_scratch_space():
+    """
+    Récupère le gestionnaire des espaces de travail configuré par SCRATCH_DIR,
+    SCRATCH_MAX_BYTES, SCRATCH_JOB_MAX_BYTES et SCRATCH_ORPHAN_AGE.
+
+    Returns:
+        Instance de ScratchSpace
+    """
+    global _scratch
+
+    with _scratch_lock:
+        if _scratch is None:
+            _scratch = ScratchSpace(Config.SCRATCH_DIR, Config.SCRATCH_MAX_BYTES,
+                                    Config.SCRATCH_JOB_MAX_BYTES, Config.SCRATCH_ORPHAN_AGE)
+        return _scratch
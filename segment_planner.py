@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Planification des segments retenus dans un clip.
+Les segments sont choisis à partir d'une courbe de score par seconde (popularité,
+intensité...) lorsqu'elle est disponible, ou au hasard dans la vidéo sinon.
+La planification ne nécessite que la durée de la vidéo, ce qui permet de choisir
+les segments avant tout téléchargement.
+"""
+
+import random
+
+import numpy as np
+
+# Durée d'un clip court en secondes (bornes incluses)
+SHORT_CLIP_DURATION = (30, 60)
+
+# Proportion de la vidéo conservée dans un clip long
+LONG_CLIP_RATIO = 0.2
+
+# Durées possibles pour les segments d'un clip long (en secondes)
+LONG_SEGMENT_DURATIONS = [30, 60, 120, 180, 300]
+
+# Durée minimale d'un segment de clip long en secondes
+MIN_SEGMENT_DURATION = 10
+
+# Écart maximal en secondes pour aligner un segment sur une coupure de plan
+SNAP_TOLERANCE = 1.5
+
+# Écart maximal en secondes pour aligner une limite de segment sur l'image clé
+# suivante plutôt que sur la précédente
+KEYFRAME_TOLERANCE = 2.0
+
+def plan_segments(video_duration, mode, scores=None, boundaries=None):
+    """
+    Planifie les segments d'un clip.
+
+    Args:
+        video_duration: Durée de la vidéo en secondes
+        mode: Mode de génération ('short' ou 'long')
+        scores: Scores par seconde de la vidéo (liste ou tableau NumPy) ou None
+        boundaries: Instants des coupures de plan en secondes ou None
+
+    Returns:
+        Liste des segments (tuples de début et fin en secondes), triés par début
+    """
+    if mode == 'short':
+        segments = plan_short_segments(video_duration, scores)
+        limits = SHORT_CLIP_DURATION
+    else:
+        segments = plan_long_segments(video_duration, scores)
+        limits = (MIN_SEGMENT_DURATION, video_duration)
+
+    if boundaries:
+        segments = snap_to_boundaries(segments, boundaries, video_duration, limits)
+    return segments
+
+def plan_short_segments(video_duration, scores=None):
+    """
+    Planifie le segment unique d'un clip court (30-60s).
+
+    Args:
+        video_duration: Durée de la vidéo en secondes
+        scores: Scores par seconde de la vidéo (liste ou tableau NumPy) ou None
+
+    Returns:
+        Liste contenant un seul segment (début, fin)
+    """
+    clip_duration = random.randint(*SHORT_CLIP_DURATION)
+
+    # On s'assure que le segment ne dépasse pas la durée de la vidéo
+    if clip_duration >= video_duration:
+        return [(0, video_duration)]
+
+    if scores is not None and len(scores):
+        start_time = _best_window(scores, clip_duration, None)
+        if start_time is not None:
+            return [(float(start_time), float(start_time + clip_duration))]
+
+    max_start_time = video_duration - clip_duration
+    start_time = random.uniform(0, max_start_time)
+    return [(start_time, start_time + clip_duration)]
+
+def plan_long_segments(video_duration, scores=None):
+    """
+    Planifie les segments d'un clip long (20% de la durée totale).
+
+    Args:
+        video_duration: Durée de la vidéo en secondes
+        scores: Scores par seconde de la vidéo (liste ou tableau NumPy) ou None
+
+    Returns:
+        Liste des segments (début, fin), sans chevauchement et triés par début
+    """
+    target_duration = video_duration * LONG_CLIP_RATIO
+
+    segments = []
+    used_seconds = np.zeros(len(scores), dtype=bool) if scores is not None else None
+    current_duration = 0
+
+    while current_duration < target_duration:
+        # Choix aléatoire d'une durée de segment
+        duration = random.choice(LONG_SEGMENT_DURATIONS)
+
+        # Si on dépasse la cible avec ce segment, on ajuste
+        if current_duration + duration > target_duration:
+            duration = target_duration - current_duration
+
+        # Si la durée restante est trop courte, on arrête
+        if duration < MIN_SEGMENT_DURATION:
+            break
+
+        start_time = None
+        if scores is not None and len(scores):
+            start_time = _best_window(scores, int(duration), used_seconds)
+            if start_time is None:
+                break
+            used_seconds[start_time:start_time + int(duration)] = True
+        else:
+            max_start_time = video_duration - duration
+            start_time = random.uniform(0, max_start_time)
+
+        segments.append((float(start_time), float(start_time + duration)))
+        current_duration += duration
+
+    return sorted(segments)
+
+def snap_to_boundaries(segments, boundaries, video_duration, limits, tolerance=SNAP_TOLERANCE):
+    """
+    Aligne le début et la fin des segments sur les coupures de plan proches,
+    pour que le clip ne commence ni ne finisse au milieu d'un plan.
+
+    Args:
+        segments: Segments triés par début (tuples de début et fin en secondes)
+        boundaries: Instants des coupures de plan en secondes
+        video_duration: Durée de la vidéo en secondes
+        limits: Tuple (durée minimale, durée maximale) d'un segment
+        tolerance: Écart maximal en secondes entre une limite et la coupure retenue
+
+    Returns:
+        Liste des segments alignés (un segment reste inchangé si l'alignement
+        le ferait sortir des durées autorisées ou chevaucher le précédent)
+    """
+    marks = np.asarray(sorted(boundaries), dtype=np.float64)
+    snapped = []
+    previous_end = 0.0
+
+    for start, end in segments:
+        new_start = _nearest_mark(marks, start, tolerance)
+        new_end = min(_nearest_mark(marks, end, tolerance), video_duration)
+
+        if new_start < previous_end or not limits[0] <= new_end - new_start <= limits[1]:
+            new_start, new_end = start, end
+
+        snapped.append((float(new_start), float(new_end)))
+        previous_end = new_end
+
+    return snapped
+
+def snap_to_keyframes(segments, keyframes, video_duration, tolerance=KEYFRAME_TOLERANCE):
+    """
+    Aligne les limites des segments sur les images clés de la vidéo source, pour
+    que la copie sans réencodage commence exactement au début du segment (sans
+    images figées ni décalage audio/vidéo).
+
+    Le début d'un segment est placé sur l'image clé la plus proche si elle est
+    à moins de tolerance secondes, sinon sur l'image clé précédente (une copie
+    ne peut commencer que sur une image clé). La fin est placée sur l'image clé
+    la plus proche à moins de tolerance secondes, sinon laissée telle quelle.
+
+    Args:
+        segments: Segments triés par début (tuples de début et fin en secondes)
+        keyframes: Instants des images clés en secondes
+        video_duration: Durée de la vidéo en secondes
+        tolerance: Écart maximal en secondes pour un alignement sur l'image clé la plus proche
+
+    Returns:
+        Liste des segments alignés, sans chevauchement
+    """
+    if not keyframes:
+        return list(segments)
+
+    marks = np.asarray(sorted(keyframes), dtype=np.float64)
+    snapped = []
+    previous_end = 0.0
+
+    for start, end in segments:
+        new_start = _nearest_mark(marks, start, tolerance)
+        if new_start == start:
+            new_start = _previous_mark(marks, start)
+
+        # Le segment ne doit pas recouvrir le précédent: première image clé après sa fin
+        if new_start < previous_end:
+            following = marks[marks >= previous_end]
+            new_start = float(following[0]) if len(following) else start
+
+        new_end = min(_nearest_mark(marks, end, tolerance), video_duration)
+        if new_end <= new_start:
+            new_end = end
+
+        snapped.append((float(new_start), float(new_end)))
+        previous_end = new_end
+
+    return snapped
+
+def scores_from_heatmap(heatmap, video_duration):
+    """
+    Convertit la courbe "moments les plus revus" de YouTube en scores par seconde.
+
+    Args:
+        heatmap: Liste de dictionnaires (start_time, end_time, value) fournie par yt-dlp
+        video_duration: Durée de la vidéo en secondes
+
+    Returns:
+        Liste des scores par seconde, ou None si la courbe est absente
+    """
+    if not heatmap:
+        return None
+
+    scores = [0.0] * int(video_duration)
+    for marker in heatmap:
+        start = max(int(marker.get('start_time', 0)), 0)
+        end = min(int(marker.get('end_time', 0)) + 1, len(scores))
+        for second in range(start, end):
+            scores[second] = max(scores[second], float(marker.get('value', 0)))
+    return scores
+
+def _best_window(scores, length, used):
+    """
+    Recherche la fenêtre de longueur donnée dont la somme des scores est maximale.
+    Les sommes de toutes les fenêtres sont calculées en une fois par sommes cumulées.
+
+    Args:
+        scores: Scores par seconde (liste ou tableau NumPy)
+        length: Longueur de la fenêtre en secondes
+        used: Tableau booléen des secondes déjà utilisées par d'autres segments, ou None
+
+    Returns:
+        Début de la meilleure fenêtre en secondes, ou None si aucune fenêtre n'est libre
+    """
+    if length <= 0 or length > len(scores):
+        return None
+
+    totals = _window_sums(np.asarray(scores, dtype=np.float64), length)
+    if used is not None:
+        free = _window_sums(used.astype(np.int64), length) == 0
+        if not free.any():
+            return None
+        totals = np.where(free, totals, -np.inf)
+
+    return int(np.argmax(totals))
+
+def _window_sums(values, length):
+    """
+    Calcule la somme de chaque fenêtre glissante de longueur donnée.
+    """
+    cumulative = np.concatenate(([0], np.cumsum(values)))
+    return cumulative[length:] - cumulative[:-length]
+
+def _nearest_mark(marks, time, tolerance):
+    """
+    Retourne la marque (coupure de plan, image clé) la plus proche d'un instant
+    si elle est à moins de tolerance secondes, l'instant lui-même sinon.
+    """
+    index = np.searchsorted(marks, time)
+    candidates = marks[max(index - 1, 0):index + 1]
+    if len(candidates) == 0:
+        return time
+
+    nearest = candidates[np.argmin(np.abs(candidates - time))]
+    return float(nearest) if abs(nearest - time) <= tolerance else time
+
+def _previous_mark(marks, time):
+    """
+    Retourne la dernière marque située à l'instant donné ou avant (0 s'il n'y en a pas).
+    """
+    index = np.searchsorted(marks, time, side='right')
+    return float(marks[index - 1]) if index > 0 else 0.0
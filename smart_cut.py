@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Découpe précise à l'image près sans réencodage complet ("smart cut").
+Pour chaque segment, seuls les morceaux de GOP situés avant la première image
+clé et après la dernière image clé du segment sont réencodés; la partie
+centrale, alignée sur les images clés, est copiée sans réencodage.
+
+Les morceaux sont produits en Matroska puis assemblés par simple copie; les
+extrémités sont réencodées avec les paramètres de la source (codec, profil,
+format de pixels, fréquence d'images, audio) pour rester compatibles.
+Le fichier MP4 final ne contient qu'un jeu de paramètres du codec (SPS/PPS)
+alors que l'encodeur choisit les siens (niveau, images de référence...):
+chaque morceau porte donc ses paramètres dans le flux, devant chaque image
+clé, et le décodeur change de paramètres à chaque raccord au lieu
+d'appliquer ceux du premier morceau à tout le clip.
+"""
+
+import os
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from api.utils.media_probe import probe
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Encodeurs utilisés pour réencoder les extrémités, selon le codec de la source
+ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265'
+}
+
+# Paramètres de réencodage des extrémités (qualité visuellement identique à la source)
+ENCODE_PRESET = 'veryfast'
+ENCODE_CRF = 18
+AUDIO_BITRATE = '192k'
+
+# Options des encodeurs répétant les paramètres du codec devant chaque image clé
+REPEAT_HEADERS = {
+    'libx264': ['-x264-params', 'repeat-headers=1'],
+    'libx265': ['-x265-params', 'repeat-headers=1']
+}
+
+# Filtres de copie insérant les paramètres du codec de la source devant chaque image clé
+IN_BAND_FILTERS = {
+    'h264': 'h264_mp4toannexb',
+    'hevc': 'hevc_mp4toannexb'
+}
+
+# Durée en dessous de laquelle un morceau est ignoré (secondes)
+MIN_PART_DURATION = 0.001
+
+def split_segment(start, end, keyframes):
+    """
+    Découpe un segment en morceaux à réencoder et à copier.
+
+    Args:
+        start: Début du segment en secondes
+        end: Fin du segment en secondes
+        keyframes: Instants triés des images clés de la source
+
+    Returns:
+        Liste de tuples (mode, début, fin) où mode vaut 'encode' ou 'copy'
+    """
+    marks = np.asarray(keyframes, dtype=np.float64)
+    inside = marks[(marks >= start - MIN_PART_DURATION) & (marks <= end + MIN_PART_DURATION)]
+
+    # Aucun GOP complet dans le segment: réencodage intégral
+    if len(inside) < 2:
+        return [('encode', start, end)]
+
+    first, last = float(inside[0]), float(inside[-1])
+    parts = []
+    if first - start > MIN_PART_DURATION:
+        parts.append(('encode', start, first))
+    parts.append(('copy', max(first, start), last))
+    if end - last > MIN_PART_DURATION:
+        parts.append(('encode', last, end))
+    return parts
+
+def render_smart_cut(pieces, output_file, work_dir, max_workers=None):
+    """
+    Assemble des segments coupés à l'image près en ne réencodant que leurs extrémités.
+
+    Args:
+        pieces: Liste des segments (tuples de fichier source, début et fin en
+            secondes; une fin à None désigne la fin du fichier)
+        output_file: Chemin du fichier de sortie
+        work_dir: Répertoire des fichiers intermédiaires
+        max_workers: Nombre de morceaux produits simultanément (nombre de cœurs par défaut)
+
+    Raises:
+        ValueError: Si un morceau ne peut pas être produit ou assemblé
+    """
+    jobs = []
+    for video_path, start, end in pieces:
+        info = probe(video_path, keyframes=True)
+        encoder = ENCODERS.get((info['video'] or {}).get('codec'))
+
+        if end is None:
+            # Jusqu'à la fin du fichier: rien à couper après la dernière image clé, la copie va jusqu'au bout
+            parts = split_segment(start, info['duration'], info['keyframes'])
+            if parts[-1][0] == 'encode' and len(parts) > 1:
+                parts.pop()
+            parts[-1] = (parts[-1][0], parts[-1][1], None)
+        else:
+            parts = split_segment(start, end, info['keyframes'])
+
+        # Codec sans encodeur compatible: réencodage intégral du segment
+        if encoder is None:
+            parts = [('encode', start, end)]
+
+        for mode, part_start, part_end in parts:
+            path = os.path.join(work_dir, f"part_{len(jobs):03d}.mkv")
+            jobs.append((mode, video_path, part_start, part_end, path, info, encoder or 'libx264'))
+
+    encoded = sum(1 for job in jobs if job[0] == 'encode')
+    logger.info(f"Smart cut: {len(jobs)} morceaux, dont {encoded} réencodés")
+
+    workers = max_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=min(workers, max(len(jobs), 1))) as pool:
+        # list() propage la première erreur rencontrée
+        list(pool.map(lambda job: _render_part(*job), jobs))
+
+    try:
+        _join_parts([(job[4], job[2], job[3]) for job in jobs], output_file, work_dir)
+    finally:
+        for job in jobs:
+            if os.path.exists(job[4]):
+                os.remove(job[4])
+
+def _render_part(mode, video_path, start, end, output_path, info, encoder):
+    """
+    Produit un morceau Matroska par copie ou par réencodage, les paramètres
+    du codec étant répétés dans le flux devant chaque image clé.
+    """
+    cmd = ['ffmpeg', '-y', '-v', 'error', '-ss', f"{start:.6f}", '-i', video_path]
+    if end is not None:
+        cmd += ['-t', f"{end - start:.6f}"]
+    cmd += ['-map', '0:v:0?', '-map', '0:a:0?']
+
+    if mode == 'copy':
+        cmd += ['-c', 'copy']
+        bitstream_filter = IN_BAND_FILTERS.get((info['video'] or {}).get('codec'))
+        if bitstream_filter:
+            cmd += ['-bsf:v', bitstream_filter]
+    else:
+        cmd += _encode_options(info, encoder)
+
+    cmd += ['-avoid_negative_ts', 'make_zero', '-f', 'matroska', output_path]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de la découpe {start:.3f}-{end if end is not None else 'fin'}: "
+                         f"{e.stderr.decode('utf-8', 'replace')}")
+
+def _encode_options(info, encoder):
+    """
+    Construit les options de réencodage reprenant les paramètres de la source
+    (résolution, format de pixels, profil, fréquence d'images et paramètres audio).
+    """
+    video = info['video'] or {}
+    audio = info['audio'] or {}
+
+    options = ['-c:v', encoder, '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF)] + REPEAT_HEADERS.get(encoder, [])
+    if video.get('pix_fmt'):
+        options += ['-pix_fmt', video['pix_fmt']]
+    if video.get('profile') and encoder == 'libx264':
+        profile = str(video['profile']).lower().replace(' ', '')
+        if profile in ('baseline', 'main', 'high', 'high10', 'high422', 'high444'):
+            options += ['-profile:v', profile]
+    if video.get('fps'):
+        options += ['-r', f"{video['fps']:.6f}"]
+
+    options += ['-c:a', 'aac', '-b:a', AUDIO_BITRATE]
+    if audio.get('sample_rate'):
+        options += ['-ar', str(audio['sample_rate'])]
+    if audio.get('channels'):
+        options += ['-ac', str(audio['channels'])]
+    return options
+
+def _join_parts(parts, output_file, work_dir):
+    """
+    Assemble les morceaux par copie (démultiplexeur concat).
+    La durée de chaque morceau est imposée: l'audio réencodé dépasse toujours
+    un peu (trames AAC entières), ce qui décalerait sinon les morceaux suivants.
+    """
+    list_file = os.path.join(work_dir, "parts.txt")
+    with open(list_file, 'w') as f:
+        for path, start, end in parts:
+            f.write(f"file '{path}'\n")
+            if end is not None:
+                f.write(f"duration {end - start:.6f}\n")
+
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-v', 'error',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_file,
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        '-movflags', '+faststart',
+        output_file
+    ]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de l'assemblage des morceaux: {e.stderr.decode('utf-8', 'replace')}")
+    finally:
+        os.remove(list_file)
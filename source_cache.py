@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache disque des vidéos sources partagé entre les générations de clips.
+Chaque vidéo téléchargée est conservée dans un répertoire identifié par
+l'identifiant YouTube et le format demandé, puis réutilisée par les
+générations suivantes. Le cache est borné en taille (éviction LRU) et une
+entrée utilisée par une génération en cours n'est jamais supprimée.
+
+L'utilisation d'une entrée est signalée par un verrou partagé (flock) sur
+son fichier .lock, ce qui protège aussi les entrées utilisées par les autres
+processus (workers gunicorn) partageant le même répertoire.
+"""
+
+import os
+import re
+import uuid
+import fcntl
+import shutil
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+
+from config import Config
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Nom du fichier de verrou présent dans chaque entrée du cache
+LOCK_FILE = '.lock'
+
+class SourceCache:
+    """
+    Cache LRU des vidéos sources, borné en taille et avec comptage des références.
+    """
+
+    def __init__(self, root, max_bytes):
+        """
+        Initialise le cache.
+
+        Args:
+            root: Répertoire du cache
+            max_bytes: Taille maximale du cache en octets
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._handles = {}
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def open(self, video_id, fmt, fetch):
+        """
+        Fournit le chemin d'une vidéo source pendant la durée du bloc.
+
+        Args:
+            video_id: Identifiant de la vidéo YouTube
+            fmt: Format demandé au téléchargeur
+            fetch: Fonction appelée avec un répertoire de destination en cas
+                d'absence dans le cache, et retournant le chemin du fichier téléchargé
+
+        Yields:
+            Chemin de la vidéo dans le cache
+        """
+        path = self.acquire(video_id, fmt, fetch)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def acquire(self, video_id, fmt, fetch):
+        """
+        Réserve une vidéo source, en la téléchargeant si elle n'est pas en cache.
+        Chaque appel doit être suivi d'un appel à release().
+
+        Returns:
+            Chemin de la vidéo dans le cache
+        """
+        key = self._key(video_id, fmt)
+
+        while True:
+            with self._lock:
+                loading = self._loading.get(key)
+
+            if loading is None:
+                # Verrou de fichier pris hors du verrou du processus (voir _pin)
+                path = self._pin(key)
+                with self._lock:
+                    if path:
+                        self.hits += 1
+                        return path
+
+                    loading = self._loading.get(key)
+                    if loading is None:
+                        # Un seul téléchargement par entrée dans le processus
+                        self.misses += 1
+                        loading = threading.Event()
+                        self._loading[key] = loading
+                        break
+
+            # Un autre thread télécharge déjà cette vidéo
+            loading.wait()
+
+        try:
+            self._fetch(key, fetch)
+            path = self._pin(key)
+            if not path:
+                raise ValueError("Vidéo source absente du cache après téléchargement")
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+        self.evict()
+        return path
+
+    def release(self, path):
+        """
+        Libère une vidéo réservée par acquire().
+
+        Args:
+            path: Chemin retourné par acquire()
+        """
+        entry_dir = os.path.dirname(path)
+
+        with self._lock:
+            handles = self._handles.get(entry_dir)
+            if not handles:
+                return
+
+            handle = handles.pop()
+            if not handles:
+                del self._handles[entry_dir]
+
+        # La fermeture du descripteur libère le verrou partagé
+        handle.close()
+        self.evict()
+
+    def evict(self):
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à repasser
+        sous la taille maximale. Les entrées en cours d'utilisation sont conservées.
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+
+        for entry_dir, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+
+            if self._remove_if_unused(entry_dir):
+                total -= size
+                evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+        return evicted
+
+    def stats(self):
+        """
+        Récupère les statistiques du cache.
+
+        Returns:
+            Dictionnaire contenant les compteurs et l'occupation du cache
+        """
+        entries = self._entries()
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(entries),
+                'in_use': sum(len(handles) for handles in self._handles.values()),
+                'size': sum(size for _, size, _ in entries),
+                'max_size': self.max_bytes
+            }
+
+    def _key(self, video_id, fmt):
+        """
+        Construit le nom du répertoire d'une entrée à partir de l'identifiant et du format.
+        """
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', video_id)
+        format_hash = hashlib.sha1(fmt.encode('utf-8')).hexdigest()[:12]
+        return f"{safe_id}-{format_hash}"
+
+    def _pin(self, key):
+        """
+        Pose un verrou partagé sur une entrée existante. Appelé sans le verrou du
+        processus: l'attente d'une suppression en cours dans un autre processus ne
+        bloque pas les autres opérations du cache.
+
+        Returns:
+            Chemin de la vidéo ou None si l'entrée n'existe pas
+        """
+        entry_dir = os.path.join(self.root, key)
+        try:
+            handle = open(os.path.join(entry_dir, LOCK_FILE), 'a')
+        except FileNotFoundError:
+            return None
+
+        # Bloquant: attend la fin d'une éventuelle suppression en cours
+        fcntl.flock(handle, fcntl.LOCK_SH)
+
+        video_path = self._video_file(entry_dir)
+        if video_path is None:
+            handle.close()
+            return None
+
+        # Mise à jour de la date d'utilisation pour l'ordre LRU
+        os.utime(entry_dir)
+        with self._lock:
+            self._handles.setdefault(entry_dir, []).append(handle)
+        return video_path
+
+    def _fetch(self, key, fetch):
+        """
+        Télécharge une entrée dans un répertoire temporaire puis la publie par renommage.
+        """
+        entry_dir = os.path.join(self.root, key)
+        staging_dir = os.path.join(self.root, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+
+        try:
+            fetch(staging_dir)
+            open(os.path.join(staging_dir, LOCK_FILE), 'a').close()
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # Entrée publiée entre-temps par un autre processus
+            if not os.path.isdir(entry_dir):
+                raise
+            logger.info(f"Entrée déjà présente dans le cache: {key}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _entries(self):
+        """
+        Liste les entrées du cache.
+
+        Returns:
+            Liste de tuples (répertoire, taille en octets, date de dernière utilisation)
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                entries.append((entry_dir, size, os.stat(entry_dir).st_mtime))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def _remove_if_unused(self, entry_dir):
+        """
+        Supprime une entrée si aucun processus ne l'utilise.
+
+        Returns:
+            True si l'entrée a été supprimée
+        """
+        try:
+            handle = open(os.path.join(entry_dir, LOCK_FILE), 'a')
+        except FileNotFoundError:
+            return False
+
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+
+        try:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            logger.info(f"Vidéo source supprimée du cache: {os.path.basename(entry_dir)}")
+            return True
+        finally:
+            handle.close()
+
+    def _video_file(self, entry_dir):
+        """
+        Recherche le fichier vidéo d'une entrée.
+        """
+        try:
+            names = os.listdir(entry_dir)
+        except FileNotFoundError:
+            return None
+
+        for name in names:
+            if name.startswith('video.'):
+                return os.path.join(entry_dir, name)
+        return None
+
+# Cache partagé par le processus, créé à la première utilisation
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_source_cache():
+    """
+    Récupère le cache des vidéos sources configuré par SOURCE_CACHE_DIR et SOURCE_CACHE_MAX_BYTES.
+
+    Returns:
+        Instance de SourceCache
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = SourceCache(Config.SOURCE_CACHE_DIR, Config.SOURCE_CACHE_MAX_BYTES)
+        return _cache
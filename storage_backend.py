@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Moteurs de stockage des clips.
+
+Deux moteurs exposent le même contrat (save, open, stat, delete, url):
+- LocalBackend conserve les clips sur le disque de la machine (voir
+  local_storage); les clips sont envoyés par l'application ou par Nginx.
+- S3Backend les envoie dans un bucket compatible S3 (AWS, MinIO...), ce qui
+  permet de séparer les machines de rendu des serveurs web. L'envoi est
+  découpé en parties transférées en parallèle et lues au fur et à mesure dans
+  le fichier rendu (jamais chargé entièrement en mémoire), et les clips sont
+  téléchargés directement depuis le bucket par des URL signées.
+
+Les deux moteurs reportent les clips sauvegardés et supprimés dans l'index du
+stockage (voir storage_index), qui fournit la liste des clips et les totaux
+sans parcourir le disque ni le bucket.
+
+Le moteur est choisi par STORAGE_BACKEND ('local' ou 's3').
+"""
+
+import os
+import threading
+import logging
+
+from config import Config
+from storage import local_storage
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:
+    boto3 = None
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Type MIME des clips
+CLIP_CONTENT_TYPE = 'video/mp4'
+
+class LocalBackend:
+    """
+    Moteur stockant les clips sur le disque local.
+    """
+
+    name = 'local'
+
+    def save(self, source_path, clip_id, keep_source=False, owner=None):
+        """
+        Enregistre un clip (voir local_storage.save_clip).
+
+        Args:
+            source_path: Chemin du fichier rendu
+            clip_id: Identifiant unique du clip
+            keep_source: Booléen indiquant si le fichier rendu doit être conservé
+            owner: Identifiant du propriétaire du clip, ou None
+
+        Returns:
+            Emplacement du clip (chemin du fichier)
+        """
+        return local_storage.save_clip(source_path, clip_id, keep_source, owner)
+
+    def open(self, clip_id):
+        """
+        Ouvre un clip en lecture.
+
+        Returns:
+            Fichier binaire ouvert
+
+        Raises:
+            ValueError: Si le clip n'existe pas
+        """
+        file_path = local_storage.get_clip_path(clip_id)
+        if file_path is None:
+            raise ValueError(f"Clip non trouvé: {clip_id}")
+        return open(file_path, 'rb')
+
+    def stat(self, clip_id):
+        """
+        Récupère la taille et la date de modification d'un clip.
+
+        Returns:
+            Dictionnaire contenant 'size', 'modified' (timestamp) et 'etag',
+            ou None si le clip n'existe pas
+        """
+        file_path = local_storage.get_clip_path(clip_id)
+        if file_path is None:
+            return None
+        stat = os.stat(file_path)
+        return {'size': stat.st_size, 'modified': stat.st_mtime, 'etag': f"{stat.st_mtime_ns:x}-{stat.st_size:x}"}
+
+    def delete(self, clip_id):
+        """
+        Supprime un clip.
+
+        Returns:
+            True si la suppression a réussi, False sinon
+        """
+        return local_storage.delete_clip(clip_id)
+
+    def url(self, clip_id, download_name=None, as_attachment=False):
+        """
+        URL de téléchargement directe: aucune, le clip est envoyé par l'application.
+        """
+        return None
+
+    def local_path(self, clip_id):
+        """
+        Récupère le fichier d'un clip sur le disque.
+
+        Returns:
+            Tuple (chemin du fichier, chemin relatif au répertoire de stockage),
+            ou None si le clip n'existe pas
+        """
+        file_path = local_storage.get_clip_path(clip_id)
+        if file_path is None:
+            return None
+        return file_path, os.path.relpath(file_path, local_storage.STORAGE_DIR)
+
+class S3Backend:
+    """
+    Moteur stockant les clips dans un bucket compatible S3.
+    """
+
+    name = 's3'
+
+    def __init__(self, bucket, prefix='', client=None, chunk_size=8 * 1024 ** 2, max_concurrency=8,
+                 url_expiration=3600):
+        """
+        Initialise le moteur.
+
+        Args:
+            bucket: Nom du bucket
+            prefix: Préfixe des clés des clips
+            client: Client boto3 S3 (créé à partir de la configuration si None)
+            chunk_size: Taille des parties de l'envoi en octets (5 Mo minimum)
+            max_concurrency: Nombre de parties envoyées en parallèle
+            url_expiration: Durée de validité des URL signées en secondes
+        """
+        if boto3 is None:
+            raise ValueError("Le stockage S3 nécessite boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or boto3.client('s3', endpoint_url=Config.S3_ENDPOINT_URL or None,
+                                             region_name=Config.S3_REGION or None)
+        self.url_expiration = url_expiration
+        self.transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                              max_concurrency=max_concurrency, use_threads=True)
+
+    def save(self, source_path, clip_id, keep_source=False, owner=None):
+        """
+        Envoie un clip dans le bucket (par parties parallèles au-delà de chunk_size).
+
+        Args:
+            source_path: Chemin du fichier rendu
+            clip_id: Identifiant unique du clip
+            keep_source: Booléen indiquant si le fichier rendu doit être conservé
+            owner: Identifiant du propriétaire du clip, ou None
+
+        Returns:
+            Emplacement du clip (URI s3://)
+
+        Raises:
+            ValueError: Si l'envoi échoue
+        """
+        key = self._key(clip_id)
+        extra_args = {'ContentType': CLIP_CONTENT_TYPE}
+        if owner:
+            extra_args['Metadata'] = {'owner': owner}
+
+        try:
+            size = os.path.getsize(source_path)
+            # Lecture du fichier par parties: seules max_concurrency parties sont en mémoire
+            self.client.upload_file(source_path, self.bucket, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        except (ClientError, BotoCoreError, OSError) as e:
+            raise ValueError(f"Erreur lors de l'envoi du clip vers S3: {str(e)}")
+
+        local_storage._index_call('add', clip_id, local_storage.clip_filename(), size, owner)
+
+        if not keep_source:
+            os.remove(source_path)
+
+        logger.info(f"Clip envoyé vers S3: s3://{self.bucket}/{key}")
+        return f"s3://{self.bucket}/{key}"
+
+    def open(self, clip_id):
+        """
+        Ouvre un clip en lecture (flux lu au fur et à mesure depuis le bucket).
+
+        Returns:
+            Objet fichier binaire (read, close)
+
+        Raises:
+            ValueError: Si le clip n'existe pas
+        """
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(clip_id))['Body']
+        except (ClientError, BotoCoreError) as e:
+            raise ValueError(f"Clip non trouvé: {clip_id} ({str(e)})")
+
+    def stat(self, clip_id):
+        """
+        Récupère la taille et la date de modification d'un clip.
+
+        Returns:
+            Dictionnaire contenant 'size', 'modified' (timestamp) et 'etag',
+            ou None si le clip n'existe pas ou si le bucket est injoignable
+        """
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(clip_id))
+        except ClientError:
+            return None
+        except BotoCoreError as e:
+            logger.error(f"Erreur lors de la lecture du clip dans S3: {str(e)}")
+            return None
+        return {'size': head['ContentLength'], 'modified': head['LastModified'].timestamp(),
+                'etag': head['ETag'].strip('"')}
+
+    def delete(self, clip_id):
+        """
+        Supprime un clip.
+
+        Returns:
+            True si la suppression a réussi, False sinon (clip absent, bucket
+            injoignable: l'erreur est journalisée sans interrompre l'appelant)
+        """
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(clip_id))
+        except ClientError:
+            # Clip absent du bucket: seule l'entrée de l'index est retirée
+            local_storage._index_call('remove', clip_id)
+            return False
+        except BotoCoreError as e:
+            logger.error(f"Erreur lors de la suppression du clip: {str(e)}")
+            return False
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=self._key(clip_id))
+            local_storage._index_call('remove', clip_id)
+            return True
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Erreur lors de la suppression du clip: {str(e)}")
+            return False
+
+    def url(self, clip_id, download_name=None, as_attachment=False):
+        """
+        Génère une URL signée de téléchargement direct depuis le bucket.
+
+        Args:
+            clip_id: Identifiant unique du clip
+            download_name: Nom du fichier proposé au navigateur, ou None
+            as_attachment: Booléen indiquant si le clip est téléchargé en pièce jointe
+
+        Returns:
+            URL signée, valable url_expiration secondes
+        """
+        params = {'Bucket': self.bucket, 'Key': self._key(clip_id), 'ResponseContentType': CLIP_CONTENT_TYPE}
+        if download_name:
+            disposition = 'attachment' if as_attachment else 'inline'
+            params['ResponseContentDisposition'] = f'{disposition}; filename="{download_name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.url_expiration)
+
+    def local_path(self, clip_id):
+        """
+        Fichier local d'un clip: aucun, les clips sont dans le bucket.
+        """
+        return None
+
+    def _key(self, clip_id):
+        """
+        Construit la clé d'un clip dans le bucket.
+        """
+        return f"{self.prefix}{clip_id}/{local_storage.clip_filename()}"
+
+# Moteur partagé par le processus, créé à la première utilisation
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_storage_backend():
+    """
+    Récupère le moteur de stockage configuré par STORAGE_BACKEND ('local' ou 's3').
+
+    Returns:
+        Instance du moteur
+    """
+    global _backend
+
+    with _backend_lock:
+        if _backend is None:
+            if Config.STORAGE_BACKEND == 's3':
+                _backend = S3Backend(Config.S3_BUCKET, Config.S3_PREFIX,
+                                     chunk_size=Config.S3_MULTIPART_CHUNK_SIZE,
+                                     max_concurrency=Config.S3_MAX_CONCURRENCY,
+                                     url_expiration=Config.S3_URL_EXPIRATION)
+            else:
+                _backend = LocalBackend()
+            logger.info(f"Moteur de stockage des clips: {_backend.name}")
+        return _backend
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index persistant du stockage des clips.
+Chaque clip stocké y est enregistré avec son fichier, sa taille, son
+propriétaire et ses dates, et les totaux (nombre de clips, taille) sont tenus
+à jour par des déclencheurs SQLite dans la même transaction que la ligne du
+clip: les statistiques du stockage ne nécessitent plus de parcourir le disque.
+
+L'index peut être reconstruit à partir du disque (rebuild), par exemple après
+une modification manuelle du répertoire de stockage.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+from config import Config
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Schéma de l'index: une ligne par clip, une ligne de totaux maintenue par les déclencheurs
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS stored_clips ('
+    'clip_id TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, owner TEXT, '
+    'created_at REAL NOT NULL, updated_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS stored_clips_owner ON stored_clips (owner)',
+    'CREATE TABLE IF NOT EXISTS storage_totals ('
+    'id INTEGER PRIMARY KEY CHECK (id = 1), clips_count INTEGER NOT NULL, total_size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO storage_totals (id, clips_count, total_size) VALUES (1, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS stored_clips_insert AFTER INSERT ON stored_clips BEGIN '
+    'UPDATE storage_totals SET clips_count = clips_count + 1, total_size = total_size + NEW.size WHERE id = 1; END',
+    'CREATE TRIGGER IF NOT EXISTS stored_clips_update AFTER UPDATE OF size ON stored_clips BEGIN '
+    'UPDATE storage_totals SET total_size = total_size - OLD.size + NEW.size WHERE id = 1; END',
+    'CREATE TRIGGER IF NOT EXISTS stored_clips_delete AFTER DELETE ON stored_clips BEGIN '
+    'UPDATE storage_totals SET clips_count = clips_count - 1, total_size = total_size - OLD.size WHERE id = 1; END'
+)
+
+class StorageIndex:
+    """
+    Index SQLite des clips stockés, avec totaux maintenus de manière incrémentale.
+    """
+
+    def __init__(self, db_path):
+        """
+        Initialise l'index.
+
+        Args:
+            db_path: Chemin de la base SQLite
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def add(self, clip_id, filename, size, owner=None):
+        """
+        Enregistre un clip stocké (ou met à jour son fichier et sa taille).
+
+        Args:
+            clip_id: Identifiant unique du clip
+            filename: Nom du fichier du clip
+            size: Taille du fichier en octets
+            owner: Identifiant du propriétaire du clip, ou None
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO stored_clips (clip_id, filename, size, owner, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (clip_id) DO UPDATE SET '
+                'filename = excluded.filename, size = excluded.size, '
+                'owner = COALESCE(excluded.owner, stored_clips.owner), updated_at = excluded.updated_at',
+                (clip_id, filename, size, owner, now, now)
+            )
+
+    def remove(self, clip_id):
+        """
+        Supprime un clip de l'index.
+
+        Returns:
+            True si le clip était enregistré
+        """
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM stored_clips WHERE clip_id = ?', (clip_id,)).rowcount > 0
+
+    def get(self, clip_id):
+        """
+        Récupère l'entrée d'un clip.
+
+        Returns:
+            Dictionnaire contenant les informations du clip, ou None s'il n'est pas enregistré
+        """
+        row = self._connection().execute(
+            'SELECT clip_id, filename, size, owner, created_at, updated_at FROM stored_clips WHERE clip_id = ?',
+            (clip_id,)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def list_ids(self, owner=None, limit=None, offset=0):
+        """
+        Liste les identifiants des clips enregistrés, du plus récent au plus ancien.
+
+        Args:
+            owner: Identifiant du propriétaire, ou None pour tous les clips
+            limit: Nombre maximum d'identifiants, ou None
+            offset: Nombre d'identifiants ignorés
+
+        Returns:
+            Liste des identifiants
+        """
+        query = 'SELECT clip_id FROM stored_clips'
+        params = []
+        if owner is not None:
+            query += ' WHERE owner = ?'
+            params.append(owner)
+        query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
+        params += [limit if limit is not None else -1, offset]
+        return [row[0] for row in self._connection().execute(query, params)]
+
+    def totals(self):
+        """
+        Récupère les totaux du stockage.
+
+        Returns:
+            Dictionnaire contenant le nombre de clips ('clips_count') et la
+            taille totale en octets ('total_size')
+        """
+        clips_count, total_size = self._connection().execute(
+            'SELECT clips_count, total_size FROM storage_totals WHERE id = 1'
+        ).fetchone()
+        return {'clips_count': clips_count, 'total_size': total_size}
+
+    def rebuild(self, entries):
+        """
+        Remplace le contenu de l'index par les clips présents sur le disque.
+        Les propriétaires et dates de création déjà connus sont conservés.
+
+        Args:
+            entries: Itérable de tuples (identifiant, nom du fichier, taille, date de modification)
+
+        Returns:
+            Dictionnaire contenant le nombre de clips ajoutés ('added'),
+            supprimés ('removed') et mis à jour ('updated') dans l'index
+        """
+        now = time.time()
+        with self._connection() as conn:
+            known = {row[0]: row[1:] for row in conn.execute('SELECT clip_id, filename, size FROM stored_clips')}
+            found = set()
+            added = updated = 0
+
+            for clip_id, filename, size, modified_at in entries:
+                # Clip présent dans deux emplacements (migration en cours): un seul enregistrement
+                if clip_id in found:
+                    continue
+                found.add(clip_id)
+                if clip_id not in known:
+                    added += 1
+                    conn.execute(
+                        'INSERT INTO stored_clips (clip_id, filename, size, owner, created_at, updated_at) '
+                        'VALUES (?, ?, ?, NULL, ?, ?)',
+                        (clip_id, filename, size, modified_at, now)
+                    )
+                elif known[clip_id] != (filename, size):
+                    updated += 1
+                    conn.execute(
+                        'UPDATE stored_clips SET filename = ?, size = ?, updated_at = ? WHERE clip_id = ?',
+                        (filename, size, now, clip_id)
+                    )
+
+            removed = [clip_id for clip_id in known if clip_id not in found]
+            conn.executemany('DELETE FROM stored_clips WHERE clip_id = ?', [(clip_id,) for clip_id in removed])
+
+            # Totaux recalculés: corrige une éventuelle dérive des compteurs
+            conn.execute(
+                'UPDATE storage_totals SET clips_count = (SELECT COUNT(*) FROM stored_clips), '
+                'total_size = (SELECT COALESCE(SUM(size), 0) FROM stored_clips) WHERE id = 1'
+            )
+
+        logger.info(f"Index du stockage reconstruit: {added} ajoutés, {len(removed)} supprimés, {updated} mis à jour")
+        return {'added': added, 'removed': len(removed), 'updated': updated}
+
+    def _entry(self, row):
+        """
+        Convertit une ligne de l'index en dictionnaire.
+        """
+        clip_id, filename, size, owner, created_at, updated_at = row
+        return {
+            'clip_id': clip_id,
+            'filename': filename,
+            'size': size,
+            'owner': owner,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+
+    def _connection(self):
+        """
+        Récupère la connexion SQLite du thread courant.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+# Index partagé par le processus, créé à la première utilisation
+_index = None
+_index_lock = threading.Lock()
+
+def get_storage_index():
+    """
+    Récupère l'index du stockage configuré par STORAGE_INDEX_PATH.
+
+    Returns:
+        Instance de StorageIndex
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = StorageIndex(Config.STORAGE_INDEX_PATH)
+        return _index
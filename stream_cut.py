@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Découpe d'un clip au fil du téléchargement, sans fichier source intermédiaire.
+La sortie du téléchargeur est reliée directement à l'entrée standard de
+FFmpeg: la découpe commence pendant que les octets arrivent, et FFmpeg
+cesse de lire dès que la fin du dernier segment est passée (le
+téléchargement est alors interrompu). Seul le clip est écrit sur le disque.
+
+Les segments doivent être connus avant le téléchargement (index des scores ou
+courbe de popularité YouTube). Ils sont découpés dans le graphe de filtres
+(un flux lu séquentiellement ne permet pas de se positionner) puis assemblés
+par le compilateur de rendu, transitions et traitements du plan compris.
+"""
+
+import subprocess
+import tempfile
+import logging
+
+from api.utils.smart_cut import ENCODE_PRESET, ENCODE_CRF, AUDIO_BITRATE
+from api.utils.render_graph import compile_filtergraph
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def compile_stream_filters(segments, with_audio=True):
+    """
+    Découpe les segments dans le flux de l'entrée unique.
+
+    Args:
+        segments: Liste des segments (tuples de début et fin en secondes, triés)
+        with_audio: Booléen indiquant si le flux a une piste audio
+
+    Returns:
+        Tuple (filtres de découpe, étiquettes (vidéo, audio ou None) de chaque segment)
+    """
+    count = len(segments)
+    filters = [f"[0:v]split={count}" + ''.join(f"[sv{index}]" for index in range(count))]
+    if with_audio:
+        filters.append(f"[0:a]asplit={count}" + ''.join(f"[sa{index}]" for index in range(count)))
+    inputs = []
+    for index, (start, end) in enumerate(segments):
+        filters.append(f"[sv{index}]trim=start={start:.6f}:end={end:.6f},setpts=PTS-STARTPTS[tv{index}]")
+        if with_audio:
+            filters.append(f"[sa{index}]atrim=start={start:.6f}:end={end:.6f},asetpts=PTS-STARTPTS[ta{index}]")
+        inputs.append((f"tv{index}", f"ta{index}" if with_audio else None))
+    return filters, inputs
+
+def stream_clip(stream, segments, output_file, fps=None, transition=0.0, max_height=None, watermark=None,
+                with_audio=True):
+    """
+    Génère un clip à partir d'un flux vidéo lu au fil de l'eau.
+
+    Args:
+        stream: Processus du téléchargeur, dont la sortie standard fournit la vidéo
+        segments: Liste des segments (tuples de début et fin en secondes)
+        output_file: Chemin du fichier de sortie
+        fps: Fréquence d'images de la vidéo (format choisi), ou None si elle
+            n'est pas connue (le flux ne peut pas être analysé à l'avance)
+        transition: Durée des fondus en secondes (0 pour une simple mise bout à bout)
+        max_height: Hauteur maximale de l'image, ou None
+        watermark: Chemin de l'image du filigrane, ou None
+        with_audio: Booléen indiquant si le flux a une piste audio (format choisi)
+
+    Raises:
+        ValueError: Si le flux ne peut pas être découpé
+    """
+    try:
+        segments = sorted((float(start), float(end)) for start, end in segments)
+        trims, inputs = compile_stream_filters(segments, with_audio)
+
+        # Lecture limitée à la fin du dernier segment: le reste du flux n'est jamais lu
+        cmd = ['ffmpeg', '-y', '-v', 'error', '-t', f"{segments[-1][1]:.6f}", '-i', 'pipe:0']
+
+        # Image du filigrane ajoutée après le flux (entrée 1)
+        if watermark:
+            cmd += ['-i', watermark]
+
+        graph, video_label, audio_label = compile_filtergraph(
+            [end - start for start, end in segments], {'video': {'fps': fps}, 'audio': None}, with_audio, transition,
+            max_height, 1 if watermark else None, inputs)
+
+        cmd += ['-filter_complex', ';'.join(trims + [graph]), '-map', f"[{video_label}]"]
+        if audio_label:
+            cmd += ['-map', f"[{audio_label}]"]
+        cmd += ['-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF)]
+        if audio_label:
+            cmd += ['-c:a', 'aac', '-b:a', AUDIO_BITRATE]
+        cmd += ['-movflags', '+faststart', output_file]
+
+        logger.info(f"Découpe au fil du téléchargement: {len(segments)} segments, lecture jusqu'à {segments[-1][1]:.1f}s")
+
+        with tempfile.TemporaryFile() as stderr:
+            try:
+                process = subprocess.Popen(cmd, stdin=stream.stdout, stderr=stderr)
+            except OSError as e:
+                raise ValueError(f"Impossible de lancer FFmpeg: {str(e)}")
+            finally:
+                # Seul FFmpeg garde le pipe ouvert: le téléchargeur est averti (SIGPIPE) quand il s'arrête
+                stream.stdout.close()
+
+            process.wait()
+
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise ValueError(f"Erreur lors de la découpe du flux: {stderr.read().decode('utf-8', 'replace')}")
+    finally:
+        # Fin du dernier segment atteinte (ou échec): le reste du téléchargement est inutile
+        stop_stream(stream)
+
+def stop_stream(stream):
+    """
+    Interrompt le téléchargeur s'il est encore actif et attend sa fin (aucun
+    processus zombie, quelle que soit l'issue de la découpe).
+
+    Args:
+        stream: Processus du téléchargeur (voir youtube_extractor.open_video_stream)
+    """
+    if stream.stdout and not stream.stdout.closed:
+        stream.stdout.close()
+    if stream.poll() is None:
+        stream.terminate()
+    stream.wait()
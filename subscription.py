@@ -5,11 +5,17 @@
 Gestion des abonnements pour le générateur de clips "Best Of".
 """
 
+import logging
+
 from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
 from flask_login import login_required, current_user
 from api.models import db, User
 from datetime import datetime, timedelta
 
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
 subscription_bp = Blueprint('subscription', __name__)
 
 @subscription_bp.route('/subscription', methods=['GET'])
@@ -173,7 +179,7 @@ def check_expired_subscriptions():
 def delete_expired_clips():
     """Supprime les clips expirés."""
     from api.models import Clip
-    import os
+    from storage.storage_backend import get_storage_backend
     
     now = datetime.utcnow()
     expired_clips = Clip.query.filter(
@@ -182,12 +188,12 @@ def delete_expired_clips():
     
     deleted_count = 0
     for clip in expired_clips:
-        # Supprimer le fichier physique si possible
-        if clip.file_path and os.path.exists(clip.file_path):
-            try:
-                os.remove(clip.file_path)
-            except:
-                pass
+        # Supprimer le clip du moteur de stockage (disque local ou bucket S3) si possible
+        try:
+            get_storage_backend().delete(clip.id)
+        except Exception as e:
+            # Une erreur de stockage n'interrompt pas la suppression des autres clips
+            logger.error(f"Erreur lors de la suppression du fichier du clip {clip.id}: {str(e)}")
         
         db.session.delete(clip)
         deleted_count += 1
@@ -0,0 +1,947 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests pour les utilitaires de génération des clips du générateur "Best Of".
+"""
+
+import os
+import re
+import unittest
+import tempfile
+import shutil
+import socket
+import fcntl
+import threading
+import subprocess
+import time
+from unittest.mock import patch
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from api.utils import source_cache
+from api.utils.source_cache import SourceCache
+from api.utils.segment_planner import plan_segments, scores_from_heatmap, snap_to_keyframes
+from api.utils.partial_download import fetch_sections
+from api.utils import media_probe
+from api.utils.audio_analysis import AudioEnergyAnalyzer, SAMPLE_RATE
+from api.utils.scene_analysis import SceneChangeAnalyzer
+from api.utils import highlight_analysis
+from api.utils.score_index import ScoreIndex
+from api.utils import clip_generator
+from api.utils.smart_cut import split_segment, render_smart_cut
+from api.utils.transitions import plan_transitions, render_with_transitions
+from api.utils.chunked_encode import plan_chunks, encode_chunked, _encode_chunk
+from api.utils.render_graph import compile_filtergraph, render_clip, plan_render_chunks
+from api.utils.stream_cut import compile_stream_filters, stream_clip
+from api.utils.scratch_space import ScratchSpace, check_free_space
+import numpy as np
+
+def make_fixture_video(path, duration=60, gop=25):
+    """
+    Génère une vidéo de test (mire bruitée et son), par défaut avec une image clé par seconde.
+    Le bruit donne un débit réaliste, de sorte que la vidéo dépasse largement
+    les tampons réseau et que les lectures partielles soient mesurables.
+    """
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=25:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-vf', 'noise=alls=20:allf=t',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-keyint_min', str(gop), '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-movflags', '+faststart', '-shortest', path
+    ], check=True, capture_output=True)
+
+def missing_parameter_sets(path):
+    """
+    Compte les images clés H.264 d'un fichier qui ne sont pas précédées d'un SPS
+    dans le flux (le SPS de l'en-tête du fichier ne compte que pour la première).
+    """
+    trace = subprocess.run(['ffmpeg', '-v', 'info', '-i', path, '-map', '0:v', '-c', 'copy',
+                            '-bsf:v', 'trace_headers', '-f', 'null', '-'], capture_output=True, text=True).stderr
+    missing, has_sps, previous = 0, False, None
+    for nal_type in re.findall(r'nal_unit_type\s+[01]+ = (\d+)', trace):
+        if nal_type == '7':
+            has_sps = True
+        elif nal_type in ('1', '5'):
+            # Plusieurs tranches d'une même image clé: un seul SPS attendu
+            if nal_type == '5' and previous != '5' and not has_sps:
+                missing += 1
+            has_sps = False
+            previous = nal_type
+    return missing
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serveur de fichiers de test gérant les requêtes HTTP Range."""
+
+    bytes_sent = 0
+
+    def setup(self):
+        super().setup()
+        # Petit tampon d'envoi: les octets comptés sont proches des octets lus par le client
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        # Comptage des octets réellement envoyés (le client peut fermer la connexion)
+        while True:
+            chunk = source.read(64 * 1024)
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+            RangeRequestHandler.bytes_sent += len(chunk)
+
+class SourceCacheTestCase(unittest.TestCase):
+    """Tests pour le cache des vidéos sources."""
+
+    def setUp(self):
+        """Crée un cache temporaire limité à 250 octets."""
+        self.root = tempfile.mkdtemp()
+        self.cache = SourceCache(self.root, 250)
+        self.downloads = []
+
+    def tearDown(self):
+        """Supprime le cache temporaire."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _fetcher(self, size=100, delay=0):
+        """Construit une fonction de téléchargement simulée."""
+        def fetch(output_dir):
+            time.sleep(delay)
+            self.downloads.append(output_dir)
+            path = os.path.join(output_dir, 'video.mp4')
+            with open(path, 'wb') as f:
+                f.write(b'\0' * size)
+            return path
+        return fetch
+
+    def test_hit_after_miss(self):
+        """Teste qu'une vidéo déjà téléchargée est réutilisée."""
+        with self.cache.open('abc', 'best', self._fetcher()) as first:
+            pass
+        with self.cache.open('abc', 'best', self._fetcher()) as second:
+            self.assertEqual(first, second)
+            self.assertTrue(os.path.exists(second))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(len(self.downloads), 1)
+
+    def test_format_is_part_of_key(self):
+        """Teste que deux formats d'une même vidéo sont stockés séparément."""
+        with self.cache.open('abc', 'best', self._fetcher()) as first:
+            with self.cache.open('abc', 'worst', self._fetcher()) as second:
+                self.assertNotEqual(first, second)
+        self.assertEqual(len(self.downloads), 2)
+
+    def test_concurrent_requests_download_once(self):
+        """Teste que des demandes simultanées partagent un seul téléchargement."""
+        paths = []
+
+        def worker():
+            with self.cache.open('abc', 'best', self._fetcher(delay=0.2)) as path:
+                paths.append(path)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.downloads), 1)
+        self.assertEqual(len(set(paths)), 1)
+
+    def test_lru_eviction_skips_entries_in_use(self):
+        """Teste que l'éviction supprime l'entrée la plus ancienne non utilisée."""
+        in_use = self.cache.acquire('a', 'best', self._fetcher())
+        with self.cache.open('b', 'best', self._fetcher()) as b_path:
+            pass
+        time.sleep(0.01)
+        with self.cache.open('c', 'best', self._fetcher()) as c_path:
+            pass
+
+        # 300 octets pour 250 autorisés: 'a' est la plus ancienne mais utilisée
+        self.assertTrue(os.path.exists(in_use))
+        self.assertFalse(os.path.exists(b_path))
+        self.assertTrue(os.path.exists(c_path))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+        self.cache.release(in_use)
+        with self.cache.open('d', 'best', self._fetcher()):
+            pass
+        self.assertFalse(os.path.exists(in_use))
+
+    def test_pending_eviction_does_not_block_cache(self):
+        """Teste qu'une suppression en cours dans un autre processus ne bloque que l'entrée concernée."""
+        with self.cache.open('a', 'best', self._fetcher()) as a_path:
+            pass
+
+        # Verrou exclusif d'un autre processus en train de supprimer l'entrée
+        with open(os.path.join(os.path.dirname(a_path), source_cache.LOCK_FILE), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            waiting = threading.Thread(target=lambda: self.cache.release(
+                self.cache.acquire('a', 'best', self._fetcher())))
+            waiting.start()
+            time.sleep(0.1)
+
+            done = threading.Event()
+            def other():
+                with self.cache.open('b', 'best', self._fetcher()):
+                    self.cache.stats()
+                done.set()
+            threading.Thread(target=other).start()
+            self.assertTrue(done.wait(2))
+            self.assertTrue(waiting.is_alive())
+
+        waiting.join(2)
+        self.assertFalse(waiting.is_alive())
+
+class SegmentPlannerTestCase(unittest.TestCase):
+    """Tests pour la planification des segments."""
+
+    def test_short_segment_follows_heatmap(self):
+        """Teste que le clip court est placé sur le moment le plus revu."""
+        heatmap = [{'start_time': 0, 'end_time': 500, 'value': 0.1},
+                   {'start_time': 500, 'end_time': 560, 'value': 1.0},
+                   {'start_time': 560, 'end_time': 1000, 'value': 0.1}]
+        scores = scores_from_heatmap(heatmap, 1000)
+
+        (start, end), = plan_segments(1000, 'short', scores)
+        self.assertTrue(30 <= end - start <= 60)
+        self.assertTrue(500 <= start and end <= 561)
+
+    def test_long_segments_do_not_overlap(self):
+        """Teste que les segments d'un clip long atteignent 20% sans se chevaucher."""
+        scores = [float(i % 97) for i in range(3600)]
+        segments = plan_segments(3600, 'long', scores)
+
+        total = sum(end - start for start, end in segments)
+        self.assertAlmostEqual(total, 720, delta=10)
+        for (_, previous_end), (start, _) in zip(segments, segments[1:]):
+            self.assertLessEqual(previous_end, start)
+
+    def test_segments_snap_to_shot_boundaries(self):
+        """Teste l'alignement des segments sur les coupures de plan proches."""
+        scores = [0.0] * 100 + [1.0] * 40 + [0.0] * 60
+        with patch('api.utils.segment_planner.random.randint', return_value=40):
+            (start, end), = plan_segments(200, 'short', scores, boundaries=[50.0, 99.0, 141.2, 180.0])
+        self.assertEqual((start, end), (99.0, 141.2))
+
+        # Un alignement qui sortirait des durées autorisées est ignoré
+        with patch('api.utils.segment_planner.random.randint', return_value=30):
+            (start, end), = plan_segments(200, 'short', [0.0] * 100 + [1.0] * 30 + [0.0] * 70, boundaries=[101.0])
+        self.assertEqual((start, end), (100.0, 130.0))
+
+    def test_segments_snap_to_keyframes(self):
+        """Teste l'alignement des segments sur les images clés pour la copie sans réencodage."""
+        keyframes = [float(time) for time in range(0, 200, 4)]
+        segments = snap_to_keyframes([(9.0, 42.5), (42.6, 70.0), (102.0, 130.0)], keyframes, 200, tolerance=1.0)
+
+        # 9.0: image clé la plus proche; 42.6: l'image clé précédente (40.0) recouvrirait le
+        # premier segment, d'où l'image clé suivante; 102.0: aucune image clé proche, image clé précédente
+        self.assertEqual(segments, [(8.0, 42.5), (44.0, 70.0), (100.0, 130.0)])
+
+    def test_short_video_is_kept_whole(self):
+        """Teste qu'une vidéo plus courte que le clip est conservée entière."""
+        self.assertEqual(plan_segments(20, 'short'), [(0, 20)])
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+class PartialDownloadTestCase(unittest.TestCase):
+    """Tests pour le téléchargement partiel depuis un serveur HTTP local."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Génère la vidéo de test et démarre le serveur HTTP."""
+        cls.root = tempfile.mkdtemp()
+        cls.fixture = os.path.join(cls.root, 'fixture.mp4')
+        make_fixture_video(cls.fixture)
+
+        handler = lambda *args, **kwargs: RangeRequestHandler(*args, directory=cls.root, **kwargs)
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/fixture.mp4"
+
+    @classmethod
+    def tearDownClass(cls):
+        """Arrête le serveur et supprime les fichiers de test."""
+        cls.server.shutdown()
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    def test_only_requested_ranges_are_fetched(self):
+        """Teste que seules les plages demandées sont téléchargées."""
+        output_dir = tempfile.mkdtemp(dir=self.root)
+        RangeRequestHandler.bytes_sent = 0
+
+        paths = fetch_sections(self.url, [(10, 15), (40, 45)], output_dir)
+
+        self.assertEqual(len(paths), 2)
+        for path in paths:
+            self.assertTrue(os.path.getsize(path) > 0)
+
+        # Deux plages de 5s sur 60s: environ un sixième du fichier doit être lu
+        self.assertLess(RangeRequestHandler.bytes_sent, os.path.getsize(self.fixture) / 4)
+
+class AudioAnalysisTestCase(unittest.TestCase):
+    """Tests pour la détection des moments forts par l'énergie audio."""
+
+    def test_loud_passage_scores_highest(self):
+        """Teste que le passage le plus fort obtient les meilleurs scores, quel que soit le découpage en blocs."""
+        rng = np.random.default_rng(0)
+        samples = (rng.standard_normal(SAMPLE_RATE * 60) * 0.01).astype(np.float32)
+        samples[SAMPLE_RATE * 30:SAMPLE_RATE * 35] *= 50
+
+        analyzer = AudioEnergyAnalyzer()
+        for start in range(0, len(samples), 12345):
+            analyzer.feed(samples[start:start + 12345])
+        scores = analyzer.finish()
+
+        self.assertEqual(len(scores), 60)
+        self.assertTrue(30 <= int(np.argmax(scores)) < 35)
+        self.assertLessEqual(scores.max(), 1.0)
+
+        (start, end), = plan_segments(60, 'short', scores)
+        self.assertTrue(start <= 30 and end >= 35)
+
+    def test_silence_gives_flat_scores(self):
+        """Teste qu'une piste silencieuse donne une courbe nulle."""
+        analyzer = AudioEnergyAnalyzer()
+        analyzer.feed(np.zeros(SAMPLE_RATE * 10 + SAMPLE_RATE // 2, dtype=np.float32))
+        scores = analyzer.finish()
+        self.assertEqual(len(scores), 11)
+        self.assertFalse(scores.any())
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_streamed_analysis_of_file(self):
+        """Teste l'analyse d'un fichier décodé par FFmpeg et lu par blocs."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        path = os.path.join(root, 'audio.m4a')
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error', '-f', 'lavfi',
+            '-i', "aevalsrc='sin(440*2*PI*t)*if(between(t,40,45),0.9,0.02)':s=44100:d=90",
+            '-c:a', 'aac', path
+        ], check=True, capture_output=True)
+
+        with patch('api.utils.highlight_analysis.CHUNK_SECONDS', 7):
+            scores = highlight_analysis.analyse_video(path, ['audio_energy'])['curves']['audio_energy']
+        self.assertAlmostEqual(len(scores), 90, delta=1)
+        self.assertTrue(40 <= int(np.argmax(scores)) <= 45)
+
+class SceneAnalysisTestCase(unittest.TestCase):
+    """Tests pour la détection des coupures de plan et du mouvement."""
+
+    def test_cuts_and_motion_across_batches(self):
+        """Teste la détection d'une coupure et du mouvement, quel que soit le découpage en lots."""
+        rng = np.random.default_rng(0)
+        dark = np.full((40, 36, 64), 30, dtype=np.uint8)
+        bright = np.full((40, 36, 64), 220, dtype=np.uint8)
+        # Plan lumineux agité entre 5s et 7s (images 20 à 27 à 4 images/s), puis figé
+        bright[:8] = rng.integers(200, 241, size=(8, 36, 64), dtype=np.uint8)
+        bright[8:] = bright[7]
+        frames = np.concatenate((dark[:20], bright))
+
+        analyzer = SceneChangeAnalyzer(fps=4)
+        for start in range(0, len(frames), 7):
+            analyzer.feed(frames[start:start + 7])
+        motion = analyzer.finish()
+
+        self.assertEqual(analyzer.boundaries, [5.0])
+        self.assertEqual(len(motion), 15)
+        self.assertIn(int(np.argmax(motion)), (5, 6))
+        self.assertEqual(motion[0], 0)
+        self.assertEqual(motion[8], 0)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_streamed_analysis_of_file(self):
+        """Teste la détection des coupures d'un fichier décodé par FFmpeg."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        path = os.path.join(root, 'shots.mp4')
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'lavfi', '-i', 'color=c=black:size=320x240:rate=25:duration=10',
+            '-f', 'lavfi', '-i', 'color=c=white:size=320x240:rate=25:duration=10',
+            '-filter_complex', '[0:v][1:v]concat=n=2:v=1[v]', '-map', '[v]',
+            '-c:v', 'libx264', '-preset', 'ultrafast', path
+        ], check=True, capture_output=True)
+
+        with patch('api.utils.highlight_analysis.BATCH_FRAMES', 9):
+            analysis = highlight_analysis.analyse_video(path, ['motion'])
+        boundaries, motion = analysis['boundaries'], analysis['curves']['motion']
+        self.assertEqual(len(boundaries), 1)
+        self.assertAlmostEqual(boundaries[0], 10.0, delta=0.5)
+        self.assertAlmostEqual(len(motion), 20, delta=1)
+
+class CountingAnalyzer:
+    """Analyseur de test comptant les blocs reçus."""
+
+    def __init__(self, media):
+        self.media = media
+        self.units = 0
+
+    def feed(self, block):
+        self.units += len(block)
+
+    def finish(self):
+        return np.ones(3, dtype=np.float32)
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+class HighlightAnalysisTestCase(unittest.TestCase):
+    """Tests pour la distribution d'un décodage unique aux analyseurs."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Génère une vidéo de test de 20s."""
+        cls.root = tempfile.mkdtemp()
+        cls.fixture = os.path.join(cls.root, 'fixture.mp4')
+        make_fixture_video(cls.fixture, duration=20)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Supprime les fichiers de test."""
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    def setUp(self):
+        """Enregistre deux analyseurs supplémentaires."""
+        self.video = CountingAnalyzer('video')
+        self.audio = CountingAnalyzer('audio')
+        highlight_analysis.register_analyzer('test_video', lambda: self.video, weight=0)
+        highlight_analysis.register_analyzer('test_audio', lambda: self.audio, weight=0)
+        self.addCleanup(highlight_analysis.unregister_analyzer, 'test_video')
+        self.addCleanup(highlight_analysis.unregister_analyzer, 'test_audio')
+
+    def test_one_decode_feeds_every_analyzer(self):
+        """Teste qu'un seul processus FFmpeg alimente tous les analyseurs."""
+        with patch('api.utils.highlight_analysis.subprocess.Popen', wraps=subprocess.Popen) as popen:
+            analysis = highlight_analysis.analyse_video(self.fixture)
+
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual(set(analysis['curves']), {'audio_energy', 'motion', 'test_video', 'test_audio'})
+        self.assertAlmostEqual(self.video.units, 20 * highlight_analysis.PROXY_FPS, delta=2)
+        self.assertAlmostEqual(self.audio.units, 20 * SAMPLE_RATE, delta=SAMPLE_RATE)
+        self.assertAlmostEqual(len(analysis['scores']), 20, delta=1)
+        self.assertTrue(0 <= analysis['scores'].min() and analysis['scores'].max() <= 1)
+
+    def test_missing_stream_skips_its_analyzers(self):
+        """Teste qu'une vidéo sans piste audio n'est analysée que par les analyseurs vidéo."""
+        silent = os.path.join(self.root, 'silent.mp4')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', self.fixture, '-an', '-c', 'copy', silent],
+                       check=True, capture_output=True)
+
+        analysis = highlight_analysis.analyse_video(silent)
+        self.assertEqual(set(analysis['curves']), {'motion', 'test_video'})
+        self.assertEqual(self.audio.units, 0)
+
+class ScoreIndexTestCase(unittest.TestCase):
+    """Tests pour l'index persistant des courbes de scores."""
+
+    def setUp(self):
+        """Crée un index temporaire."""
+        self.root = tempfile.mkdtemp()
+        self.index = ScoreIndex(self.root, 8 * 1024, 'v1')
+
+    def tearDown(self):
+        """Supprime l'index temporaire."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_round_trip_is_memory_mapped(self):
+        """Teste l'enregistrement puis la relecture projetée en mémoire d'une courbe."""
+        scores = np.linspace(0, 1, 600)
+        self.index.put('abc', scores, [12.5, 80.0], 600.0)
+
+        entry = ScoreIndex(self.root, 8 * 1024, 'v1').get('abc')
+        self.assertIsInstance(entry['scores'], np.memmap)
+        self.assertEqual(entry['scores'].dtype, np.float16)
+        np.testing.assert_allclose(entry['scores'], scores, atol=1e-3)
+        self.assertEqual(entry['boundaries'], [12.5, 80.0])
+        self.assertEqual(entry['duration'], 600.0)
+
+    def test_other_version_is_ignored(self):
+        """Teste qu'une courbe calculée par d'autres analyseurs est ignorée."""
+        self.index.put('abc', np.zeros(10))
+        self.assertIsNone(ScoreIndex(self.root, 8 * 1024, 'v2').get('abc'))
+
+    def test_mismatched_curve_is_ignored(self):
+        """Teste qu'une courbe publiée sans ses métadonnées (écriture interrompue) est ignorée."""
+        self.index.put('abc', np.zeros(10))
+        scores_path = os.path.join(self.root, 'abc.npy')
+        with open(scores_path, 'rb') as f:
+            previous = f.read()
+
+        # Nouvelle courbe renommée, métadonnées de l'écriture précédente
+        replace = os.replace
+        def crash_before_metadata(source, destination):
+            if destination.endswith('.json'):
+                raise OSError("arrêt")
+            replace(source, destination)
+
+        with patch('api.utils.score_index.os.replace', side_effect=crash_before_metadata):
+            with self.assertRaises(OSError):
+                self.index.put('abc', np.ones(10))
+        self.assertIsNone(self.index.get('abc'))
+
+        # Courbe précédente et métadonnées de la nouvelle écriture
+        self.index.put('abc', np.ones(10))
+        with open(scores_path, 'wb') as f:
+            f.write(previous)
+        self.assertIsNone(self.index.get('abc'))
+
+        self.index.put('abc', np.ones(10))
+        np.testing.assert_array_equal(self.index.get('abc')['scores'], np.ones(10))
+
+    def test_least_recently_used_is_evicted(self):
+        """Teste l'éviction de la courbe la moins récemment utilisée."""
+        for video_id in ('a', 'b'):
+            self.index.put(video_id, np.zeros(1500))
+            time.sleep(0.01)
+        self.index.get('a')
+        time.sleep(0.01)
+        self.index.put('c', np.zeros(1500))
+
+        # Trois courbes de 3 Ko pour 8 Ko autorisés: 'b' est la moins récemment utilisée
+        self.assertIsNotNone(self.index.get('a'))
+        self.assertIsNone(self.index.get('b'))
+        self.assertIsNotNone(self.index.get('c'))
+
+    def test_second_generation_does_not_decode(self):
+        """Teste qu'une vidéo déjà analysée est planifiée sans nouveau décodage."""
+        analysis = {'scores': np.ones(120, dtype=np.float32), 'boundaries': [30.0]}
+        with patch('api.utils.clip_generator.get_score_index', return_value=self.index), \
+                patch('api.utils.clip_generator._get_video_duration', return_value=120.0), \
+                patch('api.utils.clip_generator.analyse_video', return_value=analysis) as analyse:
+            clip_generator._detect_long_segments('/tmp/video.mp4', 120.0, 'abc')
+            segments = clip_generator._detect_short_segments('/tmp/video.mp4', 'abc')
+
+        self.assertEqual(analyse.call_count, 1)
+        self.assertEqual(len(segments), 1)
+
+class SmartCutTestCase(unittest.TestCase):
+    """Tests pour la découpe à l'image près avec réencodage des seules extrémités."""
+
+    def test_split_segment(self):
+        """Teste le découpage d'un segment en extrémités réencodées et partie centrale copiée."""
+        keyframes = [0.0, 4.0, 8.0, 12.0, 16.0]
+        self.assertEqual(split_segment(2.5, 13.0, keyframes),
+                         [('encode', 2.5, 4.0), ('copy', 4.0, 12.0), ('encode', 12.0, 13.0)])
+        self.assertEqual(split_segment(4.0, 12.0, keyframes), [('copy', 4.0, 12.0)])
+        self.assertEqual(split_segment(5.0, 9.0, keyframes), [('encode', 5.0, 9.0)])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_cut_is_frame_accurate(self):
+        """Teste que la durée du clip correspond exactement aux segments demandés."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20, gop=100)
+        output = os.path.join(root, 'clip.mp4')
+
+        render_smart_cut([(source, 2.4, 9.2), (source, 12.2, 15.0)], output, root)
+
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 6.8 + 2.8, delta=0.1)
+        self.assertEqual(info['video']['codec'], 'h264')
+        # Les morceaux intermédiaires sont supprimés
+        self.assertFalse([name for name in os.listdir(root) if name.startswith('part')])
+
+        # Source en profil Baseline, extrémités réencodées en profil High: chaque
+        # image clé porte ses paramètres et le clip se décode sans erreur aux raccords
+        self.assertEqual(missing_parameter_sets(output), 0)
+        decode = subprocess.run(['ffmpeg', '-v', 'error', '-i', output, '-map', '0:v', '-f', 'rawvideo', '-y', os.devnull],
+                                capture_output=True, text=True)
+        self.assertEqual((decode.returncode, decode.stderr), (0, ''))
+
+class TransitionsTestCase(unittest.TestCase):
+    """Tests pour le rendu des transitions par segments encodés en parallèle."""
+
+    def test_plan_transitions(self):
+        """Teste la répartition des fondus entre les morceaux."""
+        parts, duration = plan_transitions([('a.mp4', 0, 5), ('a.mp4', 10, 12), ('b.mp4', 3, 8)], 1.5)
+
+        # Le segment le plus court (2 s) limite la durée des fondus
+        self.assertEqual(duration, 1.0)
+        self.assertEqual([(part['start'], part['end']) for part in parts], [(0, 5), (11.0, 12), (4.0, 8)])
+        self.assertEqual([part['next'] for part in parts], [('a.mp4', 10, 12), ('b.mp4', 3, 8), None])
+        self.assertEqual([(part['fade_in'], part['fade_out']) for part in parts],
+                         [(True, False), (False, False), (False, True)])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_render_with_transitions(self):
+        """Teste que les fondus enchaînés raccourcissent le clip de leur durée."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20)
+        output = os.path.join(root, 'clip.mp4')
+
+        render_with_transitions([(source, 1, 5), (source, 8, 11), (source, 14, None)], output, root, 0.5)
+
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 4 + 3 + 6 - 2 * 0.5, delta=0.1)
+        self.assertIsNotNone(info['audio'])
+        self.assertFalse([name for name in os.listdir(root) if name.startswith('transition')])
+
+class ChunkedEncodeTestCase(unittest.TestCase):
+    """Tests pour le réencodage parallèle par tranches."""
+
+    def test_plan_chunks(self):
+        """Teste le découpage aux images clés les plus proches des coupures idéales."""
+        keyframes = [0.0, 2.0, 4.5, 7.0, 9.5]
+        self.assertEqual(plan_chunks(12.0, keyframes, 3), [(0.0, 4.5), (4.5, 7.0), (7.0, 12.0)])
+        # Pas d'image clé utilisable: une seule tranche
+        self.assertEqual(plan_chunks(12.0, [0.0], 4), [(0.0, 12.0)])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_encode_chunked(self):
+        """Teste l'encodage par tranches, leur assemblage et le suivi de leur avancement."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20)
+        output = os.path.join(root, 'scaled.mp4')
+        progress = {}
+
+        with patch('api.utils.chunked_encode.MIN_CHUNK_DURATION', 4):
+            encode_chunked(source, output, root, video_filter='scale=160:120', max_workers=4, min_duration=0,
+                           on_progress=lambda index, count, fraction: progress.__setitem__(index, (count, fraction)))
+
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 20, delta=0.1)
+        self.assertEqual((info['video']['width'], info['video']['height']), (160, 120))
+        self.assertIsNotNone(info['audio'])
+        self.assertEqual(progress, {index: (4, 1.0) for index in range(4)})
+        self.assertFalse([name for name in os.listdir(root) if name.startswith('chunk')])
+
+    def test_verbose_errors_do_not_block(self):
+        """Teste qu'une tranche dont FFmpeg écrit beaucoup d'erreurs ne bloque pas le suivi de l'avancement."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        # FFmpeg simulé: 1 Mo d'erreurs (bien plus qu'un tampon de tube) avant l'avancement
+        with open(os.path.join(root, 'ffmpeg'), 'w') as f:
+            f.write("#!/bin/sh\nyes erreur | head -c 1048576 >&2\necho out_time_us=1000000\nexit 1\n")
+        os.chmod(os.path.join(root, 'ffmpeg'), 0o755)
+
+        result = []
+        def encode():
+            try:
+                _encode_chunk('source.mp4', 0.0, 2.0, os.path.join(root, 'chunk.mkv'), None,
+                              {'duration': 2.0}, lambda fraction: None, with_audio=False)
+            except ValueError as e:
+                result.append(str(e))
+
+        with patch.dict(os.environ, {'PATH': f"{root}{os.pathsep}{os.environ.get('PATH', '')}"}):
+            thread = threading.Thread(target=encode, daemon=True)
+            thread.start()
+            thread.join(10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(result), 1)
+        self.assertIn('erreur\nerreur', result[0])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_short_video_single_pass(self):
+        """Teste qu'une vidéo courte est encodée en une seule passe."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=5)
+        output = os.path.join(root, 'scaled.mp4')
+        progress = []
+
+        encode_chunked(source, output, root, video_filter='scale=160:120', max_workers=4,
+                       on_progress=lambda index, count, fraction: progress.append((index, count)))
+
+        self.assertAlmostEqual(media_probe.probe(output)['duration'], 5, delta=0.1)
+        self.assertEqual(set(progress), {(0, 1)})
+
+class RenderGraphTestCase(unittest.TestCase):
+    """Tests pour la compilation du rendu en une seule commande FFmpeg."""
+
+    REFERENCE = {'video': {'width': 1920, 'height': 1080, 'fps': 25.0}, 'audio': {'sample_rate': 48000}}
+
+    def test_compile_filtergraph(self):
+        """Teste l'enchaînement des fondus, de la mise à l'échelle et du filigrane."""
+        graph, video_label, audio_label = compile_filtergraph(
+            [4.0, 3.0, 5.0], self.REFERENCE, transition=0.5, max_height=720, watermark_input=3)
+
+        # Chaque fondu commence à la durée cumulée moins les fondus précédents
+        self.assertIn('offset=3.500000[vx1]', graph)
+        self.assertIn('offset=6.000000[vx2]', graph)
+        self.assertIn('fade=t=out:st=10.500000', graph)
+        self.assertIn('[vj]scale=-2:720[vs]', graph)
+        self.assertIn('[3:v]format=rgba', graph)
+        self.assertIn('[vs][wm]overlay', graph)
+        self.assertEqual((video_label, audio_label), ('vw', 'aj'))
+
+    def test_compile_without_transitions(self):
+        """Teste la mise bout à bout sans agrandissement de l'image."""
+        graph, video_label, _ = compile_filtergraph([4.0, 3.0], self.REFERENCE, max_height=2160)
+
+        self.assertIn('[v0][a0][v1][a1]concat=n=2:v=1:a=1[vj][aj]', graph)
+        self.assertNotIn('xfade', graph)
+        self.assertEqual(video_label, 'vj')
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_render_clip_single_pass(self):
+        """Teste que découpe, fondus, mise à l'échelle et filigrane ne font qu'un seul rendu."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20)
+        watermark = os.path.join(root, 'watermark.png')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'color=white:s=40x20',
+                        '-frames:v', '1', watermark], check=True)
+        # Analyse de la source mise en cache avant de compter les appels à FFmpeg
+        media_probe.probe(source)
+        output = os.path.join(root, 'clip.mp4')
+
+        with patch('api.utils.render_graph.subprocess.run', wraps=subprocess.run) as run:
+            render_clip([(source, 1, 5), (source, 8, 11), (source, 14, None)], output,
+                        transition=0.5, max_height=120, watermark=watermark)
+
+        self.assertEqual([call.args[0][0] for call in run.call_args_list], ['ffmpeg'])
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 4 + 3 + 6 - 2 * 0.5, delta=0.1)
+        self.assertEqual((info['video']['width'], info['video']['height']), (160, 120))
+
+    def test_plan_render_chunks(self):
+        """Teste que les coupures des tranches évitent les fondus enchaînés."""
+        chunks = plan_render_chunks([4.0, 3.0, 6.0], 0.5, 3)
+
+        # Clip de 12s coupé à 4s et 8s: fin du fondu entre les segments 0 et 1, milieu du segment 2
+        self.assertEqual(chunks, [[(0, 0.0, 4.0), (1, 0.0, 0.5)], [(1, 0.5, 3.0), (2, 0.0, 2.0)], [(2, 2.0, 6.0)]])
+        self.assertEqual(plan_render_chunks([1.0, 1.0], 0.5, 4), [[(0, 0.0, 1.0), (1, 0.0, 1.0)]])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_long_clip_is_rendered_in_chunks(self):
+        """Teste qu'un clip long est rendu par tranches sans décoder deux fois une image."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20)
+        watermark = os.path.join(root, 'watermark.png')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'color=white:s=40x20',
+                        '-frames:v', '1', watermark], check=True)
+        media_probe.probe(source)
+        output = os.path.join(root, 'clip.mp4')
+
+        with patch('api.utils.render_graph.Config.CHUNKED_ENCODE_MIN_DURATION', 10), \
+                patch('api.utils.render_graph.MIN_CHUNK_DURATION', 4), \
+                patch('api.utils.render_graph.os.cpu_count', return_value=3), \
+                patch('api.utils.render_graph.subprocess.run', wraps=subprocess.run) as run:
+            render_clip([(source, 1, 5), (source, 8, 11), (source, 14, None)], output,
+                        transition=0.5, max_height=120, watermark=watermark, work_dir=root)
+
+        # Trois tranches vidéo et la piste audio, puis l'assemblage par copie
+        commands = [call.args[0] for call in run.call_args_list]
+        video = [cmd for cmd in commands if cmd[-1].endswith('.mkv')]
+        self.assertEqual(len(video), 3)
+        self.assertEqual(len(commands), 5)
+        # Chaque seconde retenue de la source n'est décodée qu'une fois
+        decoded = sum(float(cmd[index + 1]) for cmd in video for index, arg in enumerate(cmd) if arg == '-t')
+        self.assertAlmostEqual(decoded, 4 + 3 + 6, places=3)
+
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 4 + 3 + 6 - 2 * 0.5, delta=0.1)
+        self.assertEqual((info['video']['width'], info['video']['height']), (160, 120))
+        self.assertIsNotNone(info['audio'])
+        self.assertFalse([name for name in os.listdir(root) if name.startswith(('render_', 'chunks'))])
+
+class StreamCutTestCase(unittest.TestCase):
+    """Tests pour la découpe au fil du téléchargement."""
+
+    def test_compile_stream_filters(self):
+        """Teste la découpe des segments dans le graphe à partir de l'entrée unique."""
+        filters, inputs = compile_stream_filters([(2, 5), (8, 9.5)])
+
+        self.assertEqual(filters[0], '[0:v]split=2[sv0][sv1]')
+        self.assertIn('[sa1]atrim=start=8.000000:end=9.500000,asetpts=PTS-STARTPTS[ta1]', filters)
+        self.assertEqual(inputs, [('tv0', 'ta0'), ('tv1', 'ta1')])
+
+        # Source sans piste audio: découpe de la seule vidéo
+        filters, inputs = compile_stream_filters([(2, 5), (8, 9.5)], with_audio=False)
+        self.assertFalse([flt for flt in filters if '[0:a]' in flt or 'atrim' in flt])
+        self.assertEqual(inputs, [('tv0', None), ('tv1', None)])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_stream_clip_stops_after_last_segment(self):
+        """Teste la découpe d'un flux et l'arrêt du téléchargement après le dernier segment."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(source, duration=20)
+        output = os.path.join(root, 'clip.mp4')
+
+        # Téléchargeur simulé qui ne se termine jamais de lui-même
+        stream = subprocess.Popen(['sh', '-c', f"cat '{source}'; sleep 60"], stdout=subprocess.PIPE)
+        started = time.monotonic()
+        stream_clip(stream, [(8, 11), (1, 5)], output, fps=25, transition=0.5, max_height=120)
+
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertIsNotNone(stream.poll())
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 4 + 3 - 0.5, delta=0.1)
+        self.assertEqual(info['video']['height'], 120)
+        # Aucun fichier intermédiaire: seul le clip est écrit
+        self.assertEqual(sorted(os.listdir(root)), ['clip.mp4', 'source.mp4'])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg est nécessaire pour ce test")
+    def test_stream_clip_without_audio(self):
+        """Teste la découpe d'un flux sans piste audio."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        source = os.path.join(root, 'source.mp4')
+        make_fixture_video(os.path.join(root, 'sound.mp4'), duration=10)
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', os.path.join(root, 'sound.mp4'), '-an', '-c', 'copy',
+                        '-movflags', '+faststart', source], check=True, capture_output=True)
+        output = os.path.join(root, 'clip.mp4')
+
+        stream = subprocess.Popen(['cat', source], stdout=subprocess.PIPE)
+        stream_clip(stream, [(1, 3), (5, 8)], output, fps=25, transition=0.5, with_audio=False)
+
+        info = media_probe.probe(output)
+        self.assertAlmostEqual(info['duration'], 2 + 3 - 0.5, delta=0.1)
+        self.assertIsNone(info['audio'])
+
+    def test_stream_is_stopped_when_ffmpeg_cannot_start(self):
+        """Teste l'arrêt du téléchargement lorsque FFmpeg ne peut pas être lancé."""
+        stream = subprocess.Popen(['sh', '-c', 'sleep 60'], stdout=subprocess.PIPE)
+        self.addCleanup(stream.kill)
+
+        with patch('api.utils.stream_cut.subprocess.Popen', side_effect=OSError("ffmpeg introuvable")):
+            with self.assertRaises(ValueError):
+                stream_clip(stream, [(1, 5)], os.path.join(tempfile.gettempdir(), 'clip.mp4'))
+
+        self.assertIsNotNone(stream.poll())
+        self.assertTrue(stream.stdout.closed)
+
+class ScratchSpaceTestCase(unittest.TestCase):
+    """Tests pour les espaces de travail temporaires."""
+
+    def setUp(self):
+        """Crée une racine temporaire limitée à 1000 octets (600 par espace)."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.scratch = ScratchSpace(self.root, 1000, 600, orphan_age=0)
+
+    def test_discard_removes_nested_directories(self):
+        """Teste la suppression complète d'un espace de travail."""
+        workspace = self.scratch.create('abc')
+        os.makedirs(os.path.join(workspace, 'parts', 'audio'))
+        with open(os.path.join(workspace, 'parts', 'audio', 'part.mkv'), 'wb') as f:
+            f.write(b'x' * 100)
+
+        self.assertEqual(self.scratch.stats()['size'], 100)
+        self.scratch.discard(workspace)
+        self.assertFalse(os.path.exists(workspace))
+        self.assertEqual(self.scratch.stats()['in_use'], 0)
+
+        # Un répertoire hors de la racine n'est jamais supprimé
+        self.scratch.discard(os.path.dirname(self.root))
+        self.assertTrue(os.path.isdir(self.root))
+
+    def test_quotas(self):
+        """Teste les quotas par espace et global."""
+        first, second = self.scratch.create(), self.scratch.create()
+        with open(os.path.join(first, 'video.mp4'), 'wb') as f:
+            f.write(b'x' * 500)
+
+        self.scratch.reserve(first, 100)
+        with self.assertRaises(ValueError):
+            self.scratch.reserve(first, 101)
+        with self.assertRaises(ValueError):
+            self.scratch.reserve(second, 501)
+        self.scratch.reserve(second, None)
+
+        with self.assertRaises(ValueError):
+            check_free_space(self.root, 1024 ** 6)
+
+    def test_reap_keeps_locked_workspaces(self):
+        """Teste que seuls les espaces abandonnés sont supprimés."""
+        active = self.scratch.create('active')
+        orphan = self.scratch.create('orphan')
+
+        # Espace d'une génération interrompue: verrou libéré, contenu conservé
+        self.scratch.detach(orphan)
+        self.assertEqual(self.scratch.reap(), 1)
+        self.assertTrue(os.path.isdir(active))
+        self.assertFalse(os.path.exists(orphan))
+
+        # Un espace verrouillé par un autre processus n'est jamais supprimé
+        other = ScratchSpace(self.root, 1000, 600, orphan_age=0)
+        self.scratch.detach(active)
+        self.assertEqual(other.attach(active), active)
+        self.assertEqual(self.scratch.reap(), 0)
+        other.detach(active)
+        self.assertEqual(self.scratch.reap(), 1)
+
+class MediaProbeTestCase(unittest.TestCase):
+    """Tests pour le cache du service d'analyse des médias."""
+
+    def setUp(self):
+        """Crée un fichier média factice et vide le cache."""
+        media_probe.clear_cache()
+        fd, self.path = tempfile.mkstemp(suffix='.mp4')
+        os.write(fd, b'\0' * 16)
+        os.close(fd)
+
+        info = {'duration': 42.0, 'bit_rate': None, 'format': 'mp4', 'streams': [],
+                'video': None, 'audio': None, 'fps': 25.0}
+        backend = '_probe_with_av' if media_probe.av is not None else '_probe_with_ffprobe'
+        patcher = patch.object(media_probe, backend, side_effect=lambda path: dict(info))
+        self.backend = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Supprime le fichier factice."""
+        os.remove(self.path)
+
+    def test_file_is_probed_once(self):
+        """Teste qu'un fichier n'est analysé qu'une fois."""
+        self.assertEqual(media_probe.get_duration(self.path), 42.0)
+        self.assertEqual(media_probe.probe(self.path)['size'], 16)
+        self.assertEqual(self.backend.call_count, 1)
+
+    def test_keyframe_index_is_persisted(self):
+        """Teste que le relevé des images clés est conservé à côté du fichier."""
+        keyframes = '_keyframes_with_av' if media_probe.av is not None else '_keyframes_with_ffprobe'
+        with patch.object(media_probe, keyframes, return_value=[0.0, 2.0, 4.0]) as read_keyframes:
+            self.assertEqual(media_probe.probe(self.path, keyframes=True)['keyframes'], [0.0, 2.0, 4.0])
+            media_probe.clear_cache()
+            self.assertEqual(media_probe.probe(self.path, keyframes=True)['keyframe_count'], 3)
+        self.assertEqual(read_keyframes.call_count, 1)
+        os.remove(media_probe._keyframe_index_path(self.path))
+
+    def test_modified_file_is_probed_again(self):
+        """Teste que la modification du fichier invalide le cache."""
+        media_probe.probe(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'\0')
+        media_probe.probe(self.path)
+        self.assertEqual(self.backend.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests pour l'exécution des tâches de génération du générateur de clips "Best Of".
+"""
+
+import os
+import unittest
+import threading
+import tempfile
+import shutil
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch, Mock
+from flask import Flask
+from flask_testing import TestCase
+from api.models import db, ClipJob
+from api.utils import job_queue
+from api.utils.clip_generator import generate_clip
+from api.utils.source_cache import SourceCache
+from api.utils.scratch_space import ScratchSpace
+from api.utils.job_executor import GenerationExecutor
+from api.utils.render_graph import render_options_for_plan
+from api.utils.youtube_extractor import VideoUnavailableError
+from api.utils.metadata_cache import MetadataCache
+from api.utils.extractor_backend import ExtractorError
+from api.controllers import clip_controller
+
+class GenerationExecutorTestCase(unittest.TestCase):
+    """Tests pour le pool de workers de génération."""
+
+    def setUp(self):
+        """Crée un exécuteur limité à deux tâches simultanées."""
+        self.executor = GenerationExecutor(2, name='test-worker')
+        self.release = threading.Event()
+
+    def tearDown(self):
+        """Libère les tâches bloquées et arrête l'exécuteur."""
+        self.release.set()
+        self.executor.shutdown(wait=True)
+
+    def _blocking_job(self, started, active, peak, lock):
+        """Tâche qui reste active jusqu'à la libération de l'événement."""
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        started.append(threading.current_thread().name)
+        self.release.wait(5)
+        with lock:
+            active[0] -= 1
+
+    def test_concurrency_is_bounded(self):
+        """Teste que le nombre de tâches simultanées ne dépasse pas la limite."""
+        started, active, peak, lock = [], [0], [0], threading.Lock()
+
+        for i in range(6):
+            self.executor.submit(f"job-{i}", self._blocking_job, started, active, peak, lock)
+
+        time.sleep(0.2)
+        self.assertEqual(len(started), 2)
+        self.assertEqual(self.executor.stats()['queued'], 4)
+
+        self.release.set()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(len(started), 6)
+        self.assertEqual(peak[0], 2)
+
+    def test_queue_position_is_fifo(self):
+        """Teste que la position dans la file respecte l'ordre de soumission."""
+        started, active, peak, lock = [], [0], [0], threading.Lock()
+
+        for i in range(5):
+            self.executor.submit(f"job-{i}", self._blocking_job, started, active, peak, lock)
+
+        time.sleep(0.2)
+        self.assertIsNone(self.executor.queue_position('job-0'))
+        self.assertTrue(self.executor.is_running('job-0'))
+        self.assertEqual(self.executor.queue_position('job-2'), 1)
+        self.assertEqual(self.executor.queue_position('job-4'), 3)
+
+    def test_failing_job_does_not_kill_worker(self):
+        """Teste qu'une tâche en erreur n'interrompt pas le traitement de la file."""
+        done = threading.Event()
+
+        def failing_job():
+            raise RuntimeError("boom")
+
+        self.executor.submit('bad-1', failing_job)
+        self.executor.submit('bad-2', failing_job)
+        self.executor.submit('good', done.set)
+
+        self.assertTrue(done.wait(2))
+
+class JobQueueTestCase(TestCase):
+    """Tests pour la file d'attente persistante des générations."""
+
+    def create_app(self):
+        """Crée une instance de l'application pour les tests."""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        return app
+
+    def setUp(self):
+        """Initialise la base de données avant chaque test."""
+        db.create_all()
+        job_queue.enqueue('clip-1', 'https://youtu.be/abc', 'short', True, title='Vidéo 1')
+        job_queue.enqueue('clip-2', 'https://youtu.be/def', 'long', False, title='Vidéo 2')
+
+    def tearDown(self):
+        """Nettoie la base de données après chaque test."""
+        db.session.remove()
+        db.drop_all()
+
+    def test_claim_is_exclusive(self):
+        """Teste qu'une tâche ne peut être attribuée qu'à un seul worker."""
+        job = job_queue.claim('clip-1', 'worker-a')
+        self.assertIsNotNone(job)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job_queue.claim('clip-1', 'worker-b'))
+        self.assertEqual(job_queue.dispatchable_ids(), ['clip-2'])
+
+    def test_expired_lease_is_redispatched(self):
+        """Teste qu'une tâche dont le bail a expiré peut être reprise."""
+        job_queue.claim('clip-1', 'worker-a')
+        ClipJob.query.filter_by(id='clip-1').update({'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+
+        self.assertIn('clip-1', job_queue.dispatchable_ids())
+        job = job_queue.claim('clip-1', 'worker-b')
+        self.assertIsNotNone(job)
+        self.assertEqual(job.attempts, 2)
+
+        # L'ancien worker a perdu son bail
+        self.assertFalse(job_queue.heartbeat('clip-1', 'worker-a'))
+        self.assertFalse(job_queue.save_checkpoint('clip-1', 'worker-a', 'downloaded', {}))
+        self.assertTrue(job_queue.heartbeat('clip-1', 'worker-b'))
+
+        # Ni fin ni échec de l'ancien worker: le clip de l'utilisateur n'est pas modifié
+        with patch.object(job_queue, '_sync_clip') as sync:
+            self.assertFalse(job_queue.complete('clip-1', 'worker-a', '/clips/clip-1/clip.mp4'))
+            self.assertFalse(job_queue.fail('clip-1', 'worker-a', 'Erreur', retry=False))
+        sync.assert_not_called()
+        job = job_queue.get_job('clip-1')
+        db.session.refresh(job)
+        self.assertEqual((job.status, job.lease_owner, job.error), ('queued', 'worker-b', None))
+
+    def test_checkpoint_and_complete(self):
+        """Teste l'enregistrement des étapes et la fin d'une tâche."""
+        job_queue.claim('clip-1', 'worker-a')
+        job_queue.save_checkpoint('clip-1', 'worker-a', 'downloaded', {'video_path': '/tmp/video.mp4'})
+
+        job = job_queue.get_job('clip-1')
+        self.assertEqual(job.stage, 'downloaded')
+        self.assertEqual(job_queue.load_checkpoint(job), {'video_path': '/tmp/video.mp4'})
+
+        job_queue.complete('clip-1', 'worker-a', '/clips/clip-1/clip.mp4')
+        job = job_queue.get_job('clip-1')
+        self.assertEqual(job.status, 'completed')
+        self.assertIsNone(job.lease_owner)
+        self.assertNotIn('clip-1', job_queue.dispatchable_ids())
+
+    def test_failure_is_retried_then_final(self):
+        """Teste qu'une tâche en échec est relancée jusqu'au nombre maximum de tentatives."""
+        with patch('api.utils.job_queue.Config.JOB_MAX_ATTEMPTS', 2):
+            job_queue.claim('clip-1', 'worker-a')
+            self.assertTrue(job_queue.fail('clip-1', 'worker-a', 'erreur'))
+            self.assertEqual(job_queue.get_job('clip-1').status, 'queued')
+
+            job_queue.claim('clip-1', 'worker-a')
+            self.assertFalse(job_queue.fail('clip-1', 'worker-a', 'erreur'))
+            self.assertEqual(job_queue.get_job('clip-1').status, 'failed')
+
+    def test_queue_position(self):
+        """Teste le calcul de la position dans la file persistante."""
+        self.assertEqual(job_queue.queue_position('clip-1'), 1)
+        self.assertEqual(job_queue.queue_position('clip-2'), 2)
+
+        job_queue.claim('clip-1', 'worker-a')
+        self.assertIsNone(job_queue.queue_position('clip-1'))
+        self.assertEqual(job_queue.queue_position('clip-2'), 1)
+
+    def test_enqueue_does_not_fetch_metadata(self):
+        """Teste que la demande est acceptée sans récupérer les informations de la vidéo."""
+        with patch('api.controllers.clip_controller.extract_video_info') as extract, \
+                patch('api.controllers.clip_controller._dispatch') as dispatch:
+            clip_id = clip_controller.generate_short_clip('https://youtu.be/xyz')
+            with self.assertRaises(ValueError):
+                clip_controller.generate_short_clip('https://invalid-url.com/video')
+
+        extract.assert_not_called()
+        dispatch.assert_called_once()
+        job = job_queue.get_job(clip_id)
+        self.assertEqual(job.status, 'queued')
+        self.assertIsNone(job.title)
+
+    @patch('api.controllers.clip_controller.get_storage_backend', return_value=Mock(save=Mock(return_value='/clips/clip-1/clip.mp4')))
+    @patch('api.controllers.clip_controller.generate_clip', return_value='/tmp/clip.mp4')
+    @patch('api.controllers.clip_controller.extract_video_info')
+    def test_worker_resolves_metadata(self, extract, generate, backend):
+        """Teste que le worker complète les informations de la vidéo."""
+        ClipJob.query.filter_by(id='clip-1').update({'title': None})
+        db.session.commit()
+        extract.return_value = {'title': 'Titre', 'channel': 'Chaîne', 'duration': 212}
+
+        clip_controller._run_job(self.app, 'clip-1')
+
+        job = job_queue.get_job('clip-1')
+        db.session.refresh(job)
+        self.assertEqual((job.title, job.channel, job.duration), ('Titre', 'Chaîne', 212))
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(generate.call_args[0][5], extract.return_value)
+
+    @patch('api.controllers.clip_controller.get_storage_backend', return_value=Mock(save=Mock(return_value='/clips/clip-1/clip.mp4')))
+    @patch('api.controllers.clip_controller.generate_clip')
+    @patch('api.controllers.clip_controller.extract_video_info')
+    def test_worker_selects_source_for_plan(self, extract, generate, backend):
+        """Teste que la source est limitée à la qualité du plan et que le format retenu est enregistré."""
+        ClipJob.query.filter_by(id='clip-1').update({'plan': 'free'})
+        db.session.commit()
+        extract.return_value = {'title': 'Titre', 'channel': 'Chaîne', 'duration': 212}
+
+        def fake_generate(url, mode, transitions, checkpoint, on_stage, video_info, render_options=None, max_height=None):
+            on_stage('downloaded', {'video_path': '/tmp/video.mp4',
+                                    'source': {'format': '22/best[ext=mp4]', 'format_id': '22', 'bytes_saved': 5000}})
+            return '/tmp/clip.mp4'
+
+        generate.side_effect = fake_generate
+        clip_controller._run_job(self.app, 'clip-1')
+
+        self.assertEqual(generate.call_args[1]['max_height'], 720)
+        self.assertEqual(generate.call_args[1]['render_options'], render_options_for_plan('free'))
+        job = job_queue.get_job('clip-1')
+        db.session.refresh(job)
+        self.assertEqual((job.source_format, job.bytes_saved), ('22', 5000))
+        self.assertEqual(job.to_dict()['bytes_saved'], 5000)
+
+    @patch('api.controllers.clip_controller.get_storage_backend', return_value=Mock(save=Mock(return_value='/clips/clip-1/clip.mp4')))
+    @patch('api.controllers.clip_controller.generate_clip', return_value='/tmp/clip.mp4')
+    @patch('api.controllers.clip_controller.extract_video_info', return_value={'title': 'Titre', 'channel': 'Chaîne', 'duration': 212})
+    def test_anonymous_job_uses_free_plan(self, extract, generate, backend):
+        """Teste qu'une demande anonyme est rendue avec la qualité et le filigrane du plan gratuit."""
+        with patch('api.utils.render_graph.Config.WATERMARK_IMAGE', __file__):
+            clip_controller._run_job(self.app, 'clip-1')
+
+        self.assertIsNone(job_queue.get_job('clip-1').plan)
+        self.assertEqual(generate.call_args[1]['max_height'], 720)
+        self.assertEqual(generate.call_args[1]['render_options'], {'max_height': 720, 'watermark': __file__})
+
+    @patch('api.controllers.clip_controller.get_storage_backend', return_value=Mock(save=Mock(return_value='/clips/clip-1/clip.mp4')))
+    @patch('api.controllers.clip_controller.extract_video_info', return_value={'title': 'Titre', 'channel': 'Chaîne', 'duration': 120})
+    def test_free_plan_job_is_rendered_with_watermark(self, extract, backend):
+        """Teste qu'une tâche du plan gratuit passe par le rendu compilé avec le filigrane."""
+        cache_dir = tempfile.mkdtemp()
+        scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        self.addCleanup(shutil.rmtree, scratch_dir, True)
+        scratch = ScratchSpace(scratch_dir, 10 ** 9, 10 ** 9, 3600)
+        ClipJob.query.filter_by(id='clip-1').update({'plan': 'free'})
+        db.session.commit()
+
+        def fake_download(url, output_dir, fmt):
+            path = f"{output_dir}/video.mp4"
+            open(path, 'w').close()
+            return path
+
+        def fake_render(pieces, output_file, transition=0.0, **options):
+            open(output_file, 'w').close()
+
+        # Génération réelle jusqu'au rendu (téléchargement et analyse simulés)
+        with patch('api.utils.render_graph.Config.WATERMARK_IMAGE', __file__), \
+                patch('api.utils.clip_generator.get_source_cache', return_value=SourceCache(cache_dir, 10 ** 9)), \
+                patch('api.utils.clip_generator.get_scratch_space', return_value=scratch), \
+                patch('api.controllers.clip_controller.get_scratch_space', return_value=scratch), \
+                patch('api.utils.clip_generator._scores_from_metadata', return_value=(None, None)), \
+                patch('api.utils.clip_generator._download_video', side_effect=fake_download), \
+                patch('api.utils.clip_generator._get_video_duration', return_value=120.0), \
+                patch('api.utils.clip_generator._get_keyframes', return_value=[0.0, 30.0]), \
+                patch('api.utils.clip_generator._detect_short_segments', return_value=[(0, 30)]), \
+                patch('api.utils.clip_generator.render_clip', side_effect=fake_render) as render:
+            clip_controller._run_job(self.app, 'clip-1')
+
+        job = job_queue.get_job('clip-1')
+        db.session.refresh(job)
+        self.assertEqual(job.status, 'completed')
+        render.assert_called_once()
+        self.assertEqual(render.call_args[1]['watermark'], __file__)
+        self.assertEqual(render.call_args[1]['max_height'], 720)
+        self.assertTrue(render.call_args[0][0][0][0].endswith('video.mp4'))
+
+    def test_unavailable_video_is_not_retried(self):
+        """Teste qu'une vidéo inaccessible fait échouer la tâche sans nouvelle tentative."""
+        backend = Mock()
+        backend.extract_info.side_effect = ExtractorError("ERROR: Private video")
+        cache = MetadataCache(None, 60, 30, cached_errors=(VideoUnavailableError,))
+        job_queue.enqueue('clip-3', 'https://youtu.be/abc', 'short', True)
+
+        # Extraction réelle à travers le cache des informations (erreur reconstruite au second appel)
+        with patch('api.utils.youtube_extractor.get_metadata_cache', return_value=cache), \
+                patch('api.utils.youtube_extractor.get_backend', return_value=backend), \
+                patch('api.controllers.clip_controller.generate_clip') as generate:
+            for clip_id in ('clip-1', 'clip-3'):
+                clip_controller._run_job(self.app, clip_id)
+
+                job = job_queue.get_job(clip_id)
+                db.session.refresh(job)
+                self.assertEqual(job.status, 'failed')
+                self.assertEqual(job.attempts, 1)
+
+        backend.extract_info.assert_called_once()
+        generate.assert_not_called()
+
+class GenerationResumeTestCase(unittest.TestCase):
+    """Tests pour la reprise d'une génération à partir d'un point de reprise."""
+
+    def setUp(self):
+        """Utilise un cache des vidéos sources et des espaces de travail temporaires."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.scratch_dir = tempfile.mkdtemp()
+        self.scratch = ScratchSpace(self.scratch_dir, 10 ** 9, 10 ** 9, 3600)
+        for target, value in (('get_source_cache', SourceCache(self.cache_dir, 10 ** 9)),
+                              ('get_scratch_space', self.scratch)):
+            patcher = patch(f'api.utils.clip_generator.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Supprime le cache et les espaces de travail temporaires."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    @patch('api.utils.clip_generator._create_clip', side_effect=ValueError("échec du rendu"))
+    @patch('api.utils.clip_generator._detect_short_segments', return_value=[(0, 30)])
+    @patch('api.utils.clip_generator._get_video_duration', return_value=120.0)
+    @patch('api.utils.clip_generator._download_video')
+    def test_workspace_is_removed_on_failure(self, download, duration, detect, create):
+        """Teste la suppression de l'espace de travail après un échec et la vérification de l'espace libre."""
+        def fake_download(url, output_dir, fmt):
+            path = f"{output_dir}/video.mp4"
+            open(path, 'w').close()
+            return path
+
+        download.side_effect = fake_download
+        with self.assertRaises(ValueError):
+            generate_clip('https://youtu.be/abc', 'short', False, video_info={'duration': 120})
+        self.assertEqual(os.listdir(self.scratch_dir), [])
+        self.assertEqual(self.scratch.stats()['in_use'], 0)
+
+        # Source plus grande que le disque: refusée avant le téléchargement
+        download.reset_mock()
+        video_info = {'duration': 120, 'formats': [{'format_id': '22', 'height': 720, 'filesize': 1024 ** 6}]}
+        with self.assertRaises(ValueError):
+            generate_clip('https://youtu.be/abc', 'short', False, video_info=video_info)
+        download.assert_not_called()
+
+    @patch('api.utils.clip_generator._create_clip')
+    @patch('api.utils.clip_generator._detect_short_segments', return_value=[(0, 30)])
+    @patch('api.utils.clip_generator._get_video_duration', return_value=120.0)
+    @patch('api.utils.clip_generator._download_video')
+    def test_completed_stages_are_skipped(self, download, duration, detect, create):
+        """Teste que les étapes déjà terminées ne sont pas refaites."""
+        stages = []
+
+        def fake_download(url, output_dir, fmt):
+            path = f"{output_dir}/video.mp4"
+            open(path, 'w').close()
+            return path
+
+        download.side_effect = fake_download
+        generate_clip('https://youtu.be/abc', 'short', False,
+                      on_stage=lambda stage, checkpoint: stages.append((stage, checkpoint)),
+                      video_info={'duration': 120})
+
+        self.assertEqual([stage for stage, _ in stages], ['downloaded', 'analysed', 'rendered'])
+
+        # Reprise après l'étape de téléchargement: seul le rendu est refait
+        download.reset_mock()
+        detect.reset_mock()
+        checkpoint = dict(stages[1][1])
+        generate_clip('https://youtu.be/abc', 'short', False, checkpoint=checkpoint, video_info={'duration': 120})
+        download.assert_not_called()
+        detect.assert_not_called()
+        self.assertEqual(create.call_count, 2)
+
+    @patch('api.utils.clip_generator._detect_short_segments', return_value=[(0, 30)])
+    @patch('api.utils.clip_generator._get_video_duration', return_value=120.0)
+    @patch('api.utils.clip_generator._download_video')
+    def test_source_is_kept_until_rendered(self, download, duration, detect):
+        """Teste que la vidéo source reste réservée dans le cache pendant le rendu."""
+        # Cache plein: toute entrée non utilisée est supprimée à la première éviction
+        cache = SourceCache(self.cache_dir, 0)
+        seen = []
+
+        def fake_download(url, output_dir, fmt):
+            path = f"{output_dir}/video.mp4"
+            with open(path, 'wb') as f:
+                f.write(b'video' * 100)
+            return path
+
+        def fake_create(pieces, output_file, transitions, render_options):
+            cache.evict()
+            seen.append((os.path.exists(pieces[0][0]), cache.stats()['in_use']))
+            open(output_file, 'w').close()
+
+        download.side_effect = fake_download
+        with patch('api.utils.clip_generator.get_source_cache', return_value=cache), \
+                patch('api.utils.clip_generator._create_clip', side_effect=fake_create):
+            generate_clip('https://youtu.be/abc', 'short', False, video_info={'duration': 120})
+
+        self.assertEqual(seen, [(True, 1)])
+        self.assertEqual(cache.stats()['in_use'], 0)
+
+    @patch('api.utils.clip_generator._create_clip')
+    @patch('api.utils.clip_generator._detect_long_segments', return_value=[(0, 30)])
+    @patch('api.utils.clip_generator._get_video_duration', return_value=1200.0)
+    @patch('api.utils.clip_generator.fetch_sections')
+    @patch('api.utils.clip_generator.resolve_stream_url', return_value='https://stream.example/video')
+    @patch('api.utils.clip_generator._download_video')
+    def test_long_source_without_scores_is_analysed(self, download, resolve, fetch, duration, detect, create):
+        """Teste qu'une vidéo longue sans courbe de scores est téléchargée et analysée plutôt que découpée au hasard."""
+        def fake_download(url, output_dir, fmt):
+            path = f"{output_dir}/video.mp4"
+            open(path, 'w').close()
+            return path
+
+        download.side_effect = fake_download
+        video_info = {'duration': 1200}
+        with patch('api.utils.clip_generator._scores_from_metadata', return_value=(None, None)):
+            generate_clip('https://youtu.be/abc', 'long', False, video_info=video_info)
+        fetch.assert_not_called()
+        detect.assert_called_once()
+
+        # Courbe de popularité disponible: seules les plages retenues sont téléchargées
+        download.reset_mock()
+        fetch.side_effect = lambda url, segments, output_dir: [f"{output_dir}/section_{index}.mp4"
+                                                               for index in range(len(segments))]
+        with patch('api.utils.clip_generator._scores_from_metadata', return_value=([1.0] * 1200, None)):
+            generate_clip('https://youtu.be/abc', 'long', False, video_info=video_info)
+        fetch.assert_called_once()
+        download.assert_not_called()
+
+    @patch('api.utils.clip_generator.stream_clip')
+    @patch('api.utils.clip_generator.open_video_stream')
+    @patch('api.utils.clip_generator._download_video')
+    def test_short_clip_is_streamed(self, download, open_stream, stream):
+        """Teste qu'un clip court aux segments connus d'avance est découpé sans fichier source."""
+        stages = []
+        video_info = {'duration': 120, 'heatmap': [{'start_time': 60, 'end_time': 70, 'value': 1.0}]}
+
+        with patch('api.utils.clip_generator._scores_from_metadata',
+                   return_value=([0.0] * 60 + [1.0] * 10 + [0.0] * 50, None)):
+            generate_clip('https://youtu.be/abc', 'short', False,
+                          on_stage=lambda stage, checkpoint: stages.append(stage), video_info=video_info)
+
+        download.assert_not_called()
+        self.assertEqual(open_stream.call_args[0][0], 'https://youtu.be/abc')
+        self.assertEqual(stages, ['analysed', 'downloaded', 'rendered'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests pour le stockage des clips du générateur "Best Of".
+"""
+
+import os
+import errno
+import unittest
+import tempfile
+import shutil
+import socket
+from unittest.mock import patch, Mock
+from flask import Flask
+from flask_testing import TestCase
+from api.models import db
+from api.routes import api_bp
+from api.utils import job_queue
+from storage import local_storage
+from storage.local_storage import (save_clip, commit_file, delete_clip, list_clips, get_storage_info,
+                                   reconcile_storage, migrate_storage, clip_dir, get_clip_path)
+from storage.storage_index import StorageIndex
+from storage.storage_backend import LocalBackend, S3Backend
+
+try:
+    import boto3
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    boto3 = None
+
+def cross_device(*args):
+    """Simule une opération entre deux systèmes de fichiers."""
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+class LocalStorageTestCase(unittest.TestCase):
+    """Tests pour la publication des clips dans le stockage local."""
+
+    def setUp(self):
+        """Crée un répertoire de travail et un stockage temporaires."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.source = os.path.join(self.root, 'clip.mp4')
+        with open(self.source, 'wb') as f:
+            f.write(b'clip' * 1000)
+        self.index = StorageIndex(os.path.join(self.root, 'index.db'))
+        for name, value in (('STORAGE_DIR', os.path.join(self.root, 'storage')), ('get_storage_index', lambda: self.index)):
+            patcher = patch.object(local_storage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_save_clip_moves_file(self):
+        """Teste que le clip est déplacé sans copie sur le même système de fichiers."""
+        inode = os.stat(self.source).st_ino
+        path = save_clip(self.source, 'clip-1')
+
+        self.assertEqual(path, os.path.join(clip_dir('clip-1'), 'clip.mp4'))
+        self.assertEqual(os.stat(path).st_ino, inode)
+        self.assertFalse(os.path.exists(self.source))
+
+    def test_kept_source_is_linked(self):
+        """Teste que la conservation de la source évite la copie (clone ou lien physique)."""
+        dest = os.path.join(self.root, 'published.mp4')
+        method = commit_file(self.source, dest, keep_source=True)
+
+        self.assertIn(method, ('reflink', 'hardlink'))
+        self.assertTrue(os.path.exists(self.source))
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'clip' * 1000)
+
+    def test_cross_device_copy_is_atomic(self):
+        """Teste la copie entre systèmes de fichiers, sans fichier partiel en cas d'échec."""
+        dest = os.path.join(self.root, 'published.mp4')
+
+        with patch('os.rename', side_effect=cross_device), \
+                patch('os.link', side_effect=cross_device), \
+                patch.object(local_storage, '_reflink', side_effect=cross_device):
+            with patch('shutil.copyfileobj', side_effect=OSError(errno.ENOSPC, "No space left on device")):
+                with self.assertRaises(OSError):
+                    commit_file(self.source, dest)
+            # Ni fichier de destination ni fichier temporaire après l'échec
+            self.assertNotIn('published.mp4', os.listdir(self.root))
+            self.assertFalse([name for name in os.listdir(self.root) if name.endswith('.tmp')])
+
+            self.assertEqual(commit_file(self.source, dest), 'copy')
+
+        self.assertFalse(os.path.exists(self.source))
+        with open(dest, 'rb') as f:
+            self.assertEqual(f.read(), b'clip' * 1000)
+
+    def test_index_tracks_saved_and_deleted_clips(self):
+        """Teste la mise à jour de l'index et des totaux lors des sauvegardes et suppressions."""
+        path = save_clip(self.source, 'clip-1', owner='user-1')
+        other = os.path.join(self.root, 'other.mp4')
+        with open(other, 'wb') as f:
+            f.write(b'x' * 500)
+        save_clip(other, 'clip-2')
+
+        self.assertEqual(self.index.get('clip-1')['filename'], os.path.basename(path))
+        self.assertEqual(sorted(list_clips()), ['clip-1', 'clip-2'])
+        self.assertEqual(list_clips(owner='user-1'), ['clip-1'])
+        info = get_storage_info()
+        self.assertEqual((info['clips_count'], info['total_size']), (2, 4000 + 500))
+        self.assertEqual(get_clip_path('clip-1'), path)
+
+        self.assertTrue(delete_clip('clip-2'))
+        self.assertEqual(self.index.totals(), {'clips_count': 1, 'total_size': 4000})
+
+    def test_reconcile_rebuilds_index_from_disk(self):
+        """Teste la reconstruction de l'index après des modifications directes du disque."""
+        save_clip(self.source, 'clip-1', owner='user-1')
+        self.index.add('ghost', 'clip.mp4', 123)
+        clip_dir = os.path.join(self.root, 'storage', 'manual')
+        os.makedirs(clip_dir)
+        with open(os.path.join(clip_dir, 'clip.mp4'), 'wb') as f:
+            f.write(b'x' * 10)
+
+        self.assertEqual(reconcile_storage(), {'added': 1, 'removed': 1, 'updated': 0})
+        self.assertEqual(self.index.totals(), {'clips_count': 2, 'total_size': 4000 + 10})
+        # Le propriétaire, inconnu du disque, est conservé
+        self.assertEqual(self.index.get('clip-1')['owner'], 'user-1')
+
+    def test_sharded_layout(self):
+        """Teste la répartition des clips sur deux niveaux de sous-répertoires."""
+        path = save_clip(self.source, 'clip-1')
+
+        relative = os.path.relpath(path, os.path.join(self.root, 'storage')).split(os.sep)
+        self.assertEqual([len(part) for part in relative[:2]], [2, 2])
+        self.assertEqual(relative[2:], ['clip-1', 'clip.mp4'])
+        # Résolution sans consulter l'index
+        with patch.object(local_storage, 'get_storage_index', side_effect=AssertionError):
+            self.assertEqual(get_clip_path('clip-1'), path)
+
+    def test_migrate_legacy_clips(self):
+        """Teste la migration des clips de l'ancienne organisation."""
+        for clip_id in ('old-1', 'old-2'):
+            legacy_dir = os.path.join(self.root, 'storage', clip_id)
+            os.makedirs(legacy_dir)
+            with open(os.path.join(legacy_dir, 'clip_20240101_120000.mp4'), 'wb') as f:
+                f.write(b'x' * 10)
+        self.index.add('old-1', 'clip_20240101_120000.mp4', 10, owner='user-1')
+
+        # Ancienne organisation servie tant que le clip n'est pas migré
+        self.assertTrue(get_clip_path('old-1').endswith(os.path.join('old-1', 'clip_20240101_120000.mp4')))
+
+        self.assertEqual(migrate_storage(limit=1), {'migrated': 1, 'remaining': 1})
+        self.assertEqual(migrate_storage(), {'migrated': 1, 'remaining': 0})
+
+        for clip_id in ('old-1', 'old-2'):
+            self.assertEqual(get_clip_path(clip_id), os.path.join(clip_dir(clip_id), 'clip.mp4'))
+            self.assertFalse(os.path.exists(os.path.join(self.root, 'storage', clip_id)))
+        self.assertEqual(self.index.get('old-1')['owner'], 'user-1')
+        # Index déjà à jour après la migration
+        self.assertEqual(reconcile_storage(), {'added': 0, 'removed': 0, 'updated': 0})
+
+class StorageBackendTestCase(unittest.TestCase):
+    """Tests pour les moteurs de stockage des clips."""
+
+    def setUp(self):
+        """Crée un clip rendu et un stockage local temporaires."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.source = os.path.join(self.root, 'render.mp4')
+        # Trois parties de 5 Mo (taille minimale d'une partie S3)
+        self.content = os.urandom(1024) * (11 * 1024)
+        with open(self.source, 'wb') as f:
+            f.write(self.content)
+        self.index = StorageIndex(os.path.join(self.root, 'index.db'))
+        for name, value in (('STORAGE_DIR', os.path.join(self.root, 'storage')), ('get_storage_index', lambda: self.index)):
+            patcher = patch.object(local_storage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def check_backend(self, backend):
+        """Vérifie le contrat commun des moteurs (save, stat, open, delete) et la tenue de l'index."""
+        backend.save(self.source, 'clip-1', owner='user-1')
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(list_clips(owner='user-1'), ['clip-1'])
+        self.assertEqual(get_storage_info()['total_size'], len(self.content))
+
+        stat = backend.stat('clip-1')
+        self.assertEqual(stat['size'], len(self.content))
+        self.assertTrue(stat['etag'])
+        with backend.open('clip-1') as f:
+            self.assertEqual(f.read(), self.content)
+
+        self.assertTrue(backend.delete('clip-1'))
+        self.assertIsNone(backend.stat('clip-1'))
+        self.assertEqual(self.index.totals(), {'clips_count': 0, 'total_size': 0})
+        self.assertFalse(backend.delete('clip-1'))
+        with self.assertRaises(ValueError):
+            backend.open('clip-1')
+
+    def test_local_backend(self):
+        """Teste le moteur local."""
+        backend = LocalBackend()
+        self.check_backend(backend)
+
+        with open(self.source, 'wb') as f:
+            f.write(self.content)
+        backend.save(self.source, 'clip-2')
+        file_path, relative_path = backend.local_path('clip-2')
+        self.assertEqual(file_path, get_clip_path('clip-2'))
+        self.assertEqual(os.path.join(self.root, 'storage', relative_path), file_path)
+        self.assertIsNone(backend.url('clip-2'))
+        self.assertIsNone(backend.local_path('unknown'))
+
+    @unittest.skipUnless(boto3, "boto3 et moto sont nécessaires pour les tests S3")
+    def test_s3_backend(self):
+        """Teste le moteur S3 (envoi par parties) sur un serveur S3 local."""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+        server.start()
+        self.addCleanup(server.stop)
+
+        client = boto3.client('s3', endpoint_url=f"http://127.0.0.1:{port}", region_name='us-east-1',
+                              aws_access_key_id='testing', aws_secret_access_key='testing')
+        client.create_bucket(Bucket='clips')
+        backend = S3Backend('clips', 'clips/', client=client, chunk_size=5 * 1024 ** 2, max_concurrency=3)
+
+        # Envoi par parties: l'ETag d'un objet multipart se termine par le nombre de parties
+        location = backend.save(self.source, 'clip-1', keep_source=True, owner='user-1')
+        self.assertEqual(location, 's3://clips/clips/clip-1/clip.mp4')
+        self.assertTrue(backend.stat('clip-1')['etag'].endswith('-3'))
+        head = client.head_object(Bucket='clips', Key='clips/clip-1/clip.mp4')
+        self.assertEqual(head['Metadata'], {'owner': 'user-1'})
+        self.assertEqual(head['ContentType'], 'video/mp4')
+
+        url = backend.url('clip-1', download_name='clip-1.mp4', as_attachment=True)
+        self.assertIn('X-Amz-Signature', url)
+        self.assertIn('response-content-disposition=attachment', url)
+        self.assertIsNone(backend.local_path('clip-1'))
+
+        self.check_backend(backend)
+
+    @unittest.skipUnless(boto3, "boto3 et moto sont nécessaires pour les tests S3")
+    def test_s3_backend_unreachable(self):
+        """Teste qu'un bucket injoignable est signalé sans interrompre l'appelant."""
+        from botocore.exceptions import EndpointConnectionError
+
+        client = Mock()
+        client.head_object.side_effect = EndpointConnectionError(endpoint_url='http://127.0.0.1:1')
+        backend = S3Backend('clips', client=client)
+
+        self.assertIsNone(backend.stat('clip-1'))
+        self.assertFalse(backend.delete('clip-1'))
+        client.delete_object.assert_not_called()
+
+class DownloadRouteTestCase(TestCase):
+    """Tests pour l'endpoint de téléchargement des clips."""
+
+    def create_app(self):
+        """Crée une instance de l'application pour les tests."""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        app.register_blueprint(api_bp, url_prefix='/api')
+        return app
+
+    def setUp(self):
+        """Enregistre un clip terminé dans un stockage temporaire."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.index = StorageIndex(os.path.join(self.root, 'index.db'))
+        for name, value in (('STORAGE_DIR', os.path.join(self.root, 'storage')), ('get_storage_index', lambda: self.index)):
+            patcher = patch.object(local_storage, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        source = os.path.join(self.root, 'clip.mp4')
+        with open(source, 'wb') as f:
+            f.write(bytes(range(256)) * 40)
+
+        db.create_all()
+        job_queue.enqueue('clip-1', 'https://youtu.be/abc', 'short', True)
+        job_queue.enqueue('clip-2', 'https://youtu.be/def', 'short', True)
+        job_queue.claim('clip-1', 'worker-a')
+        job_queue.complete('clip-1', 'worker-a', save_clip(source, 'clip-1'))
+
+    def tearDown(self):
+        """Nettoie la base de données après chaque test."""
+        db.session.remove()
+        db.drop_all()
+
+    def test_range_and_conditional_requests(self):
+        """Teste les requêtes partielles et conditionnelles."""
+        response = self.client.get('/api/clips/clip-1/download')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 10240)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.headers['Content-Disposition'].startswith('inline'))
+        etag = response.headers['ETag']
+
+        # Positionnement du lecteur: seule la plage demandée est envoyée
+        response = self.client.get('/api/clips/clip-1/download', headers={'Range': 'bytes=256-511'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, bytes(range(256)))
+        self.assertEqual(response.headers['Content-Range'], 'bytes 256-511/10240')
+
+        response = self.client.get('/api/clips/clip-1/download', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/clips/clip-1/download?download=1')
+        self.assertTrue(response.headers['Content-Disposition'].startswith('attachment'))
+
+        # Clip en cours de génération ou inconnu
+        self.assertEqual(self.client.get('/api/clips/clip-2/download').status_code, 404)
+        self.assertEqual(self.client.get('/api/clips/unknown/download').status_code, 404)
+
+    def test_accel_redirect(self):
+        """Teste la délégation de l'envoi du fichier à Nginx."""
+        self.app.config['DOWNLOAD_ACCEL_REDIRECT'] = '/protected-clips/'
+        response = self.client.get('/api/clips/clip-1/download')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'')
+        relative = os.path.relpath(get_clip_path('clip-1'), os.path.join(self.root, 'storage'))
+        self.assertEqual(response.headers['X-Accel-Redirect'], f"/protected-clips/{relative}")
+        self.assertEqual(response.headers['Content-Type'], 'video/mp4')
+
+    def test_object_storage_redirect(self):
+        """Teste la redirection vers l'URL signée d'un clip stocké dans un bucket."""
+        backend = Mock(local_path=Mock(return_value=None), url=Mock(return_value='https://s3.example/clip-1.mp4?sig'))
+        with patch('api.controllers.clip_controller.get_storage_backend', return_value=backend):
+            response = self.client.get('/api/clips/clip-1/download?download=1')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], 'https://s3.example/clip-1.mp4?sig')
+        backend.url.assert_called_once_with('clip-1', download_name='clip-1.mp4', as_attachment=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests pour l'extraction des informations des vidéos YouTube du générateur de clips "Best Of".
+"""
+
+import os
+import unittest
+import tempfile
+import shutil
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from api.utils.metadata_cache import MetadataCache
+from api.utils.extractor_backend import ExtractorError, FallbackBackend, LibraryBackend
+from api.utils.youtube_extractor import VideoUnavailableError, extract_video_info, _fetch_video_info, _extract_video_id
+from api.utils.format_selection import SOURCE_FORMAT, compact_formats, select_source_format
+
+VIDEO_INFO = {'id': 'abc', 'title': 'Vidéo de test', 'channel': 'Chaîne', 'duration': 212}
+
+class MetadataCacheTestCase(unittest.TestCase):
+    """Tests pour le cache des informations des vidéos."""
+
+    def setUp(self):
+        """Crée un cache utilisant une base SQLite temporaire."""
+        self.root = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.root, 'metadata.db')
+        self.cache = self._make_cache()
+        self.calls = 0
+
+    def tearDown(self):
+        """Supprime la base temporaire."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _make_cache(self, ttl=60):
+        """Construit un cache partageant la base de test."""
+        return MetadataCache(self.db_path, ttl, 30, cached_errors=(VideoUnavailableError,))
+
+    def _fetch(self, error=None, delay=0):
+        """Construit une fonction d'extraction simulée."""
+        def fetch():
+            self.calls += 1
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return dict(VIDEO_INFO)
+        return fetch
+
+    def test_memory_and_persistent_hits(self):
+        """Teste que les informations sont réutilisées en mémoire puis depuis SQLite."""
+        self.assertEqual(self.cache.get('abc', self._fetch()), VIDEO_INFO)
+        self.assertEqual(self.cache.get('abc', self._fetch()), VIDEO_INFO)
+
+        # Un autre processus (nouvelle instance) relit la base SQLite
+        other = self._make_cache()
+        self.assertEqual(other.get('abc', self._fetch()), VIDEO_INFO)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(other.stats()['hits'], 1)
+
+    def test_expired_entry_is_fetched_again(self):
+        """Teste qu'une entrée expirée est extraite de nouveau."""
+        cache = self._make_cache(ttl=0)
+        cache.get('abc', self._fetch())
+        time.sleep(0.01)
+        cache.get('abc', self._fetch())
+        self.assertEqual(self.calls, 2)
+
+    def test_unavailable_video_is_cached(self):
+        """Teste la mise en cache des vidéos inaccessibles."""
+        for _ in range(2):
+            with self.assertRaises(VideoUnavailableError):
+                self.cache.get('private', self._fetch(VideoUnavailableError("Private video")))
+        self.assertEqual(self.calls, 1)
+
+        # Erreur relue depuis SQLite par un autre processus
+        with self.assertRaises(VideoUnavailableError):
+            self._make_cache().get('private', self._fetch())
+        self.assertEqual(self.calls, 1)
+
+    def test_unavailable_video_error_type_is_kept(self):
+        """Teste que extract_video_info lève VideoUnavailableError à l'extraction puis depuis le cache."""
+        backend = MagicMock()
+        backend.extract_info.side_effect = ExtractorError("ERROR: Private video")
+
+        with patch('api.utils.youtube_extractor.get_metadata_cache', return_value=self.cache), \
+                patch('api.utils.youtube_extractor.get_backend', return_value=backend):
+            for _ in range(2):
+                with self.assertRaises(VideoUnavailableError):
+                    extract_video_info('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        backend.extract_info.assert_called_once()
+
+    def test_transient_error_is_not_cached(self):
+        """Teste que les erreurs temporaires ne sont pas mises en cache."""
+        with self.assertRaises(ValueError):
+            self.cache.get('abc', self._fetch(ValueError("Erreur réseau")))
+        self.assertEqual(self.cache.get('abc', self._fetch()), VIDEO_INFO)
+        self.assertEqual(self.calls, 2)
+
+    def test_concurrent_lookups_share_one_fetch(self):
+        """Teste que des demandes simultanées partagent une seule extraction."""
+        results = []
+        fetch = self._fetch(delay=0.2)
+
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get('abc', fetch)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [VIDEO_INFO] * 5)
+
+class ExtractorBackendTestCase(unittest.TestCase):
+    """Tests pour les moteurs youtube-dl (bibliothèque et commande)."""
+
+    def setUp(self):
+        """Crée une bibliothèque youtube-dl simulée."""
+        self.module = MagicMock()
+        self.module.utils.DownloadError = type('DownloadError', (Exception,), {})
+        self.ydl = self.module.YoutubeDL.return_value
+        self.ydl.extract_info.return_value = dict(VIDEO_INFO, uploader='Chaîne')
+        self.ydl.sanitize_info.side_effect = lambda info: info
+        self.fallback = MagicMock()
+        self.backend = FallbackBackend(LibraryBackend(self.module), self.fallback)
+
+    def test_library_instance_is_reused(self):
+        """Teste que l'instance YoutubeDL est créée une seule fois par thread."""
+        for _ in range(3):
+            self.assertEqual(self.backend.extract_info('https://youtu.be/abc')['id'], 'abc')
+        self.assertEqual(self.module.YoutubeDL.call_count, 1)
+        self.fallback.extract_info.assert_not_called()
+
+    def test_unexpected_error_falls_back_to_subprocess(self):
+        """Teste le repli sur la commande en cas d'erreur inattendue de la bibliothèque."""
+        self.ydl.extract_info.side_effect = RuntimeError("Extracteur cassé")
+        self.fallback.extract_info.return_value = VIDEO_INFO
+        self.assertEqual(self.backend.extract_info('https://youtu.be/abc'), VIDEO_INFO)
+        self.fallback.extract_info.assert_called_once_with('https://youtu.be/abc')
+
+    def test_download_error_is_not_retried(self):
+        """Teste qu'une erreur signalée par YouTube est propagée sans repli."""
+        self.ydl.extract_info.side_effect = self.module.utils.DownloadError("ERROR: Private video")
+        with patch('api.utils.youtube_extractor.get_backend', return_value=self.backend):
+            with self.assertRaises(VideoUnavailableError):
+                _fetch_video_info('abc')
+        self.fallback.extract_info.assert_not_called()
+
+    def test_stream_url_uses_format_selector(self):
+        """Teste la sélection du format parmi les formats extraits."""
+        formats = [{'format_id': '18', 'url': 'https://cdn/18', 'acodec': 'aac', 'vcodec': 'h264'}]
+        self.ydl.extract_info.return_value = {'formats': formats}
+        self.ydl.build_format_selector.return_value = lambda ctx: iter(ctx['formats'])
+
+        self.assertEqual(self.backend.get_stream_urls('https://youtu.be/abc', 'best'), ['https://cdn/18'])
+        self.ydl.build_format_selector.assert_called_once_with('best')
+
+    def test_missing_format_raises(self):
+        """Teste l'erreur lorsque aucun format ne correspond."""
+        self.ydl.extract_info.return_value = {'formats': []}
+        self.ydl.build_format_selector.return_value = lambda ctx: iter([])
+        with self.assertRaises(ExtractorError):
+            self.backend.get_stream_urls('https://youtu.be/abc', 'best')
+
+class FormatSelectionTestCase(unittest.TestCase):
+    """Tests pour le choix du format de la source selon la qualité du rendu."""
+
+    FORMATS = [
+        {'format_id': '18', 'ext': 'mp4', 'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a', 'tbr': 500},
+        {'format_id': '22', 'ext': 'mp4', 'height': 720, 'vcodec': 'avc1', 'acodec': 'mp4a', 'filesize': 40000000},
+        {'format_id': '37', 'ext': 'mp4', 'height': 1080, 'vcodec': 'avc1', 'acodec': 'mp4a', 'filesize_approx': 90000000},
+        {'format_id': '137', 'ext': 'mp4', 'height': 1080, 'vcodec': 'avc1', 'acodec': 'none'},
+        {'format_id': '248', 'ext': 'webm', 'height': 1080, 'vcodec': 'vp9', 'acodec': 'opus'}
+    ]
+
+    def test_compact_formats(self):
+        """Teste que seuls les flux mp4 audio et vidéo sont conservés, sans leur URL."""
+        formats = compact_formats(self.FORMATS)
+
+        self.assertEqual([fmt['format_id'] for fmt in formats], ['18', '22', '37'])
+        self.assertEqual(formats[2]['filesize'], 90000000)
+
+    def test_smallest_sufficient_format(self):
+        """Teste le choix du plus petit format suffisant et le calcul des octets évités."""
+        video_info = {'duration': 600, 'formats': compact_formats(self.FORMATS)}
+
+        selection = select_source_format(video_info, 720)
+        self.assertEqual((selection['format_id'], selection['height']), ('22', 720))
+        self.assertTrue(selection['format'].startswith('22/'))
+        self.assertEqual(selection['bytes_saved'], 50000000)
+
+        # Aucun format assez grand: le plus grand disponible
+        self.assertEqual(select_source_format(video_info, 2160)['format_id'], '37')
+
+    def test_formats_without_audio(self):
+        """Teste les flux vidéo seuls d'une vidéo sans piste audio."""
+        formats = compact_formats([fmt for fmt in self.FORMATS if fmt['format_id'] == '137'])
+        self.assertEqual([(fmt['format_id'], fmt['audio']) for fmt in formats], [('137', False)])
+
+        selection = select_source_format({'duration': 600, 'formats': formats}, 720)
+        self.assertEqual(selection['format_id'], '137')
+        self.assertFalse(selection['audio'])
+
+        # Meilleure qualité: flux vidéo demandé explicitement
+        self.assertTrue(select_source_format({'formats': formats})['format'].startswith('137/'))
+        self.assertTrue(select_source_format({'formats': compact_formats(self.FORMATS)})['audio'])
+
+    def test_unknown_formats(self):
+        """Teste le format demandé sans limite de qualité ou sans liste des formats."""
+        self.assertEqual(select_source_format({'formats': []})['format'], SOURCE_FORMAT)
+
+        selection = select_source_format(None, 720)
+        self.assertEqual(selection['format'], f"best[ext=mp4][height<=720]/{SOURCE_FORMAT}")
+        self.assertIsNone(selection['bytes_saved'])
+
+class VideoIdTestCase(unittest.TestCase):
+    """Tests pour l'extraction de l'identifiant de la vidéo."""
+
+    def test_supported_url_formats(self):
+        """Teste les formats d'URL YouTube supportés."""
+        self.assertEqual(_extract_video_id('https://www.youtube.com/watch?v=dQw4w9WgXcQ'), 'dQw4w9WgXcQ')
+        self.assertEqual(_extract_video_id('https://youtu.be/dQw4w9WgXcQ'), 'dQw4w9WgXcQ')
+        self.assertEqual(_extract_video_id('https://www.youtube.com/embed/dQw4w9WgXcQ'), 'dQw4w9WgXcQ')
+        self.assertIsNone(_extract_video_id('https://invalid-url.com/video'))
+
+if __name__ == '__main__':
+    unittest.main()
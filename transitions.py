@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rendu des clips avec transitions (fondu enchaîné entre les segments, fondu
+d'ouverture et de fermeture).
+
+Plutôt qu'un unique graphe de filtres xfade traitant tout le clip sur un seul
+cœur, chaque segment est encodé indépendamment avec sa transition vers le
+segment suivant (la fin du segment fondue avec le début du suivant). Les
+morceaux sont produits en parallèle par un pool de processus FFmpeg, puis
+assemblés par simple copie: le temps de rendu diminue presque linéairement
+avec le nombre de cœurs.
+"""
+
+import os
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from api.utils.media_probe import probe
+from api.utils.smart_cut import ENCODE_PRESET, ENCODE_CRF, AUDIO_BITRATE, _join_parts
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Transition utilisée entre deux segments (voir les transitions du filtre xfade)
+CROSSFADE_TRANSITION = 'fade'
+
+def plan_transitions(pieces, duration):
+    """
+    Répartit les segments en morceaux encodables indépendamment.
+
+    Le début de chaque segment (sauf le premier) est consommé par le fondu
+    enchaîné du morceau précédent; chaque morceau se termine par le fondu vers
+    le segment suivant. La durée du fondu est réduite si un segment est trop
+    court pour l'accueillir.
+
+    Args:
+        pieces: Liste des segments (tuples de fichier source, début et fin en secondes)
+        duration: Durée souhaitée des transitions en secondes
+
+    Returns:
+        Tuple (liste des morceaux, durée effective des transitions); chaque
+        morceau est un dictionnaire contenant la source ('path', 'start',
+        'end'), le segment suivant à fondre ('next', tuple ou None) et les
+        fondus d'ouverture et de fermeture ('fade_in', 'fade_out')
+    """
+    if not pieces:
+        return [], 0.0
+
+    # Un segment doit pouvoir accueillir le fondu entrant et le fondu sortant
+    shortest = min(end - start for _, start, end in pieces)
+    duration = max(0.0, min(duration, shortest / 2))
+
+    parts = []
+    for index, (video_path, start, end) in enumerate(pieces):
+        following = pieces[index + 1] if index + 1 < len(pieces) else None
+        parts.append({
+            'path': video_path,
+            'start': start + (duration if index > 0 else 0.0),
+            'end': end,
+            'next': following,
+            'fade_in': index == 0,
+            'fade_out': following is None
+        })
+    return parts, duration
+
+def render_with_transitions(pieces, output_file, work_dir, duration, max_workers=None):
+    """
+    Assemble des segments avec des transitions, en encodant chaque segment en parallèle.
+
+    Args:
+        pieces: Liste des segments (tuples de fichier source, début et fin en
+            secondes; une fin à None désigne la fin du fichier)
+        output_file: Chemin du fichier de sortie
+        work_dir: Répertoire des fichiers intermédiaires
+        duration: Durée des transitions en secondes
+        max_workers: Nombre de segments encodés simultanément (nombre de cœurs par défaut)
+
+    Raises:
+        ValueError: Si un morceau ne peut pas être encodé ou assemblé
+    """
+    infos = {}
+    for video_path, _, _ in pieces:
+        if video_path not in infos:
+            infos[video_path] = probe(video_path)
+
+    # Bornes explicites (les fondus ont besoin de la durée de chaque segment)
+    pieces = [(video_path, start, end if end is not None else infos[video_path]['duration'])
+              for video_path, start, end in pieces]
+    parts, duration = plan_transitions(pieces, duration)
+
+    # Format commun des morceaux: celui du premier segment
+    reference = infos[pieces[0][0]]
+    with_audio = all(info['audio'] is not None for info in infos.values())
+
+    workers = min(max_workers or os.cpu_count() or 1, len(parts))
+    # Répartition des cœurs entre les encodages simultanés
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    jobs = []
+    for index, part in enumerate(parts):
+        path = os.path.join(work_dir, f"transition_{index:03d}.mkv")
+        jobs.append((part, duration, path, reference, with_audio, threads))
+
+    logger.info(f"Rendu avec transitions: {len(jobs)} segments, fondus de {duration:.2f}s, {workers} encodages simultanés")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # list() propage la première erreur rencontrée
+            list(pool.map(lambda job: _render_part(*job), jobs))
+
+        _join_parts([(job[2], job[0]['start'], job[0]['end']) for job in jobs], output_file, work_dir)
+    finally:
+        for job in jobs:
+            if os.path.exists(job[2]):
+                os.remove(job[2])
+
+def _render_part(part, duration, output_path, reference, with_audio, threads):
+    """
+    Encode un segment suivi de son fondu enchaîné vers le segment suivant.
+    """
+    length = part['end'] - part['start']
+    cmd = ['ffmpeg', '-y', '-v', 'error',
+           '-ss', f"{part['start']:.6f}", '-t', f"{length:.6f}", '-i', part['path']]
+
+    following = part['next'] if duration > 0 else None
+    if following:
+        cmd += ['-ss', f"{following[1]:.6f}", '-t', f"{duration:.6f}", '-i', following[0]]
+
+    video = reference['video'] or {}
+    audio = reference['audio'] or {}
+    normalise_video = (f"fps={video.get('fps') or 25:.6f},scale={video['width']}:{video['height']},"
+                       f"setsar=1,format=yuv420p")
+    normalise_audio = f"aresample={audio.get('sample_rate') or 44100}"
+
+    filters = [f"[0:v]{normalise_video}[v0]"]
+    if following:
+        filters += [f"[1:v]{normalise_video}[v1]",
+                    f"[v0][v1]xfade=transition={CROSSFADE_TRANSITION}:duration={duration:.6f}:"
+                    f"offset={length - duration:.6f}[vx]"]
+    else:
+        filters.append("[v0]null[vx]")
+
+    if with_audio:
+        filters.append(f"[0:a]{normalise_audio}[a0]")
+        if following:
+            filters += [f"[1:a]{normalise_audio}[a1]",
+                        f"[a0][a1]acrossfade=d={duration:.6f}[ax]"]
+        else:
+            filters.append("[a0]anull[ax]")
+
+    # Fondus d'ouverture et de fermeture du clip
+    video_fades, audio_fades = [], []
+    if part['fade_in'] and duration > 0:
+        video_fades.append(f"fade=t=in:st=0:d={duration:.6f}")
+        audio_fades.append(f"afade=t=in:st=0:d={duration:.6f}")
+    if part['fade_out'] and duration > 0:
+        video_fades.append(f"fade=t=out:st={length - duration:.6f}:d={duration:.6f}")
+        audio_fades.append(f"afade=t=out:st={length - duration:.6f}:d={duration:.6f}")
+    filters.append(f"[vx]{','.join(video_fades) or 'null'}[vout]")
+    if with_audio:
+        filters.append(f"[ax]{','.join(audio_fades) or 'anull'}[aout]")
+
+    cmd += ['-filter_complex', ';'.join(filters), '-map', '[vout]']
+    cmd += ['-c:v', 'libx264', '-preset', ENCODE_PRESET, '-crf', str(ENCODE_CRF), '-threads', str(threads)]
+    if with_audio:
+        cmd += ['-map', '[aout]', '-c:a', 'aac', '-b:a', AUDIO_BITRATE]
+    cmd += ['-f', 'matroska', output_path]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Erreur lors de l'encodage du segment {part['start']:.3f}-{part['end']:.3f}: "
+                         f"{e.stderr.decode('utf-8', 'replace')}")
@@ -6,14 +6,34 @@ Utilitaire pour l'extraction des informations des vidéos YouTube.
 """
 
 import re
-import subprocess
-import json
 from urllib.parse import urlparse, parse_qs
+from api.utils.metadata_cache import get_metadata_cache
+from api.utils.extractor_backend import get_backend, ExtractorError, SubprocessBackend
+from api.utils.format_selection import compact_formats
+
+# Messages de youtube-dl indiquant une vidéo définitivement inaccessible
+UNAVAILABLE_MARKERS = (
+    'private video',
+    'video unavailable',
+    'this video is not available',
+    'has been removed',
+    'does not exist',
+    'sign in to confirm your age'
+)
+
+class VideoUnavailableError(ValueError):
+    """
+    Levée lorsque la vidéo est privée, supprimée ou inexistante.
+    Contrairement aux erreurs réseau, ce résultat est mis en cache.
+    """
 
 def extract_video_info(youtube_url):
     """
     Extrait les informations d'une vidéo YouTube.
     
+    Les informations sont mises en cache par identifiant de vidéo (mémoire et
+    SQLite), ce qui évite de relancer youtube-dl pour une vidéo déjà consultée.
+    
     Args:
         youtube_url: URL de la vidéo YouTube
         
@@ -28,16 +48,25 @@ def extract_video_info(youtube_url):
     if not video_id:
         raise ValueError("URL YouTube invalide")
     
-    # Utilisation de youtube-dl pour récupérer les informations de la vidéo
-    try:
-        cmd = [
-            'youtube-dl',
-            '--dump-json',
-            f'https://www.youtube.com/watch?v={video_id}'
-        ]
+    return get_metadata_cache().get(video_id, lambda: _fetch_video_info(video_id))
+
+def _fetch_video_info(video_id):
+    """
+    Récupère les informations d'une vidéo YouTube avec youtube-dl.
+    
+    Args:
+        video_id: Identifiant de la vidéo YouTube
         
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        video_data = json.loads(result.stdout)
+    Returns:
+        Dictionnaire contenant les informations de la vidéo
+    
+    Raises:
+        VideoUnavailableError: Si la vidéo est privée, supprimée ou inexistante
+        ValueError: Si les informations ne peuvent pas être récupérées
+    """
+    # Extraction par le moteur configuré (bibliothèque dans le processus ou commande youtube-dl)
+    try:
+        video_data = get_backend().extract_info(f'https://www.youtube.com/watch?v={video_id}')
         
         # Extraction des informations pertinentes
         return {
@@ -48,16 +77,77 @@ def extract_video_info(youtube_url):
             'thumbnail': video_data.get('thumbnail', ''),
             'view_count': video_data.get('view_count', 0),
             'like_count': video_data.get('like_count', 0),
-            'upload_date': video_data.get('upload_date', '')
+            'upload_date': video_data.get('upload_date', ''),
+            'heatmap': video_data.get('heatmap') or [],
+            'formats': compact_formats(video_data.get('formats'))
         }
     
-    except subprocess.CalledProcessError as e:
-        raise ValueError(f"Erreur lors de l'extraction des informations de la vidéo: {e.stderr}")
-    except json.JSONDecodeError:
-        raise ValueError("Impossible de décoder les informations de la vidéo")
+    except ExtractorError as e:
+        if any(marker in str(e).lower() for marker in UNAVAILABLE_MARKERS):
+            raise VideoUnavailableError(f"Vidéo inaccessible: {str(e)}")
+        raise ValueError(f"Erreur lors de l'extraction des informations de la vidéo: {str(e)}")
     except KeyError as e:
         raise ValueError(f"Information manquante dans les données de la vidéo: {str(e)}")
 
+def get_stream_urls(youtube_url, fmt):
+    """
+    Récupère les URL directes des flux d'une vidéo YouTube pour un format donné.
+    
+    Args:
+        youtube_url: URL de la vidéo YouTube
+        fmt: Format demandé au téléchargeur
+        
+    Returns:
+        Liste des URL (une par flux sélectionné)
+    
+    Raises:
+        ValueError: Si les URL ne peuvent pas être obtenues
+    """
+    try:
+        return get_backend().get_stream_urls(youtube_url, fmt)
+    except ExtractorError as e:
+        raise ValueError(f"Erreur lors de la récupération de l'URL du flux: {str(e)}")
+
+def download_video(youtube_url, output_template, fmt):
+    """
+    Télécharge une vidéo YouTube.
+    
+    Args:
+        youtube_url: URL de la vidéo YouTube
+        output_template: Modèle du chemin de sortie (syntaxe youtube-dl)
+        fmt: Format demandé au téléchargeur
+    
+    Raises:
+        ValueError: Si le téléchargement échoue
+    """
+    try:
+        get_backend().download(youtube_url, output_template, fmt)
+    except ExtractorError as e:
+        raise ValueError(f"Erreur lors du téléchargement de la vidéo: {str(e)}")
+
+def open_video_stream(youtube_url, fmt, stderr=None):
+    """
+    Lance le téléchargement d'une vidéo YouTube vers un pipe, sans fichier intermédiaire.
+    
+    Le téléchargement est toujours confié à la commande youtube-dl: la
+    bibliothèque ne sait écrire un flux que sur la sortie standard du processus.
+    
+    Args:
+        youtube_url: URL de la vidéo YouTube
+        fmt: Format demandé au téléchargeur (flux unique audio+vidéo)
+        stderr: Fichier recevant la sortie d'erreur du téléchargeur, ou None
+        
+    Returns:
+        Processus du téléchargeur (le fichier vidéo est lu sur sa sortie standard)
+    
+    Raises:
+        ValueError: Si le téléchargeur ne peut pas être lancé
+    """
+    try:
+        return SubprocessBackend().open_stream(youtube_url, fmt, stderr)
+    except OSError as e:
+        raise ValueError(f"Impossible de lancer le téléchargement de la vidéo: {str(e)}")
+
 def _extract_video_id(youtube_url):
     """
     Extrait l'identifiant de la vidéo à partir de l'URL YouTube.